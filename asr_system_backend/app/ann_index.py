@@ -0,0 +1,152 @@
+import math
+import threading
+from collections import deque
+from typing import Dict, Optional
+import numpy as np
+import faiss
+
+# 支持的索引类型
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# IVF聚类训练时每个聚类中心至少需要的样本数（FAISS少于39个会给出警告）
+_MIN_POINTS_PER_CENTROID = 39
+# PQ每个子量化器8位编码，训练至少需要256个样本
+_PQ_MIN_TRAINING_POINTS = 256
+
+def resolve_index_type(config: Dict, vector_count: int) -> str:
+    """根据配置和向量数量确定实际使用的索引类型
+
+    向量数量少于ann_min_vectors时暴力搜索已足够快，且IVF/PQ没有足够的训练样本，统一使用flat。
+    """
+    index_type = config.get("index_type", "flat")
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"不支持的索引类型: {index_type}")
+    if index_type == "flat" or vector_count < config.get("ann_min_vectors", 1000):
+        return "flat"
+    if index_type == "ivf_pq" and vector_count < _PQ_MIN_TRAINING_POINTS:
+        return "ivf_flat"
+    return index_type
+
+def _ivf_nlist(config: Dict, vector_count: int) -> int:
+    """聚类数：未配置时取4*sqrt(n)，并保证每个聚类有足够的训练样本"""
+    nlist = config.get("ivf_nlist") or int(4 * math.sqrt(vector_count))
+    return max(1, min(nlist, vector_count // _MIN_POINTS_PER_CENTROID))
+
+def _pq_subquantizers(config: Dict, dimension: int) -> int:
+    """PQ子量化器个数必须整除维度，取不超过配置值的最大因数"""
+    m = max(1, min(config.get("pq_m", 16), dimension))
+    while dimension % m:
+        m -= 1
+    return m
+
+def build_index(embeddings: np.ndarray, labels: np.ndarray, config: Dict) -> faiss.Index:
+    """用给定的向量构建索引（内积度量），需要训练的索引类型用这些向量训练
+
+    所有类型都包装在IndexIDMap2中，以热词ID为键。
+    """
+    vector_count, dimension = embeddings.shape
+    index_type = resolve_index_type(config, vector_count)
+
+    if index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dimension, config.get("hnsw_m", 32), faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = config.get("hnsw_ef_construction", 80)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        quantizer = faiss.IndexFlatIP(dimension)
+        nlist = _ivf_nlist(config, vector_count)
+        if index_type == "ivf_flat":
+            base = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            base = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_subquantizers(config, dimension), 8,
+                                    faiss.METRIC_INNER_PRODUCT)
+        base.train(embeddings)
+    else:
+        base = faiss.IndexFlatIP(dimension)
+
+    index = faiss.IndexIDMap2(base)
+    apply_search_params(index, config)
+    if vector_count:
+        index.add_with_ids(embeddings, labels)
+    return index
+
+def empty_index(dimension: int) -> faiss.Index:
+    """创建空的flat索引，向量数量增长后由重建策略切换为近似索引"""
+    return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """取出IndexIDMap2包装的底层索引"""
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+
+def index_type_of(index: faiss.Index) -> str:
+    """根据底层索引判断索引类型"""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+def supports_removal(index: faiss.Index) -> bool:
+    """只有flat索引能在IndexIDMap2中直接删除向量
+
+    HNSW不支持删除；IVF的内部ID删除后不会重新编号，与IndexIDMap2的映射不一致。
+    这些类型的删除改为在元数据中标记，由重建策略统一清理。
+    """
+    return isinstance(base_index(index), faiss.IndexFlat)
+
+def apply_search_params(index: faiss.Index, config: Dict):
+    """设置查询参数（HNSW的efSearch、IVF的nprobe），加载已保存的索引后也需调用"""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = config.get("hnsw_ef_search", 64)
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(config.get("ivf_nprobe", 8), base.nlist)
+
+def needs_rebuild(index: faiss.Index, config: Dict, live_count: int, deleted_count: int,
+                  trained_count: int) -> Optional[str]:
+    """判断索引是否需要重建，返回原因，不需要时返回None
+
+    - 配置的索引类型与当前向量数量应使用的类型不一致（例如flat增长到阈值以上）
+    - 已标记删除的向量超过一定比例
+    - IVF/PQ的向量数量相对训练时增长过多，聚类中心不再有代表性
+    """
+    expected = resolve_index_type(config, live_count)
+    current = index_type_of(index)
+    if expected != current:
+        return f"索引类型 {current} -> {expected}"
+    if deleted_count and deleted_count > config.get("rebuild_deleted_ratio", 0.2) * max(index.ntotal, 1):
+        return f"已删除向量 {deleted_count}/{index.ntotal}"
+    if current in ("ivf_flat", "ivf_pq") and live_count > config.get("retrain_growth", 2.0) * max(trained_count, 1):
+        return f"向量数量 {trained_count} -> {live_count}，需要重新训练"
+    return None
+
+class SearchStats:
+    """查询延迟和召回率统计，保留最近的样本计算分位数"""
+
+    def __init__(self, window: int = 1000):
+        self._latencies = deque(maxlen=window)
+        self._recalls = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.searches = 0
+
+    def record_latency(self, seconds: float):
+        with self._lock:
+            self.searches += 1
+            self._latencies.append(seconds * 1000)
+
+    def record_recall(self, recall: float):
+        with self._lock:
+            self._recalls.append(recall)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            latencies = np.array(self._latencies) if self._latencies else None
+            return {
+                "searches": self.searches,
+                "latency_ms_avg": float(latencies.mean()) if latencies is not None else 0.0,
+                "latency_ms_p50": float(np.percentile(latencies, 50)) if latencies is not None else 0.0,
+                "latency_ms_p95": float(np.percentile(latencies, 95)) if latencies is not None else 0.0,
+                "recall_samples": len(self._recalls),
+                "recall_avg": float(np.mean(self._recalls)) if self._recalls else None
+            }
@@ -1,136 +1,594 @@
 import os
+import ssl
 import logging
 import asyncio
 import websockets
 import json
+import inspect
 import wave
-from typing import List, Dict, Optional
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional, Tuple, Iterator, Iterable, Callable
 from datetime import datetime
+from websockets.protocol import State
 from .config import get_settings
+from .result_cache import TranscriptionResultCache, create_result_cache
+from .audio_sharding import detect_speech_segments, plan_fixed_shards, plan_vad_shards, stitch_shard_results
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+
+def _is_open(websocket) -> bool:
+    """判断WebSocket连接是否仍处于可用状态"""
+    return getattr(websocket, "state", None) is State.OPEN
+
+
+class FunASRConnectionPool:
+    """FunASR WebSocket连接池
+
+    连接与创建它的事件循环绑定。空闲连接按后进先出复用，
+    后台任务定期对空闲连接发送ping，失效的连接会被丢弃并补足到最小连接数。
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        ssl_context: Optional[ssl.SSLContext] = None,
+        min_size: int = 1,
+        max_size: int = 4,
+        ping_interval: float = 20.0,
+        ping_timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0
+    ):
+        self.uri = uri
+        self.ssl_context = ssl_context
+        self.max_size = max(1, max_size)
+        self.min_size = max(0, min(min_size, self.max_size))
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._idle: deque = deque()
+        self._size = 0  # 已建立的连接数（包括借出的）
+        self._borrowed: set = set()  # 当前事件循环上借出、尚未归还的连接
+        self._cond: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def _bind_loop(self):
+        """绑定到当前运行的事件循环，循环变化时丢弃旧循环上的连接"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._loop is not None:
+            logger.info("事件循环已变化，FunASR连接池重新初始化")
+        self._idle.clear()
+        self._size = 0
+        self._borrowed = set()
+        self._cond = asyncio.Condition()
+        self._loop = loop
+        self._closed = False
+        self._health_task = loop.create_task(self._health_check_loop())
+
+    async def _connect_with_backoff(self):
+        """建立新连接，失败时按指数退避重试"""
+        delay = self.backoff_base
+        for attempt in range(self.max_retries + 1):
+            try:
+                websocket = await websockets.connect(
+                    self.uri,
+                    subprotocols=["binary"],
+                    ping_interval=None,  # 由连接池统一做健康检查
+                    ssl=self.ssl_context
+                )
+                logger.info(f"已建立FunASR连接: {self.uri}")
+                return websocket
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                if attempt >= self.max_retries:
+                    logger.error(f"连接FunASR服务失败，已重试 {attempt} 次: {str(e)}")
+                    raise
+                logger.warning(f"连接FunASR服务失败，{delay:.1f} 秒后重试: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.backoff_max)
+
+    async def start(self):
+        """预先建立最小数量的连接"""
+        self._bind_loop()
+        while self._size < self.min_size:
+            async with self._cond:
+                self._size += 1
+            try:
+                websocket = await self._connect_with_backoff()
+            except Exception as e:
+                async with self._cond:
+                    self._size -= 1
+                logger.warning(f"FunASR连接池预热失败: {str(e)}")
+                return
+            await self.release(websocket)
+
+    async def acquire(self):
+        """从池中借出一个连接，没有空闲连接且已达上限时等待"""
+        self._bind_loop()
+        async with self._cond:
+            while True:
+                while self._idle:
+                    websocket = self._idle.pop()
+                    if _is_open(websocket):
+                        self._borrowed.add(websocket)
+                        return websocket
+                    self._size -= 1
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                await self._cond.wait()
+
+        try:
+            websocket = await self._connect_with_backoff()
+        except BaseException:
+            async with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._borrowed.add(websocket)
+        return websocket
+
+    async def release(self, websocket, discard: bool = False):
+        """归还连接；discard为True或连接已失效时直接关闭
+
+        在其他事件循环中归还时，连接交回所属的循环关闭并释放名额；
+        连接池已切换到新循环时，旧循环上借出的连接不占新的名额，只需关闭。
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if websocket not in self._borrowed:
+                await self._close_quietly(websocket)
+            elif self._loop.is_running():
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(self.release(websocket, discard=True), self._loop)
+                )
+            else:
+                # 所属的循环已停止，没有协程在等待名额，直接修正计数
+                self._borrowed.discard(websocket)
+                self._size -= 1
+                await self._close_quietly(websocket)
+            return
+        self._borrowed.discard(websocket)
+        keep = not discard and not self._closed and _is_open(websocket)
+        async with self._cond:
+            if keep:
+                self._idle.append(websocket)
+            else:
+                self._size -= 1
+            self._cond.notify()
+        if not keep:
+            await self._close_quietly(websocket)
+
+    @asynccontextmanager
+    async def connection(self):
+        """以上下文管理器的形式借用连接，会话中途出错的连接不会放回池中"""
+        websocket = await self.acquire()
+        try:
+            yield websocket
+        except BaseException:
+            await self.release(websocket, discard=True)
+            raise
+        else:
+            await self.release(websocket)
+
+    async def _health_check_loop(self):
+        """定期ping空闲连接并补足最小连接数"""
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            async with self._cond:
+                candidates = list(self._idle)
+                self._idle.clear()
+            for websocket in candidates:
+                try:
+                    pong_waiter = await websocket.ping()
+                    await asyncio.wait_for(pong_waiter, timeout=self.ping_timeout)
+                    await self.release(websocket)
+                except Exception as e:
+                    logger.warning(f"FunASR空闲连接健康检查失败，已丢弃: {str(e)}")
+                    await self.release(websocket, discard=True)
+            if self._size < self.min_size:
+                await self.start()
+
+    @staticmethod
+    async def _close_quietly(websocket):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    async def close(self):
+        """关闭连接池及所有空闲连接"""
+        self._closed = True
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._cond is None:
+            return
+        async with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for websocket in idle:
+            await self._close_quietly(websocket)
+
+    def get_stats(self) -> Dict:
+        """获取连接池状态"""
+        return {
+            "uri": self.uri,
+            "size": self._size,
+            "idle": len(self._idle),
+            "min_size": self.min_size,
+            "max_size": self.max_size
+        }
+
+
 class ASREngine:
     def __init__(self):
         """初始化ASR引擎"""
-        self.host = "127.0.0.1"  # FunASR服务地址
-        self.port = 10095       # FunASR服务端口
+        self.host = settings.FUNASR_HOST  # FunASR服务地址
+        self.port = settings.FUNASR_PORT  # FunASR服务端口
         self.initialized = True  # FunASR服务是独立的Docker容器，不需要初始化
-    
+        self.pool = self._create_pool()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # 应用主事件循环
+        self._hotwords_cache = (None, "")  # (文件修改时间, 热词JSON)
+        self.result_cache = create_result_cache()
+
+    def _create_pool(self) -> FunASRConnectionPool:
+        """根据配置创建FunASR连接池"""
+        ssl_context = None
+        scheme = "ws"
+        if settings.FUNASR_USE_SSL:
+            # FunASR容器默认使用自签名证书，与客户端脚本保持一致不校验证书
+            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+            scheme = "wss"
+        return FunASRConnectionPool(
+            f"{scheme}://{self.host}:{self.port}",
+            ssl_context=ssl_context,
+            min_size=settings.FUNASR_POOL_MIN_SIZE,
+            max_size=settings.FUNASR_POOL_MAX_SIZE,
+            ping_interval=settings.FUNASR_POOL_PING_INTERVAL,
+            ping_timeout=settings.FUNASR_POOL_PING_TIMEOUT,
+            max_retries=settings.FUNASR_RECONNECT_RETRIES,
+            backoff_base=settings.FUNASR_RECONNECT_BACKOFF,
+            backoff_max=settings.FUNASR_RECONNECT_BACKOFF_MAX
+        )
+
     def initialize(self):
         """FunASR服务是独立的Docker容器，不需要初始化"""
         pass
-    
-    async def _transcribe_with_funasr(self, audio_file_path: str) -> Dict:
-        """使用FunASR WebSocket客户端进行转写"""
+
+    async def startup(self):
+        """应用启动时预热FunASR连接池"""
+        self._loop = asyncio.get_running_loop()
+        await self.pool.start()
+
+    async def shutdown(self):
+        """应用关闭时释放FunASR连接"""
+        await self.pool.close()
+
+    def load_hotwords(self) -> str:
+        """读取热词文件并转换为FunASR需要的JSON格式，文件未变化时直接使用缓存"""
+        path = settings.ASR_HOTWORDS_FILE
         try:
-            # 读取音频文件
-            with wave.open(audio_file_path, 'rb') as wav_file:
-                audio_bytes = wav_file.readframes(wav_file.getnframes())
-                sample_rate = wav_file.getframerate()
-            
-            # 连接WebSocket服务器
-            uri = f"ws://{self.host}:{self.port}"
-            logger.info(f"正在连接FunASR服务: {uri}")
-            
-            async with websockets.connect(uri, ping_interval=None) as websocket:
-                # 发送初始配置
-                config = {
-                    "mode": "offline",
-                    "chunk_size": [5, 10, 5],
-                    "chunk_interval": 10,
-                    "wav_name": os.path.basename(audio_file_path),
-                    "is_speaking": True,
-                    "audio_fs": sample_rate,
-                    "wav_format": "wav",
-                    "hotwords": "",
-                    "itn": True
-                }
-                await websocket.send(json.dumps(config))
-                logger.info("已发送配置信息")
-                
-                # 发送音频数据
-                await websocket.send(audio_bytes)
-                logger.info("已发送音频数据")
-                
-                # 发送结束标记
-                await websocket.send(json.dumps({"is_speaking": False}))
-                logger.info("已发送结束标记")
-                
-                # 接收转写结果
-                while True:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return ""
+        if self._hotwords_cache[0] == mtime:
+            return self._hotwords_cache[1]
+
+        fst_dict = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    words = line.strip().split()
+                    if len(words) < 2:
+                        continue
                     try:
-                        result = await websocket.recv()
-                        logger.info(f"收到结果: {result}")
-                        
-                        if isinstance(result, str):
-                            try:
-                                # 尝试解析JSON结果
-                                json_result = json.loads(result)
-                                if "text" in json_result:
-                                    text = json_result["text"]
-                                else:
-                                    # 如果不是JSON或没有text字段，使用原始文本
-                                    text = result.split(": ")[-1].strip()
-                                
-                                # 构建标准格式的结果
-                                formatted_result = {
-                                    "text": text,
-                                    "language": "zh",
-                                    "segments": [{
-                                        "segment_id": 0,
-                                        "start_time": 0,
-                                        "end_time": 0,  # FunASR离线模式不提供时间戳
-                                        "text": text,
-                                        "confidence": 1.0  # FunASR离线模式不提供置信度
-                                    }],
-                                    "duration": 0,  # FunASR离线模式不提供时长
-                                    "processing_time": datetime.now().isoformat()
-                                }
-                                return formatted_result
-                            except json.JSONDecodeError:
-                                continue
-                    except websockets.exceptions.ConnectionClosed:
-                        break
-                
-                raise ValueError("未收到有效的转写结果")
-                    
+                        # 除最后一项外均为热词，最后一项为权重
+                        fst_dict[" ".join(words[:-1])] = int(words[-1])
+                    except ValueError:
+                        logger.warning(f"热词权重格式错误，已跳过: '{line.strip()}'")
+        except Exception as e:
+            logger.error(f"读取热词文件失败: {str(e)}")
+            return ""
+
+        hotword_msg = json.dumps(fst_dict, ensure_ascii=False) if fst_dict else ""
+        self._hotwords_cache = (mtime, hotword_msg)
+        return hotword_msg
+
+    async def transcribe(self, audio_file_path: str, language: str = "zh", hotwords: Optional[str] = None,
+                         content_digest: Optional[str] = None, use_cache: bool = True) -> Dict:
+        """转写音频文件（协程版本，供路由等异步代码直接await）
+
+        hotwords 为FunASR格式的热词JSON，未指定时使用热词文件中的配置。
+        content_digest 为调用方已计算好的文件SHA-256，用于查询结果缓存，未指定时在此计算。
+        use_cache 为False时不查询也不写入结果缓存（实时转写的音频块几乎不会重复）。
+        """
+        if not os.path.exists(audio_file_path):
+            raise FileNotFoundError(f"音频文件不存在: {audio_file_path}")
+        if hotwords is None:
+            hotwords = self.load_hotwords()
+
+        # 先查结果缓存，命中时不再访问FunASR
+        cache_key = None
+        if self.result_cache is not None and use_cache:
+            if content_digest is None:
+                loop = asyncio.get_running_loop()
+                content_digest = await loop.run_in_executor(
+                    None, TranscriptionResultCache.hash_file, audio_file_path
+                )
+            cache_key = TranscriptionResultCache.make_key(content_digest, "offline", True, hotwords)
+            cached = await self.result_cache.aget(cache_key)
+            if cached is not None:
+                logger.info(f"命中转写结果缓存: {os.path.basename(audio_file_path)}")
+                return cached
+
+        result = await self._transcribe_with_funasr(audio_file_path, hotwords)
+        if cache_key is not None:
+            await self.result_cache.aput(cache_key, result)
+        return result
+
+    async def _transcribe_with_funasr(self, audio_file_path: str, hotwords: str = "") -> Dict:
+        """使用FunASR WebSocket客户端进行转写，超过时长阈值的WAV分片并行转写"""
+        try:
+            sample_rate, wav_format = self._probe_audio(audio_file_path)
+
+            if wav_format == "pcm" and audio_file_path.lower().endswith(".wav"):
+                with wave.open(audio_file_path, 'rb') as wav_file:
+                    total_frames = wav_file.getnframes()
+                if total_frames / sample_rate > settings.ASR_LONG_AUDIO_THRESHOLD_SECONDS:
+                    return await self._transcribe_long_audio(audio_file_path, sample_rate, total_frames, hotwords)
+
+            config = self._build_session_config(os.path.basename(audio_file_path), sample_rate, wav_format, hotwords)
+            json_result = await self._run_session_with_retry(
+                config, lambda: self._iter_audio_chunks(audio_file_path, settings.ASR_STREAM_CHUNK_SIZE)
+            )
+            text = json_result["text"]
+            return self._build_result(text, [{
+                "segment_id": 0,
+                "start_time": 0,
+                "end_time": 0,  # FunASR离线模式不提供时间戳
+                "text": text,
+                "confidence": 1.0  # FunASR离线模式不提供置信度
+            }], 0)  # FunASR离线模式不提供时长
+
         except Exception as e:
             logger.error(f"FunASR转写失败: {str(e)}")
             raise
-    
-    async def _transcribe_with_funasr(self, audio_stream):
-        uri = f"ws://{self.host}:{self.port}"
-        async with websockets.connect(uri) as ws:
-            # 发送实时音频流
-            while True:
-                chunk = await audio_stream.read(640)  # 40ms的16kHz 16bit音频
-                if not chunk:
+
+    async def _transcribe_long_audio(self, audio_file_path: str, sample_rate: int, total_frames: int,
+                                     hotwords: str = "") -> Dict:
+        """长音频分片后通过多个池化连接并行转写，再按顺序拼接文本和时间戳"""
+        loop = asyncio.get_running_loop()
+        speech_segments = await loop.run_in_executor(None, detect_speech_segments, audio_file_path)
+        if speech_segments is not None:
+            shards = plan_vad_shards(total_frames, sample_rate, speech_segments,
+                                     settings.ASR_SHARD_SECONDS, settings.ASR_SHARD_OVERLAP_SECONDS)
+        else:
+            shards = plan_fixed_shards(total_frames, sample_rate,
+                                       settings.ASR_SHARD_SECONDS, settings.ASR_SHARD_OVERLAP_SECONDS)
+        logger.info(f"长音频切分为 {len(shards)} 个分片（{'VAD' if speech_segments is not None else '固定窗口'}）: "
+                    f"{os.path.basename(audio_file_path)}")
+
+        # 限制单个文件同时占用的连接数，避免长音频占满连接池
+        semaphore = asyncio.Semaphore(max(1, settings.ASR_SHARD_MAX_PARALLEL))
+        wav_name = os.path.basename(audio_file_path)
+
+        async def transcribe_shard(index: int, start: int, end: int) -> Dict:
+            config = self._build_session_config(f"{wav_name}#{index}", sample_rate, "pcm", hotwords)
+            async with semaphore:
+                return await self._run_session_with_retry(
+                    config, lambda: self._iter_wav_frames(audio_file_path, start, end, settings.ASR_STREAM_CHUNK_SIZE)
+                )
+
+        results = await asyncio.gather(*[
+            transcribe_shard(index, start, end) for index, (start, end, _) in enumerate(shards)
+        ])
+        text, segments, timestamps = stitch_shard_results(shards, results, sample_rate)
+        result = self._build_result(text, segments, total_frames / sample_rate)
+        if timestamps:
+            result["timestamps"] = timestamps
+        return result
+
+    async def transcribe_pcm(self, pcm: bytes, sample_rate: int = 16000, hotwords: Optional[str] = None,
+                             wav_name: str = "stream") -> Dict:
+        """转写内存中的16位单声道PCM数据，供实时会话直接发送解码结果而不落盘"""
+        if hotwords is None:
+            hotwords = self.load_hotwords()
+        stride = settings.ASR_STREAM_CHUNK_SIZE
+        view = memoryview(pcm)
+
+        config = self._build_session_config(wav_name, sample_rate, "pcm", hotwords)
+        json_result = await self._run_session_with_retry(
+            config, lambda: (view[i:i + stride] for i in range(0, len(view), stride))
+        )
+        text = json_result["text"]
+        duration = len(pcm) / 2 / sample_rate
+        return self._build_result(text, [{
+            "segment_id": 0,
+            "start_time": 0,
+            "end_time": duration,
+            "text": text,
+            "confidence": 1.0  # FunASR离线模式不提供置信度
+        }], duration)
+
+    @staticmethod
+    def _build_session_config(wav_name: str, sample_rate: int, wav_format: str, hotwords: str) -> Dict:
+        """构建离线识别会话的初始配置"""
+        return {
+            "mode": "offline",
+            "chunk_size": [5, 10, 5],
+            "chunk_interval": 10,
+            "wav_name": wav_name,
+            "is_speaking": True,
+            "audio_fs": sample_rate,
+            "wav_format": wav_format,
+            "hotwords": hotwords,
+            "itn": True
+        }
+
+    @staticmethod
+    def _build_result(text: str, segments: List[Dict], duration: float) -> Dict:
+        """构建标准格式的结果"""
+        return {
+            "text": text,
+            "language": "zh",
+            "segments": segments,
+            "duration": duration,
+            "processing_time": datetime.now().isoformat()
+        }
+
+    async def _run_session_with_retry(self, config: Dict, make_chunks: Callable[[], Iterable[bytes]]) -> Dict:
+        """从连接池取连接完成一次会话
+
+        池中的连接可能已被服务端关闭，此时换一个新连接重试一次。
+        """
+        for attempt in range(2):
+            try:
+                async with self.pool.connection() as websocket:
+                    return await self._run_offline_session(websocket, config, make_chunks())
+            except websockets.exceptions.ConnectionClosed as e:
+                if attempt == 1:
+                    raise
+                logger.warning(f"FunASR连接已断开，重新连接后重试: {str(e)}")
+
+    @staticmethod
+    def _probe_audio(audio_file_path: str) -> Tuple[int, str]:
+        """获取音频的采样率和发送给FunASR的格式
+
+        WAV发送PCM帧，PCM原样发送，其他格式交给FunASR服务端解码。
+        """
+        lower_path = audio_file_path.lower()
+        if lower_path.endswith(".wav"):
+            with wave.open(audio_file_path, 'rb') as wav_file:
+                return wav_file.getframerate(), "pcm"
+        if lower_path.endswith(".pcm"):
+            return 16000, "pcm"
+        return 16000, "others"
+
+    @staticmethod
+    def _iter_audio_chunks(audio_file_path: str, stride: int) -> Iterator[bytes]:
+        """按固定步长逐块读取音频数据，内存占用只与步长有关"""
+        if audio_file_path.lower().endswith(".wav"):
+            with wave.open(audio_file_path, 'rb') as wav_file:
+                frame_size = wav_file.getsampwidth() * wav_file.getnchannels()
+                frames_per_chunk = max(1, stride // frame_size)
+                while True:
+                    data = wav_file.readframes(frames_per_chunk)
+                    if not data:
+                        break
+                    yield data
+        else:
+            with open(audio_file_path, 'rb') as f:
+                while True:
+                    data = f.read(stride)
+                    if not data:
+                        break
+                    yield data
+
+    @staticmethod
+    def _iter_wav_frames(audio_file_path: str, start_frame: int, end_frame: int, stride: int) -> Iterator[bytes]:
+        """按固定步长读取WAV中 [start_frame, end_frame) 范围内的PCM帧"""
+        with wave.open(audio_file_path, 'rb') as wav_file:
+            frame_size = wav_file.getsampwidth() * wav_file.getnchannels()
+            frames_per_chunk = max(1, stride // frame_size)
+            wav_file.setpos(start_frame)
+            remaining = end_frame - start_frame
+            while remaining > 0:
+                data = wav_file.readframes(min(frames_per_chunk, remaining))
+                if not data:
                     break
-                await ws.send(chunk)
-                # 接收转写结果
-                result = await ws.recv()
-                yield json.loads(result)
-    
-    def transcribe_audio(self, audio_file_path: str, language: str = "zh") -> Dict:
-        """转写音频文件"""
-        if not os.path.exists(audio_file_path):
-            raise FileNotFoundError(f"音频文件不存在: {audio_file_path}")
-            
-        # 创建事件循环并运行WebSocket客户端
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+                remaining -= len(data) // frame_size
+                yield data
+
+    async def _run_offline_session(self, websocket, config: Dict, chunks: Iterable[bytes]) -> Dict:
+        """在一个已建立的连接上完成一次离线识别会话，返回FunASR的原始结果"""
+        await websocket.send(json.dumps(config))
+        logger.info("已发送配置信息")
+
+        # 边读边发送音频数据：读取在线程池中进行，发送当前块时预读下一块
+        loop = asyncio.get_running_loop()
+        iterator = iter(chunks)
+        total_bytes = 0
+        pending = loop.run_in_executor(None, next, iterator, None)
         try:
-            result = loop.run_until_complete(self._transcribe_with_funasr(audio_file_path))
-            return result
+            while True:
+                chunk = await pending
+                if chunk is None:
+                    break
+                pending = loop.run_in_executor(None, next, iterator, None)
+                await websocket.send(chunk)
+                total_bytes += len(chunk)
         finally:
-            loop.close()
-    
+            # 发送失败时等预读结束，再关闭生成器释放其打开的文件（关闭时会执行其finally，放在线程池中进行）
+            if not pending.done():
+                await asyncio.wait([pending])
+            if inspect.isgenerator(iterator):
+                await loop.run_in_executor(None, iterator.close)
+        logger.info(f"已发送音频数据 {total_bytes} 字节")
+
+        # 发送结束标记
+        await websocket.send(json.dumps({"is_speaking": False}))
+        logger.info("已发送结束标记")
+
+        # 接收转写结果
+        while True:
+            result = await websocket.recv()
+            logger.info(f"收到结果: {result}")
+
+            if isinstance(result, str):
+                try:
+                    # 尝试解析JSON结果
+                    json_result = json.loads(result)
+                except json.JSONDecodeError:
+                    continue
+
+                if "text" not in json_result:
+                    # 如果没有text字段，使用原始文本
+                    json_result["text"] = result.split(": ")[-1].strip()
+                return json_result
+
+    def transcribe_audio(self, audio_file_path: str, language: str = "zh", hotwords: Optional[str] = None) -> Dict:
+        """转写音频文件（同步版本，只能在工作线程中调用）
+
+        事件循环中的代码请直接 await transcribe()。
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("transcribe_audio 不能在事件循环中调用，请使用 await transcribe()")
+
+        coro = self.transcribe(audio_file_path, language, hotwords)
+        if self._loop is not None and self._loop.is_running():
+            # 提交到应用主事件循环执行，以复用其中的FunASR连接池
+            return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+        return asyncio.run(coro)
+
+    def get_stats(self) -> Dict:
+        """获取连接池和结果缓存的统计信息"""
+        return {
+            "pool": self.pool.get_stats(),
+            "result_cache": self.result_cache.get_stats() if self.result_cache is not None else None
+        }
+
     def get_supported_formats(self) -> List[str]:
         """获取支持的音频格式"""
         return [".wav"]  # 目前只支持WAV格式
-    
+
     def validate_audio_file(self, file_path: str) -> bool:
         """验证音频文件是否有效"""
         try:
@@ -138,11 +596,11 @@ class ASREngine:
             _, ext = os.path.splitext(file_path.lower())
             if ext not in self.get_supported_formats():
                 return False
-            
+
             # 尝试打开WAV文件
             with wave.open(file_path, 'rb') as wav_file:
                 return wav_file.getnframes() > 0
-                
+
         except Exception:
             return False
 
@@ -151,4 +609,4 @@ asr_engine = ASREngine()
 
 def get_asr_engine() -> ASREngine:
     """获取ASR引擎实例"""
-    return asr_engine
\ No newline at end of file
+    return asr_engine
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from typing import Optional
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class FFmpegPCMDecoder:
+    """常驻的ffmpeg解码进程
+
+    每个实时会话持有一个实例：前端发来的WebM数据写入ffmpeg的stdin，
+    后台任务持续从stdout读取16位单声道PCM并累积，调用方按需取走。
+    相比每个音频块单独启动ffmpeg，省去了进程创建和临时文件读写，
+    而且容器头只需解析一次，后续块可以增量解码。
+    """
+
+    def __init__(self, sample_rate: int = 16000, input_format: Optional[str] = "webm",
+                 ffmpeg_path: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.input_format = input_format
+        self.ffmpeg_path = ffmpeg_path or settings.FFMPEG_PATH
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._stdout_task: Optional[asyncio.Task] = None
+        self._stderr_task: Optional[asyncio.Task] = None
+        self._pcm = bytearray()
+        self._data_event = asyncio.Event()
+        self._stderr_tail = b""
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.restarts = 0
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    def _build_command(self) -> list:
+        command = [self.ffmpeg_path, "-hide_banner", "-loglevel", "error",
+                   # 尽快输出，不为探测格式缓存大量输入
+                   "-fflags", "nobuffer", "-probesize", "32", "-analyzeduration", "0"]
+        if self.input_format:
+            command += ["-f", self.input_format]
+        command += ["-i", "pipe:0",
+                    "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(self.sample_rate),
+                    "pipe:1"]
+        return command
+
+    async def start(self):
+        """启动ffmpeg进程"""
+        if self.running:
+            return
+        self._process = await asyncio.create_subprocess_exec(
+            *self._build_command(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        self._stdout_task = asyncio.create_task(self._read_stdout(self._process))
+        self._stderr_task = asyncio.create_task(self._read_stderr(self._process))
+
+    async def _read_stdout(self, process: asyncio.subprocess.Process):
+        while True:
+            data = await process.stdout.read(settings.ASR_STREAM_CHUNK_SIZE)
+            if not data:
+                break
+            self._pcm.extend(data)
+            self.bytes_out += len(data)
+            self._data_event.set()
+
+    async def _read_stderr(self, process: asyncio.subprocess.Process):
+        # stderr必须持续读取，否则管道写满后ffmpeg会阻塞；只保留最后一段用于日志
+        while True:
+            data = await process.stderr.read(4096)
+            if not data:
+                break
+            self._stderr_tail = (self._stderr_tail + data)[-2048:]
+
+    async def feed(self, data: bytes):
+        """写入一段编码后的音频数据，进程意外退出时自动重启"""
+        if not self.running:
+            if self._process is not None:
+                logger.warning(f"ffmpeg解码进程已退出，重新启动: {self._stderr_tail.decode(errors='ignore')}")
+                self.restarts += 1
+            await self.start()
+        try:
+            self._process.stdin.write(data)
+            await self._process.stdin.drain()
+            self.bytes_in += len(data)
+        except (BrokenPipeError, ConnectionResetError) as e:
+            error = self._stderr_tail.decode(errors='ignore')
+            self.kill()
+            raise RuntimeError(f"ffmpeg解码失败: {error or str(e)}")
+
+    async def read_pcm(self, wait: float = 0.0) -> bytes:
+        """取走已解码的PCM数据；缓冲为空时最多等待wait秒"""
+        if not self._pcm and wait > 0:
+            self._data_event.clear()
+            try:
+                await asyncio.wait_for(self._data_event.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+        # 只取完整的16位采样，奇数字节留到下次
+        size = len(self._pcm) & ~1
+        data = bytes(self._pcm[:size])
+        del self._pcm[:size]
+        return data
+
+    async def close(self, timeout: float = 5.0) -> bytes:
+        """关闭输入并等待ffmpeg输出剩余数据，返回尚未取走的PCM"""
+        if self._process is None:
+            return await self.read_pcm()
+        process = self._process
+        try:
+            if process.stdin and not process.stdin.is_closing():
+                process.stdin.close()
+            await asyncio.wait_for(asyncio.gather(self._stdout_task, self._stderr_task), timeout=timeout)
+            await asyncio.wait_for(process.wait(), timeout=timeout)
+        except (asyncio.TimeoutError, BrokenPipeError, ConnectionResetError):
+            logger.warning("等待ffmpeg退出超时，强制结束进程")
+        finally:
+            self.kill()
+        return await self.read_pcm()
+
+    def kill(self):
+        """立即结束ffmpeg进程，不等待剩余输出"""
+        process, self._process = self._process, None
+        for task in (self._stdout_task, self._stderr_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._stdout_task = self._stderr_task = None
+        if process is not None and process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+
+    def get_stats(self) -> dict:
+        """获取解码统计信息"""
+        return {
+            "running": self.running,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "buffered": len(self._pcm),
+            "restarts": self.restarts
+        }
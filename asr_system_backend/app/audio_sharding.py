@@ -0,0 +1,201 @@
+"""
+长音频分片
+按VAD边界（或固定窗口加重叠）切分长音频，并将各分片的转写结果按顺序拼接
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from typing import List, Dict, Optional, Tuple
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# FSMN VAD为可选依赖，未安装funasr_onnx时退回固定窗口切分
+try:
+    from funasr_onnx import Fsmn_vad
+except ImportError:
+    Fsmn_vad = None
+
+_vad_model = None
+_vad_lock = threading.Lock()
+# FSMN VAD推理带有内部缓存，同一个模型实例不能并发调用，所有调用方都通过run_vad_model串行执行
+_vad_infer_lock = threading.Lock()
+
+
+def get_vad_model():
+    """加载项目自带的FSMN VAD ONNX模型，不可用时返回None"""
+    global _vad_model
+    if Fsmn_vad is None or not os.path.isdir(settings.ASR_VAD_MODEL_DIR):
+        return None
+    with _vad_lock:
+        if _vad_model is None:
+            try:
+                _vad_model = Fsmn_vad(settings.ASR_VAD_MODEL_DIR, quantize=True)
+                logger.info(f"FSMN VAD模型加载成功: {settings.ASR_VAD_MODEL_DIR}")
+            except Exception as e:
+                logger.error(f"FSMN VAD模型加载失败: {str(e)}")
+                return None
+    return _vad_model
+
+
+def run_vad_model(audio_in) -> Optional[List[List[int]]]:
+    """在推理锁内调用共享的FSMN VAD模型，返回毫秒级的语音段；模型不可用时返回None
+
+    audio_in 可以是WAV文件路径，也可以是[-1, 1]范围的float32波形。
+    """
+    model = get_vad_model()
+    if model is None:
+        return None
+    with _vad_infer_lock:
+        return model(audio_in)[0]
+
+
+def detect_speech_segments(wav_path: str) -> Optional[List[Tuple[int, int]]]:
+    """使用FSMN VAD检测语音段，返回毫秒级的 (开始, 结束) 列表；VAD不可用时返回None"""
+    try:
+        segments = run_vad_model(wav_path)
+        if segments is None:
+            return None
+        return [(int(beg), int(end)) for beg, end in segments]
+    except Exception as e:
+        logger.warning(f"VAD检测失败，改用固定窗口切分: {str(e)}")
+        return None
+
+
+def plan_fixed_shards(total_frames: int, sample_rate: int, shard_seconds: float,
+                      overlap_seconds: float) -> List[Tuple[int, int, int]]:
+    """按固定窗口切分，返回 (开始帧, 结束帧, 与上一分片的重叠帧数) 列表"""
+    shard_frames = max(1, int(shard_seconds * sample_rate))
+    overlap_frames = min(int(overlap_seconds * sample_rate), shard_frames // 2)
+    step = shard_frames - overlap_frames
+
+    shards = []
+    start = 0
+    while start < total_frames:
+        end = min(start + shard_frames, total_frames)
+        shards.append((start, end, overlap_frames if shards else 0))
+        if end >= total_frames:
+            break
+        start += step
+    return shards
+
+
+def plan_vad_shards(total_frames: int, sample_rate: int, speech_segments: List[Tuple[int, int]],
+                    shard_seconds: float, overlap_seconds: float) -> List[Tuple[int, int, int]]:
+    """按VAD边界切分：相邻语音段合并到分片长度上限，在静音处切开
+
+    超过分片长度的单个语音段再按固定窗口加重叠切分。
+    """
+    shard_frames = int(shard_seconds * sample_rate)
+
+    def to_frame(ms):
+        return min(total_frames, int(ms * sample_rate / 1000))
+
+    # 先把语音段合并成不超过分片长度的组
+    groups: List[Tuple[int, int]] = []
+    for beg_ms, end_ms in speech_segments:
+        beg, end = to_frame(beg_ms), to_frame(end_ms)
+        if end <= beg:
+            continue
+        if groups and end - groups[-1][0] <= shard_frames:
+            groups[-1] = (groups[-1][0], end)
+        else:
+            groups.append((beg, end))
+
+    shards: List[Tuple[int, int, int]] = []
+    for beg, end in groups:
+        if end - beg <= shard_frames:
+            shards.append((beg, end, 0))
+            continue
+        for sub_beg, sub_end, overlap in plan_fixed_shards(end - beg, sample_rate, shard_seconds, overlap_seconds):
+            shards.append((beg + sub_beg, beg + sub_end, overlap))
+    return shards
+
+
+# FunASR的时间戳按token给出：中文每个字一个，英文和数字每个词一个，标点和空格没有时间戳
+_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9']+|[^\W_]")
+_LEADING_PUNCTUATION = re.compile(r"^[\W_]+")
+
+
+def _tokens(text: str) -> List[re.Match]:
+    """把文本切分为与时间戳一一对应的token"""
+    return list(_TOKEN_PATTERN.finditer(text))
+
+
+def _overlap_tokens(prev_tokens: List[str], next_tokens: List[str], max_tokens: int) -> int:
+    """找出上一分片结尾与下一分片开头重复的最长token数（忽略标点和大小写）"""
+    limit = min(len(prev_tokens), len(next_tokens), max_tokens)
+    for k in range(limit, 0, -1):
+        if prev_tokens[-k:] == next_tokens[:k]:
+            return k
+    return 0
+
+
+def _drop_overlap(prev_text: str, text: str, max_tokens: int) -> Tuple[str, int]:
+    """去掉text开头与prev_text结尾重复的部分，返回 (剩余文本, 去掉的token数)
+
+    比较时忽略标点（带标点和ITN的结果如"很好。"与"很好，"也能对齐），
+    去掉重复token后，紧跟其后的标点一并去掉。
+    """
+    # 只需比较上一分片末尾的一小段，英文单词按平均长度留足余量
+    prev_tokens = [match.group().lower() for match in _tokens(prev_text[-max_tokens * 16:])]
+    next_matches = _tokens(text)
+    duplicated = _overlap_tokens(prev_tokens, [match.group().lower() for match in next_matches], max_tokens)
+    if not duplicated:
+        return text, 0
+    rest = text[next_matches[duplicated - 1].end():]
+    return _LEADING_PUNCTUATION.sub("", rest), duplicated
+
+
+def _parse_timestamps(raw) -> List[List[int]]:
+    """解析FunASR返回的时间戳（可能是JSON字符串或列表）"""
+    if not raw:
+        return []
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError:
+            return []
+    return [list(item) for item in raw if isinstance(item, (list, tuple)) and len(item) == 2]
+
+
+def stitch_shard_results(shards: List[Tuple[int, int, int]], results: List[Dict],
+                         sample_rate: int) -> Tuple[str, List[Dict], List[List[int]]]:
+    """按顺序拼接各分片的文本和时间戳
+
+    有重叠的分片会去掉与上一分片重复的开头文字及对应的时间戳。
+    返回 (完整文本, 分段列表, 全局时间戳)。
+    """
+    full_text = ""
+    segments = []
+    timestamps: List[List[int]] = []
+
+    for index, ((start, end, overlap), result) in enumerate(zip(shards, results)):
+        text = (result.get("text") or "").strip()
+        offset_ms = int(start * 1000 / sample_rate)
+        shard_timestamps = [[beg + offset_ms, stop + offset_ms]
+                            for beg, stop in _parse_timestamps(result.get("timestamp"))]
+
+        if overlap and full_text:
+            # 重叠部分按每秒最多约10个字估计
+            max_tokens = max(1, int(overlap / sample_rate * 10))
+            text, duplicated = _drop_overlap(full_text, text, max_tokens)
+            # 时间戳按token对应，按去掉的token数丢弃
+            shard_timestamps = shard_timestamps[duplicated:]
+
+        full_text += text
+        timestamps.extend(shard_timestamps)
+        if text:
+            segments.append({
+                "segment_id": index,
+                "start_time": shard_timestamps[0][0] / 1000 if shard_timestamps else start / sample_rate,
+                "end_time": shard_timestamps[-1][1] / 1000 if shard_timestamps else end / sample_rate,
+                "text": text,
+                "confidence": 1.0  # FunASR离线模式不提供置信度
+            })
+
+    return full_text, segments, timestamps
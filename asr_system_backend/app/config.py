@@ -39,7 +39,65 @@ class Settings:
     ASR_ENABLE_GPU: bool = os.getenv("ASR_ENABLE_GPU", "true").lower() == "true"
     ASR_MAX_FILE_SIZE_MB: int = int(os.getenv("ASR_MAX_FILE_SIZE_MB", "100"))
     ASR_SUPPORTED_FORMATS: list = [".wav", ".mp3", ".m4a", ".flac", ".aac", ".ogg"]
+    ASR_STREAM_CHUNK_SIZE: int = int(os.getenv("ASR_STREAM_CHUNK_SIZE", str(64 * 1024)))  # 上传落盘及发送给FunASR的分块大小(字节)
     
+    # FunASR服务配置
+    FUNASR_HOST: str = os.getenv("FUNASR_HOST", "127.0.0.1")
+    FUNASR_PORT: int = int(os.getenv("FUNASR_PORT", "10095"))
+    FUNASR_USE_SSL: bool = os.getenv("FUNASR_USE_SSL", "true").lower() == "true"
+    FUNASR_POOL_MIN_SIZE: int = int(os.getenv("FUNASR_POOL_MIN_SIZE", "1"))
+    FUNASR_POOL_MAX_SIZE: int = int(os.getenv("FUNASR_POOL_MAX_SIZE", "4"))
+    FUNASR_POOL_PING_INTERVAL: float = float(os.getenv("FUNASR_POOL_PING_INTERVAL", "20"))  # 空闲连接健康检查间隔(秒)
+    FUNASR_POOL_PING_TIMEOUT: float = float(os.getenv("FUNASR_POOL_PING_TIMEOUT", "10"))
+    FUNASR_RECONNECT_RETRIES: int = int(os.getenv("FUNASR_RECONNECT_RETRIES", "3"))
+    FUNASR_RECONNECT_BACKOFF: float = float(os.getenv("FUNASR_RECONNECT_BACKOFF", "0.5"))  # 首次重连等待(秒)，之后指数翻倍
+    FUNASR_RECONNECT_BACKOFF_MAX: float = float(os.getenv("FUNASR_RECONNECT_BACKOFF_MAX", "8"))
+    # 转写结果缓存配置
+    ASR_RESULT_CACHE_ENABLED: bool = os.getenv("ASR_RESULT_CACHE_ENABLED", "true").lower() == "true"
+    ASR_RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("ASR_RESULT_CACHE_MAX_ENTRIES", "1000"))
+    ASR_RESULT_CACHE_MAX_BYTES: int = int(os.getenv("ASR_RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    ASR_RESULT_CACHE_TTL: int = int(os.getenv("ASR_RESULT_CACHE_TTL", "86400"))  # 1天
+    ASR_RESULT_CACHE_DIR: str = os.getenv("ASR_RESULT_CACHE_DIR", "")  # 为空时不启用磁盘缓存
+    ASR_RESULT_CACHE_DISK_MAX_BYTES: int = int(os.getenv("ASR_RESULT_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))  # 磁盘缓存总大小上限，超过后按LRU删除
+    # 热词文件，默认与client目录下的FunASR客户端脚本共用项目根目录的hotwords.txt
+    ASR_HOTWORDS_FILE: str = os.getenv(
+        "ASR_HOTWORDS_FILE",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "hotwords.txt")
+    )
+    # 实时转写会话的常驻ffmpeg解码进程
+    FFMPEG_PATH: str = os.getenv("FFMPEG_PATH", "ffmpeg")
+    # 实时转写的FunASR识别模式：2pass/online为流式识别，offline为每隔几秒整段识别
+    # docker.md部署的是离线服务（funasr-runtime-sdk-cpu），只支持offline；使用流式服务（funasr-runtime-sdk-online-cpu）时再改为2pass
+    FUNASR_REALTIME_MODE: str = os.getenv("FUNASR_REALTIME_MODE", "offline")
+    FUNASR_STREAM_QUEUE_SIZE: int = int(os.getenv("FUNASR_STREAM_QUEUE_SIZE", "50"))  # 流式识别发送队列中最多缓存的音频块数
+    # 长音频分片并行转写配置
+    ASR_LONG_AUDIO_THRESHOLD_SECONDS: float = float(os.getenv("ASR_LONG_AUDIO_THRESHOLD_SECONDS", "120"))  # 超过该时长的WAV分片转写
+    ASR_SHARD_SECONDS: float = float(os.getenv("ASR_SHARD_SECONDS", "30"))  # 单个分片最大时长
+    ASR_SHARD_OVERLAP_SECONDS: float = float(os.getenv("ASR_SHARD_OVERLAP_SECONDS", "1.0"))  # 固定窗口切分时相邻分片的重叠
+    ASR_SHARD_MAX_PARALLEL: int = int(os.getenv("ASR_SHARD_MAX_PARALLEL", "3"))  # 单个文件同时占用的FunASR连接数上限
+    ASR_VAD_MODEL_DIR: str = os.getenv(
+        "ASR_VAD_MODEL_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                     "models", "damo", "speech_fsmn_vad_zh-cn-16k-common-onnx")
+    )
+    # 实时转写语音门控：静音不发送给ASR，片段在语音边界处切开
+    REALTIME_VAD_ENABLED: bool = os.getenv("REALTIME_VAD_ENABLED", "true").lower() == "true"
+    REALTIME_VAD_ENERGY_DB: float = float(os.getenv("REALTIME_VAD_ENERGY_DB", "-45"))  # 帧能量(dBFS)高于该值视为有声
+    REALTIME_VAD_FRAME_MS: int = int(os.getenv("REALTIME_VAD_FRAME_MS", "30"))
+    REALTIME_VAD_MIN_SPEECH_MS: int = int(os.getenv("REALTIME_VAD_MIN_SPEECH_MS", "90"))  # 连续有声达到该时长才开始片段
+    REALTIME_VAD_END_SILENCE_MS: int = int(os.getenv("REALTIME_VAD_END_SILENCE_MS", "400"))  # 静音持续该时长后切开片段
+    REALTIME_VAD_PAD_MS: int = int(os.getenv("REALTIME_VAD_PAD_MS", "200"))  # 片段前后保留的静音
+    REALTIME_VAD_MAX_SEGMENT_SECONDS: float = float(os.getenv("REALTIME_VAD_MAX_SEGMENT_SECONDS", "6"))  # 单个片段最长时长
+    REALTIME_VAD_USE_MODEL: bool = os.getenv("REALTIME_VAD_USE_MODEL", "true").lower() == "true"  # 用FSMN VAD模型复核片段
+    # Whisper实时转写配置（realtime_asr.RealtimeASRHandler）
+    WHISPER_MODEL_NAME: str = os.getenv("WHISPER_MODEL_NAME", "openai/whisper-small")
+    WHISPER_BACKEND: str = os.getenv("WHISPER_BACKEND", "pytorch").lower()  # 推理后端：pytorch、int8、onnx
+    WHISPER_ONNX_DIR: str = os.getenv("WHISPER_ONNX_DIR", "")  # 已导出的ONNX模型目录，为空时启动时从WHISPER_MODEL_NAME导出
+    WHISPER_BATCH_MAX_SIZE: int = int(os.getenv("WHISPER_BATCH_MAX_SIZE", "8"))  # 单次推理最多合并的会话窗口数
+    WHISPER_BATCH_WAIT_MS: float = float(os.getenv("WHISPER_BATCH_WAIT_MS", "50"))  # 收到第一个窗口后等待其他会话的时间
+    WHISPER_INFERENCE_WORKERS: int = int(os.getenv("WHISPER_INFERENCE_WORKERS", "1"))  # 专用推理线程数（同时执行的批次数）
+    WHISPER_TORCH_THREADS: int = int(os.getenv("WHISPER_TORCH_THREADS", "0"))  # 每个推理线程的torch线程数，0表示CPU核数/推理线程数
+
     # 文件存储配置
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
     TEMP_DIR: str = os.getenv("TEMP_DIR", "temp")
@@ -49,6 +107,35 @@ class Settings:
     RAG_MODEL_NAME: str = os.getenv("RAG_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
     RAG_VECTOR_DIMENSION: int = 384
     RAG_SIMILARITY_THRESHOLD: float = float(os.getenv("RAG_SIMILARITY_THRESHOLD", "0.5"))
+    # 句向量缓存配置
+    RAG_EMBEDDING_CACHE_ENABLED: bool = os.getenv("RAG_EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    RAG_EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("RAG_EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+    RAG_EMBEDDING_CACHE_DIR: str = os.getenv("RAG_EMBEDDING_CACHE_DIR", "")  # 为空时不启用磁盘缓存
+    # 查询编码微批处理配置
+    RAG_QUERY_BATCH_ENABLED: bool = os.getenv("RAG_QUERY_BATCH_ENABLED", "true").lower() == "true"
+    RAG_QUERY_BATCH_MAX_SIZE: int = int(os.getenv("RAG_QUERY_BATCH_MAX_SIZE", "32"))
+    RAG_QUERY_BATCH_WAIT_MS: float = float(os.getenv("RAG_QUERY_BATCH_WAIT_MS", "5"))
+    # 热词索引类型：flat（暴力搜索）、hnsw、ivf_flat、ivf_pq
+    RAG_INDEX_TYPE: str = os.getenv("RAG_INDEX_TYPE", "flat").lower()
+    RAG_ANN_MIN_VECTORS: int = int(os.getenv("RAG_ANN_MIN_VECTORS", "1000"))  # 热词数少于此值时仍使用flat
+    RAG_HNSW_M: int = int(os.getenv("RAG_HNSW_M", "32"))
+    RAG_HNSW_EF_CONSTRUCTION: int = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "80"))
+    RAG_HNSW_EF_SEARCH: int = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+    RAG_IVF_NLIST: int = int(os.getenv("RAG_IVF_NLIST", "0"))  # 0表示按热词数量自动选择
+    RAG_IVF_NPROBE: int = int(os.getenv("RAG_IVF_NPROBE", "8"))
+    RAG_PQ_M: int = int(os.getenv("RAG_PQ_M", "16"))
+    RAG_INDEX_REBUILD_DELETED_RATIO: float = float(os.getenv("RAG_INDEX_REBUILD_DELETED_RATIO", "0.2"))
+    RAG_INDEX_RETRAIN_GROWTH: float = float(os.getenv("RAG_INDEX_RETRAIN_GROWTH", "2.0"))
+    # 加载已保存的索引时直接映射文件，向量数据不占用进程内存，多个进程共享页缓存
+    RAG_INDEX_MMAP: bool = os.getenv("RAG_INDEX_MMAP", "true").lower() == "true"
+    # 启动时预加载句子嵌入模型；后台预热时服务可同时接受请求，就绪状态见/rag/health
+    RAG_WARMUP_ON_STARTUP: bool = os.getenv("RAG_WARMUP_ON_STARTUP", "true").lower() == "true"
+    RAG_WARMUP_BACKGROUND: bool = os.getenv("RAG_WARMUP_BACKGROUND", "true").lower() == "true"
+    RAG_INDEX_LOADER_WORKERS: int = int(os.getenv("RAG_INDEX_LOADER_WORKERS", "2"))  # 后台加载用户索引的线程数
+    # 热词变化后在该时间内合并写入索引文件，0表示每次变化后立即同步写入
+    RAG_PERSIST_INTERVAL_SECONDS: float = float(os.getenv("RAG_PERSIST_INTERVAL_SECONDS", "2.0"))
+    # 每个用户的热词数量上限
+    HOTWORD_MAX_PER_USER: int = int(os.getenv("HOTWORD_MAX_PER_USER", "100"))
     
     # 日志配置
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -66,6 +153,7 @@ class Settings:
     # 性能配置
     BACKGROUND_TASK_WORKERS: int = int(os.getenv("BACKGROUND_TASK_WORKERS", "2"))
     ASR_PROCESSING_TIMEOUT: int = int(os.getenv("ASR_PROCESSING_TIMEOUT", "300"))  # 5分钟
+    TRANSCRIPTION_QUEUE_MAX_SIZE: int = int(os.getenv("TRANSCRIPTION_QUEUE_MAX_SIZE", "100"))  # 排队中的转写任务上限
     
     def __init__(self):
         # 确保上传目录存在
@@ -84,13 +172,63 @@ class Settings:
             "processing_timeout": self.ASR_PROCESSING_TIMEOUT
         }
     
+    @property
+    def funasr_config(self) -> dict:
+        """获取FunASR服务及连接池配置"""
+        return {
+            "host": self.FUNASR_HOST,
+            "port": self.FUNASR_PORT,
+            "use_ssl": self.FUNASR_USE_SSL,
+            "pool_min_size": self.FUNASR_POOL_MIN_SIZE,
+            "pool_max_size": self.FUNASR_POOL_MAX_SIZE,
+            "ping_interval": self.FUNASR_POOL_PING_INTERVAL,
+            "ping_timeout": self.FUNASR_POOL_PING_TIMEOUT,
+            "reconnect_retries": self.FUNASR_RECONNECT_RETRIES,
+            "reconnect_backoff": self.FUNASR_RECONNECT_BACKOFF,
+            "reconnect_backoff_max": self.FUNASR_RECONNECT_BACKOFF_MAX
+        }
+    
+    @property
+    def whisper_config(self) -> dict:
+        """获取Whisper实时转写配置"""
+        return {
+            "model_name": self.WHISPER_MODEL_NAME,
+            "backend": self.WHISPER_BACKEND,
+            "onnx_dir": self.WHISPER_ONNX_DIR,
+            "batch_max_size": self.WHISPER_BATCH_MAX_SIZE,
+            "batch_wait_ms": self.WHISPER_BATCH_WAIT_MS,
+            "inference_workers": self.WHISPER_INFERENCE_WORKERS,
+            "torch_threads": self.WHISPER_TORCH_THREADS
+        }
+    
     @property
     def rag_config(self) -> dict:
         """获取RAG服务配置"""
         return {
             "model_name": self.RAG_MODEL_NAME,
             "vector_dimension": self.RAG_VECTOR_DIMENSION,
-            "similarity_threshold": self.RAG_SIMILARITY_THRESHOLD
+            "similarity_threshold": self.RAG_SIMILARITY_THRESHOLD,
+            "embedding_cache_enabled": self.RAG_EMBEDDING_CACHE_ENABLED,
+            "embedding_cache_max_entries": self.RAG_EMBEDDING_CACHE_MAX_ENTRIES,
+            "embedding_cache_dir": self.RAG_EMBEDDING_CACHE_DIR,
+            "query_batch_enabled": self.RAG_QUERY_BATCH_ENABLED,
+            "query_batch_max_size": self.RAG_QUERY_BATCH_MAX_SIZE,
+            "query_batch_wait_ms": self.RAG_QUERY_BATCH_WAIT_MS,
+            "index_type": self.RAG_INDEX_TYPE,
+            "ann_min_vectors": self.RAG_ANN_MIN_VECTORS,
+            "hnsw_m": self.RAG_HNSW_M,
+            "hnsw_ef_construction": self.RAG_HNSW_EF_CONSTRUCTION,
+            "hnsw_ef_search": self.RAG_HNSW_EF_SEARCH,
+            "ivf_nlist": self.RAG_IVF_NLIST,
+            "ivf_nprobe": self.RAG_IVF_NPROBE,
+            "pq_m": self.RAG_PQ_M,
+            "rebuild_deleted_ratio": self.RAG_INDEX_REBUILD_DELETED_RATIO,
+            "retrain_growth": self.RAG_INDEX_RETRAIN_GROWTH,
+            "index_mmap": self.RAG_INDEX_MMAP,
+            "warmup_on_startup": self.RAG_WARMUP_ON_STARTUP,
+            "warmup_background": self.RAG_WARMUP_BACKGROUND,
+            "index_loader_workers": self.RAG_INDEX_LOADER_WORKERS,
+            "persist_interval_seconds": self.RAG_PERSIST_INTERVAL_SECONDS
         }
 
 # 全局配置实例
@@ -0,0 +1,202 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+from .config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，磁盘层只保证单进程写入安全
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class EmbeddingCache:
+    """句向量缓存
+
+    键由模型名称和规范化后的文本组成，同一个词或查询只需经过一次模型前向计算。
+    内存层按LRU淘汰；可选的磁盘层把float32向量追加写入文件并通过内存映射读取，
+    另有一个按行记录键的文件，进程重启或多个worker之间都可以复用已计算的向量。
+    """
+
+    def __init__(self, model_name: str, dimension: int, max_entries: int = 10000,
+                 disk_dir: Optional[str] = None):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir or None
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # 磁盘层：键 -> 向量文件中的行号
+        self._disk_rows: Dict[str, int] = {}
+        self._disk_row_count = 0  # 键文件中的行数，即向量文件中的向量数
+        self._keys_offset = 0
+        self._vectors: Optional[np.memmap] = None
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            prefix = f"{re.sub(r'[^0-9A-Za-z]+', '_', model_name)}_{dimension}"
+            self._vectors_path = os.path.join(self.disk_dir, f"{prefix}.f32")
+            self._keys_path = os.path.join(self.disk_dir, f"{prefix}.keys")
+            self._sync_disk_index()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """规范化文本：统一全半角等Unicode形式并合并空白"""
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+
+    def make_key(self, text: str) -> str:
+        """根据模型名称和规范化后的文本生成缓存键"""
+        return hashlib.sha1(f"{self.model_name}\0{self.normalize(text)}".encode('utf-8')).hexdigest()
+
+    def encode(self, texts: Sequence[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """返回文本的向量，只有未命中的文本（去重后）交给encode_fn计算"""
+        result = np.empty((len(texts), self.dimension), dtype=np.float32)
+        missing: "OrderedDict[str, tuple]" = OrderedDict()  # 键 -> (文本, 在结果中的位置)
+
+        for position, text in enumerate(texts):
+            key = self.make_key(text)
+            vector = self.get(key)
+            if vector is None:
+                missing.setdefault(key, (text, []))[1].append(position)
+            else:
+                result[position] = vector
+
+        if missing:
+            keys = list(missing)
+            vectors = np.asarray(encode_fn([missing[key][0] for key in keys]), dtype=np.float32)
+            for key, vector in zip(keys, vectors):
+                for position in missing[key][1]:
+                    result[position] = vector
+                self._put_memory(key, vector)
+            if self.disk_dir:
+                self._write_disk(keys, vectors)
+        return result
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """查询单个键，未命中时返回None"""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        if self.disk_dir:
+            vector = self._read_disk(key)
+            if vector is not None:
+                self._put_memory(key, vector)
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _put_memory(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _sync_disk_index(self):
+        """读取其他进程新追加的键，并在需要时重新映射向量文件，调用方需持有锁或处于初始化阶段"""
+        try:
+            with open(self._keys_path, 'r', encoding='utf-8') as f:
+                f.seek(self._keys_offset)
+                while True:
+                    line = f.readline()
+                    # 只处理完整的行，写到一半的行留到下次
+                    if not line.endswith("\n"):
+                        break
+                    self._disk_rows.setdefault(line.strip(), self._disk_row_count)
+                    self._disk_row_count += 1
+                    self._keys_offset = f.tell()
+        except FileNotFoundError:
+            return
+
+        rows = self._disk_row_count
+        if rows and (self._vectors is None or self._vectors.shape[0] < rows):
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r',
+                                      shape=(rows, self.dimension))
+
+    def _read_disk(self, key: str) -> Optional[np.ndarray]:
+        try:
+            with self._lock:
+                row = self._disk_rows.get(key)
+                if row is None:
+                    self._sync_disk_index()
+                    row = self._disk_rows.get(key)
+                if row is None:
+                    return None
+                return np.array(self._vectors[row], dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"读取磁盘向量缓存失败: {str(e)}")
+            return None
+
+    def _write_disk(self, keys: List[str], vectors: np.ndarray):
+        """把新向量追加到磁盘层：先写向量再写键，读取方不会看到没有向量的键"""
+        try:
+            with self._lock, open(self._keys_path, 'a', encoding='utf-8') as keys_file:
+                if fcntl is not None:
+                    fcntl.flock(keys_file, fcntl.LOCK_EX)
+                try:
+                    self._sync_disk_index()
+                    new = [(key, vector) for key, vector in zip(keys, vectors) if key not in self._disk_rows]
+                    if not new:
+                        return
+                    with open(self._vectors_path, 'ab') as vectors_file:
+                        # 丢弃上次异常中断时多写的向量，保证行号与键文件一致
+                        vectors_file.truncate(self._disk_row_count * self.dimension * 4)
+                        vectors_file.write(np.stack([vector for _, vector in new]).astype(np.float32).tobytes())
+                    keys_file.write("".join(f"{key}\n" for key, _ in new))
+                    keys_file.flush()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(keys_file, fcntl.LOCK_UN)
+        except Exception as e:
+            logger.warning(f"写入磁盘向量缓存失败: {str(e)}")
+
+    def clear(self):
+        """清空内存层缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model_name": self.model_name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk_dir": self.disk_dir,
+                "disk_entries": len(self._disk_rows),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+def create_embedding_cache(model_name: str, dimension: int) -> Optional[EmbeddingCache]:
+    """根据配置创建句向量缓存，未启用时返回None"""
+    if not settings.RAG_EMBEDDING_CACHE_ENABLED:
+        return None
+    return EmbeddingCache(
+        model_name,
+        dimension,
+        max_entries=settings.RAG_EMBEDDING_CACHE_MAX_ENTRIES,
+        disk_dir=settings.RAG_EMBEDDING_CACHE_DIR
+    )
@@ -0,0 +1,151 @@
+import unicodedata
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, List, Sequence, Tuple
+
+def _fold(char: str) -> str:
+    """单个字符的小写形式；小写后长度变化的字符（如'İ'）保持原样，保证位置一一对应"""
+    lowered = char.lower()
+    return lowered if len(lowered) == 1 else char
+
+_CJK_PREFIXES = ("CJK", "HIRAGANA", "KATAKANA", "HANGUL")
+
+def _is_word_char(char: str) -> bool:
+    """是否为需要按词边界匹配的字符（拉丁字母、数字等）；中日韩文字之间没有空格，不算在内"""
+    if not (char.isalnum() or char == "_"):
+        return False
+    return not unicodedata.name(char, "").startswith(_CJK_PREFIXES)
+
+class HotwordMatcher:
+    """用户热词的Aho-Corasick多模式匹配器（不区分大小写）
+
+    热词变化后重新构建，之后每次匹配只需对文本扫描一遍即可找出所有热词出现的位置，
+    耗时与文本长度加匹配数成正比，与热词数量无关。
+    热词以字母或数字开头（结尾）时，其前（后）一个字符不能也是字母或数字，
+    避免"AI"匹配到"said"中间；中文热词仍按子串匹配。
+    """
+
+    def __init__(self, words: Sequence[str], weights: Sequence[int]):
+        self.words: List[str] = []  # 模式编号 -> 热词原文（用于大小写修正）
+        self.weights: List[int] = []
+        self._goto: List[Dict[str, int]] = [{}]  # 状态 -> {字符: 下一状态}
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]  # 状态 -> 在该状态结束的模式编号
+
+        seen = {}
+        for word, weight in zip(words, weights):
+            if not word:
+                continue
+            folded = "".join(_fold(char) for char in word)
+            # 只有大小写不同的热词视为同一个，保留权重较高的写法
+            existing = seen.get(folded)
+            if existing is not None:
+                if weight > self.weights[existing]:
+                    self.words[existing], self.weights[existing] = word, weight
+                continue
+            seen[folded] = len(self.words)
+            self._insert(folded, len(self.words))
+            self.words.append(word)
+            self.weights.append(weight)
+        self._lengths = [len(word) for word in self.words]
+        self._left_boundary = [_is_word_char(word[0]) for word in self.words]
+        self._right_boundary = [_is_word_char(word[-1]) for word in self.words]
+        self._build_fail_links()
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def _insert(self, folded: str, pattern: int):
+        state = 0
+        for char in folded:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern)
+
+    def _build_fail_links(self):
+        """按层次遍历设置失败指针，并把失败指针所指状态的输出合并进来"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                # 第一层状态的失败指针指向根
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        """返回所有匹配 (起始位置, 结束位置, 模式编号)，包括相互重叠的匹配"""
+        matches = []
+        state = 0
+        goto, fail, output, lengths = self._goto, self._fail, self._output, self._lengths
+        for end, char in enumerate(text, 1):
+            char = _fold(char)
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern in output[state]:
+                start = end - lengths[pattern]
+                if self._left_boundary[pattern] and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if self._right_boundary[pattern] and end < len(text) and _is_word_char(text[end]):
+                    continue
+                matches.append((start, end, pattern))
+        return matches
+
+    def match(self, text: str) -> Tuple[str, List[Tuple[int, int, int]]]:
+        """找出不重叠的热词出现（同一位置取最长、从左到右），并把它们替换为热词原文的大小写
+
+        Returns:
+            (修正大小写后的文本, 选中的匹配列表)
+        """
+        selected = []
+        position = 0
+        for start, end, pattern in sorted(self.find_all(text), key=lambda m: (m[0], -m[1])):
+            if start >= position:
+                selected.append((start, end, pattern))
+                position = end
+
+        if not selected:
+            return text, selected
+        parts = []
+        position = 0
+        for start, end, pattern in selected:
+            parts.append(text[position:start])
+            parts.append(self.words[pattern])
+            position = end
+        parts.append(text[position:])
+        return "".join(parts), selected
+
+class PrefixIndex:
+    """按小写形式排序的热词数组，用二分查找回答前缀查询
+
+    查询耗时为 O(log n + 前缀长度 + 结果数)，与用户的热词总数基本无关。
+    """
+
+    def __init__(self, words: Sequence[str]):
+        entries = sorted({(word.lower(), word) for word in words if word})
+        self._keys = [key for key, _ in entries]
+        self._words = [word for _, word in entries]
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def lookup(self, prefix: str, limit: int) -> List[str]:
+        """返回以prefix开头（不区分大小写）的热词，按字典序最多limit个"""
+        prefix = prefix.lower()
+        results = []
+        position = bisect_left(self._keys, prefix)
+        while position < len(self._keys) and len(results) < limit and self._keys[position].startswith(prefix):
+            results.append(self._words[position])
+            position += 1
+        return results
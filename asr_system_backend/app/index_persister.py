@@ -0,0 +1,106 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class IndexPersister:
+    """用户索引的延迟写入器
+
+    热词变化时只把用户标记为待保存，后台线程在第一次标记后的 interval 秒内合并同一用户的多次变化，
+    到期后调用 save_fn 写入一次；请求线程不再等待磁盘写入。
+    interval 不大于0时退化为在调用线程中立即保存。
+    """
+
+    def __init__(self, save_fn: Callable[[str], bool], interval: float = 2.0):
+        self.save_fn = save_fn
+        self.interval = interval
+        self._dirty: Dict[str, float] = {}  # 用户ID -> 第一次标记的时间
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = False
+        self.marks = 0
+        self.writes = 0
+        self.failures = 0
+
+    def mark_dirty(self, user_id: str):
+        """标记用户索引需要保存"""
+        if self.interval <= 0:
+            self._save(user_id)
+            return
+        with self._cond:
+            self.marks += 1
+            if user_id not in self._dirty:
+                self._dirty[user_id] = time.monotonic()
+                self._cond.notify()
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping = False
+                self._worker = threading.Thread(target=self._run, name="rag-index-persister", daemon=True)
+                self._worker.start()
+
+    def discard(self, user_id: str):
+        """取消用户的待保存标记（例如索引已被删除）"""
+        with self._cond:
+            self._dirty.pop(user_id, None)
+
+    def _save(self, user_id: str):
+        try:
+            if self.save_fn(user_id):
+                self.writes += 1
+            else:
+                self.failures += 1
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"后台保存用户 {user_id} 的索引失败: {str(e)}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._dirty:
+                        due = min(self._dirty.values()) + self.interval
+                        remaining = due - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(timeout=remaining)
+                    else:
+                        self._cond.wait()
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                ready = [user_id for user_id, marked in self._dirty.items() if marked + self.interval <= now]
+                for user_id in ready:
+                    del self._dirty[user_id]
+            # 保存期间再次标记的用户会重新进入待保存列表
+            for user_id in ready:
+                self._save(user_id)
+
+    def flush(self):
+        """立即保存所有待保存的用户索引"""
+        with self._cond:
+            pending = list(self._dirty)
+            self._dirty.clear()
+        for user_id in pending:
+            self._save(user_id)
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台线程并保存剩余的变化"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout=timeout)
+        self.flush()
+
+    def get_stats(self) -> Dict:
+        """获取写入统计信息"""
+        with self._cond:
+            pending = len(self._dirty)
+        return {
+            "interval_seconds": self.interval,
+            "pending_users": pending,
+            "marks": self.marks,
+            "writes": self.writes,
+            "failures": self.failures
+        }
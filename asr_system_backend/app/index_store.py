@@ -0,0 +1,114 @@
+import os
+import mmap
+import time
+import struct
+from typing import Dict, Iterable, List
+import numpy as np
+import faiss
+
+# 元数据文件格式（小端）：
+#   文件头：魔数、版本、向量维度、热词数n、已标记删除数m、保存时间戳
+#   按列存放：labels int64[n]、weights int32[n]、deleted int64[m]、
+#   words和ids两个字符串列，各为偏移量 uint64[n+1] 加UTF-8字节串
+METADATA_MAGIC = b"RAGM"
+METADATA_VERSION = 1
+_HEADER = struct.Struct("<4sIIIId")
+
+def _atomic_replace(path: str, write_fn):
+    """先写入临时文件再替换，其他进程已映射的旧文件不受影响，也不会读到写了一半的文件"""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def write_index(index: faiss.Index, path: str):
+    """原子地保存FAISS索引"""
+    _atomic_replace(path, lambda tmp_path: faiss.write_index(index, tmp_path))
+
+def read_index(path: str, use_mmap: bool = True) -> faiss.Index:
+    """读取FAISS索引；use_mmap为True时向量数据直接映射文件（只读），由操作系统按需换入换出"""
+    if use_mmap:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC)
+    return faiss.read_index(path)
+
+def materialize(index: faiss.Index) -> faiss.Index:
+    """把内存映射的只读索引复制为可修改的普通索引
+
+    映射的索引上增删向量会直接导致进程终止，修改前必须先调用。
+    """
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+def _string_column(values: Iterable[str]):
+    encoded = [str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(item) for item in encoded])
+    return offsets, b"".join(encoded)
+
+def write_metadata(path: str, metadata: Dict[str, List], labels: Iterable[int], deleted_labels: Iterable[int],
+                   dimension: int):
+    """原子地保存热词元数据（words、weights、ids三列与索引ID）"""
+    count = len(metadata['words'])
+    labels = np.asarray(list(labels), dtype=np.int64)
+    deleted = np.asarray(sorted(deleted_labels), dtype=np.int64)
+    words_offsets, words_blob = _string_column(metadata['words'])
+    ids_offsets, ids_blob = _string_column(metadata['ids'])
+
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(METADATA_MAGIC, METADATA_VERSION, dimension, count, len(deleted), time.time()))
+            f.write(labels.tobytes())
+            f.write(np.asarray(metadata['weights'], dtype=np.int32).tobytes())
+            f.write(deleted.tobytes())
+            for offsets, blob in ((words_offsets, words_blob), (ids_offsets, ids_blob)):
+                f.write(offsets.tobytes())
+                f.write(blob)
+
+    _atomic_replace(path, write)
+
+def read_metadata(path: str) -> Dict:
+    """读取write_metadata保存的元数据，格式不符时抛出ValueError"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if len(data) < _HEADER.size:
+            raise ValueError("元数据文件不完整")
+        magic, version, dimension, count, deleted_count, updated_at = _HEADER.unpack_from(data, 0)
+        if magic != METADATA_MAGIC or version != METADATA_VERSION:
+            raise ValueError("元数据文件格式不支持")
+
+        offset = _HEADER.size
+
+        def column(dtype, length):
+            nonlocal offset
+            values = np.frombuffer(data, dtype=dtype, count=length, offset=offset).copy()
+            offset += values.nbytes
+            return values
+
+        def strings():
+            nonlocal offset
+            offsets = column(np.uint64, count + 1)
+            blob = data[offset:offset + int(offsets[-1])]
+            offset += len(blob)
+            text = blob.decode('utf-8')
+            if len(text) == len(blob):
+                # 纯ASCII时字符偏移与字节偏移相同，直接按偏移切分
+                return [text[int(start):int(end)] for start, end in zip(offsets[:-1], offsets[1:])]
+            return [blob[int(start):int(end)].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+
+        labels = column(np.int64, count)
+        weights = column(np.int32, count)
+        deleted = column(np.int64, deleted_count)
+        words = strings()
+        ids = strings()
+
+    return {
+        'dimension': dimension,
+        'labels': labels,
+        'deleted_labels': deleted,
+        'words': words,
+        'weights': weights.tolist(),
+        'ids': ids,
+        'last_updated': updated_at
+    }
@@ -1,9 +1,13 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 # 1. 导入我们所有需要的路由模块
-from .routers import transcription, auth, realtime_websocket, chat, simple_hotwords
+from .routers import transcription, auth, realtime_websocket, chat, simple_hotwords, rag
 from .models import Base, engine
 from .config import get_settings
+from .asr_engine import get_asr_engine
+from .services import get_transcription_queue
+from .rag_service import get_rag_service
 
 # 初始化数据库
 Base.metadata.create_all(bind=engine)
@@ -21,6 +25,26 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+@app.on_event("startup")
+async def startup_event():
+    """预热FunASR连接池、启动转写任务队列并预加载RAG模型"""
+    await get_asr_engine().startup()
+    await get_transcription_queue().start()
+    if settings.RAG_WARMUP_ON_STARTUP:
+        rag_service = get_rag_service()
+        if settings.RAG_WARMUP_BACKGROUND:
+            rag_service.start_warmup(background=True)
+        else:
+            # 模型就绪后才开始接受请求
+            await asyncio.get_running_loop().run_in_executor(None, rag_service.initialize)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """停止转写任务队列、关闭FunASR连接池并停止RAG后台线程"""
+    await get_transcription_queue().stop()
+    await get_asr_engine().shutdown()
+    get_rag_service().shutdown()
+
 # 文件路径: asr_system_backend/app/main.py
 # ...
 # 包含路由
@@ -29,4 +53,5 @@ app.include_router(transcription.router, tags=["转写"])
 # 确保这一行是存在的
 app.include_router(realtime_websocket.router, tags=["实时转写"])
 app.include_router(chat.router, tags=["AI聊天"]) 
-app.include_router(simple_hotwords.router)
\ No newline at end of file
+app.include_router(simple_hotwords.router)
+app.include_router(rag.router)
\ No newline at end of file
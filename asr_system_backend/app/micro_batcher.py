@@ -0,0 +1,168 @@
+"""
+通用微批处理器
+多个线程或协程提交的请求由后台线程在短时间窗口内合并为一次批量调用，再把结果分发回各个请求
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Executor, Future
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """微批处理的公共部分：请求队列、后台线程、批次收集和结果分发
+
+    后台线程取到第一个请求后，在 max_wait_ms 时间窗口内继续收集其他请求，
+    批量大小（由 _size 计算）凑满 max_batch_size 或窗口结束后调用一次 _execute。
+    子类实现 _execute（必要时实现 _size），并提供面向调用方的提交接口。
+
+    指定 executor 时批次在该线程池中执行，最多同时执行 max_in_flight 批；
+    执行线程都在忙时新请求继续排队，空闲后合并为更大的批次。
+    """
+
+    name = "批处理"  # 用于日志
+    thread_name = "micro-batcher"
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, executor: Optional[Executor] = None,
+                 max_in_flight: int = 1):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.executor = executor
+        self.max_in_flight = max(1, max_in_flight)
+        self._slots = threading.Semaphore(self.max_in_flight)
+        self._requests: "queue.Queue[Optional[tuple]]" = queue.Queue()  # (请求内容, Future)，None为关闭标记
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._pending: Optional[tuple] = None  # 上一批放不下、留给下一批的请求
+        self._closed = False
+        self.requests = 0
+        self.items = 0
+        self.batches = 0
+        self.failures = 0
+        self.max_batch_seen = 0
+
+    def _size(self, payload: Any) -> int:
+        """请求占用的批量大小，默认每个请求为1"""
+        return 1
+
+    def _execute(self, payloads: List[Any]) -> List[Any]:
+        """对一批请求执行一次调用，返回与payloads按位置对应的结果"""
+        raise NotImplementedError
+
+    def submit_payload(self, payload: Any) -> Future:
+        """提交一个请求，返回其结果的Future"""
+        if self._closed:
+            raise RuntimeError(f"{self.name}已关闭")
+        self._ensure_worker()
+        future: Future = Future()
+        self._requests.put((payload, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self, first: tuple) -> List[tuple]:
+        """以第一个请求为起点，在时间窗口内收集更多请求，批量大小不超过max_batch_size"""
+        batch = [first]
+        size = self._size(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # 保留关闭标记，当前批次处理完后退出
+                self._requests.put(None)
+                break
+            request_size = self._size(request[0])
+            if size + request_size > self.max_batch_size:
+                # 放不下的请求作为下一批的开头
+                self._pending = request
+                break
+            batch.append(request)
+            size += request_size
+        return batch
+
+    def _run(self):
+        while True:
+            # 等到有空闲的执行线程再开始收集批次
+            self._slots.acquire()
+            if self._pending is not None:
+                first, self._pending = self._pending, None
+            else:
+                first = self._requests.get()
+            if first is None:
+                self._slots.release()
+                return
+            batch = self._collect_batch(first)
+            if self.executor is None:
+                self._run_batch(batch)
+                continue
+            try:
+                self.executor.submit(self._run_batch, batch)
+            except RuntimeError as e:
+                # 线程池已关闭
+                self._slots.release()
+                for _, future in batch:
+                    if future.set_running_or_notify_cancel():
+                        future.set_exception(e)
+
+    def _run_batch(self, batch: List[tuple]):
+        try:
+            self._process(batch)
+        finally:
+            self._slots.release()
+
+    def _process(self, batch: List[tuple]):
+        # 调用方已取消的请求不再参与计算
+        batch = [request for request in batch if request[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self._execute([payload for payload, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name}返回 {len(results)} 条结果，期望 {len(batch)} 条")
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"{self.name}失败（{len(batch)} 个请求）: {str(e)}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        size = sum(self._size(payload) for payload, _ in batch)
+        self.requests += len(batch)
+        self.items += size
+        self.batches += 1
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def close(self, timeout: float = 1.0):
+        """停止后台线程，已提交的请求会先处理完"""
+        self._closed = True
+        if self._worker is not None and self._worker.is_alive():
+            self._requests.put(None)
+            self._worker.join(timeout=timeout)
+
+    def get_stats(self) -> Dict:
+        """获取批处理统计信息"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_in_flight": self.max_in_flight,
+            "requests": self.requests,
+            "batches": self.batches,
+            "failures": self.failures,
+            "max_batch_seen": self.max_batch_seen,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0
+        }
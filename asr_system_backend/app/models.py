@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, create_engine
+from sqlalchemy import Column, Integer, String, Text, DateTime, create_engine
+import uuid
 from datetime import datetime
 from app.database import DATABASE_URL  # 现在可以正确导入
 from sqlalchemy.ext.declarative import declarative_base
@@ -15,4 +16,15 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True)
     hashed_password = Column(String)
-    created_at = Column(DateTime, default=datetime.now)  # 确保这里使用正确
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.now)  # 确保这里使用正确
+
+class TranscriptionTask(Base):
+    __tablename__ = "transcription_tasks"
+    id = Column(String, primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, index=True, nullable=True)
+    filename = Column(String)
+    status = Column(String, default="pending", index=True)  # pending, processing, completed, failed
+    result_text = Column(Text, nullable=True)
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    completed_at = Column(DateTime, nullable=True)
@@ -1,25 +1,70 @@
 import os
-import json
+import time
+import asyncio
+import uuid
+import random
+import hashlib
+import threading
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterable
 from sqlalchemy.orm import Session
 from . import models
+from .database import SessionLocal
 import logging
-import pickle
-from datetime import datetime
+from types import SimpleNamespace
+from concurrent.futures import Future, ThreadPoolExecutor
 from .config import get_settings
+from .embedding_cache import EmbeddingCache, create_embedding_cache
+from .encode_batcher import MicroBatchEncoder
+from . import ann_index
+from . import index_store
+from .hotword_matcher import HotwordMatcher, PrefixIndex
+from .index_persister import IndexPersister
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# FAISS的ID为有符号int64，热词ID映射到非负的63位整数
+_LABEL_MASK = (1 << 63) - 1
+
 class RAGService:
+    """热词向量检索服务
+
+    每个用户拥有独立的FAISS索引，查询只在该用户自己的向量中进行，
+    某个用户的热词变化也只会重建该用户的索引。
+    索引以热词ID为键（IndexIDMap2），新增、修改、删除单个热词时只编码和替换变化的向量。
+    热词数量较多时可按配置使用HNSW/IVF等近似索引（见ann_index），不支持删除的索引类型
+    只在元数据中标记删除，标记过多或需要重新训练时自动重建。
+    每个用户的索引和元数据由该用户自己的锁保护，不同用户的查询和更新互不阻塞；
+    重建时的编码和构建在锁外进行，完成后再在锁内替换。
+    """
+
     def __init__(self):
         self.model = None
-        self.index = None
-        self.hotword_embeddings = {}
-        self.hotword_metadata = {}
+        self.user_indexes: Dict[str, faiss.Index] = {}  # 用户ID -> 该用户的FAISS索引
+        self.hotword_metadata = {}  # 用户ID -> 热词、权重和ID列表（三者按位置对应）
+        self._label_rows: Dict[str, Dict[int, int]] = {}  # 用户ID -> {索引ID: 元数据中的位置}
+        self._deleted_labels: Dict[str, set] = {}  # 用户ID -> 仍在索引中但已标记删除的索引ID
+        self._trained_counts: Dict[str, int] = {}  # 用户ID -> 构建（训练）索引时的向量数
+        self._mmapped_users: set = set()  # 索引仍直接映射文件（只读）的用户
+        self._matchers: Dict[str, HotwordMatcher] = {}  # 用户ID -> 热词匹配器，热词变化时失效
+        self._prefix_indexes: Dict[str, PrefixIndex] = {}  # 用户ID -> 热词前缀索引，热词变化时失效
+        self.search_stats = ann_index.SearchStats()
+        self._lock = threading.Lock()  # 只保护_loading和_user_locks
+        self._user_locks: Dict[str, threading.RLock] = {}  # 用户ID -> 保护该用户索引和元数据的锁
+        self._versions: Dict[str, int] = {}  # 用户ID -> 热词版本号，每次变化时递增
+        self._init_lock = threading.Lock()
+        self._loader = ThreadPoolExecutor(max_workers=settings.RAG_INDEX_LOADER_WORKERS,
+                                          thread_name_prefix="rag-index-loader")
+        self._loading: Dict[str, Future] = {}  # 用户ID -> 正在进行的后台加载
+        self.persister = IndexPersister(self._persist_user, interval=settings.RAG_PERSIST_INTERVAL_SECONDS)
+        self.warmup_status = "not_started"  # not_started / loading / ready / failed
+        self.warmup_error: Optional[str] = None
+        self.warmup_seconds: Optional[float] = None
+        self.embedding_cache: Optional[EmbeddingCache] = None  # 模型加载后按维度创建
+        self.query_encoder: Optional[MicroBatchEncoder] = None  # 合并并发查询的编码请求
         self.dimension = 384  # sentence-transformers/all-MiniLM-L6-v2 的维度
         self.initialized = False
         self.index_dir = os.path.join(settings.TEMP_DIR, "rag_indices")
@@ -28,47 +73,149 @@ class RAGService:
         os.makedirs(self.index_dir, exist_ok=True)
         
     def initialize(self):
-        """初始化RAG服务，加载预训练模型"""
+        """初始化RAG服务，加载预训练模型并用一次空编码预热
+
+        可被多个线程同时调用（启动预热线程和请求线程），模型只加载一次，其余调用方等待加载完成。
+        """
+        with self._init_lock:
+            if self.initialized:
+                return
+            self.warmup_status = "loading"
+            started = time.perf_counter()
+            try:
+                # 加载轻量级的多语言模型
+                logger.info("正在加载句子嵌入模型...")
+                self.model = SentenceTransformer(settings.RAG_MODEL_NAME)
+                self.dimension = self.model.get_sentence_embedding_dimension()
+                self.embedding_cache = create_embedding_cache(settings.RAG_MODEL_NAME, self.dimension)
+                if settings.RAG_QUERY_BATCH_ENABLED:
+                    self.query_encoder = MicroBatchEncoder(
+                        self._model_encode,
+                        max_batch_size=settings.RAG_QUERY_BATCH_MAX_SIZE,
+                        max_wait_ms=settings.RAG_QUERY_BATCH_WAIT_MS
+                    )
+                
+                # 第一次前向计算会初始化计算图和内存分配，提前完成，避免由第一个请求承担
+                self._model_encode(["预热"])
+                
+                self.initialized = True
+                self.warmup_status = "ready"
+                self.warmup_error = None
+                self.warmup_seconds = time.perf_counter() - started
+                logger.info(f"RAG服务初始化成功 (模型: {settings.RAG_MODEL_NAME}, 维度: {self.dimension}, "
+                            f"耗时: {self.warmup_seconds:.1f}秒)")
+            except Exception as e:
+                logger.error(f"RAG服务初始化失败: {str(e)}")
+                self.initialized = False
+                self.warmup_status = "failed"
+                self.warmup_error = str(e)
+
+    def start_warmup(self, background: bool = True) -> Optional[threading.Thread]:
+        """启动时预加载模型；background为True时在后台线程中进行，服务可以同时接受请求"""
+        if self.initialized:
+            return None
+        if not background:
+            self.initialize()
+            return None
+        thread = threading.Thread(target=self.initialize, name="rag-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _user_lock(self, user_id: str) -> threading.RLock:
+        """获取用户的锁，首次使用时创建"""
+        with self._lock:
+            lock = self._user_locks.get(user_id)
+            if lock is None:
+                lock = self._user_locks[user_id] = threading.RLock()
+            return lock
+
+    def get_readiness(self) -> Dict:
+        """获取模型加载状态和正在加载的用户索引数量"""
+        with self._lock:
+            loading_users = len(self._loading)
+        loaded_users = len(self.user_indexes)
+        return {
+            'status': self.warmup_status,
+            'ready': self.initialized,
+            'error': self.warmup_error,
+            'warmup_seconds': self.warmup_seconds,
+            'loaded_users': loaded_users,
+            'loading_users': loading_users
+        }
+
+    def touch_user(self, user_id: str) -> Future:
+        """首次访问某个用户时在后台加载（或从数据库构建）其索引
+
+        索引已在内存中时返回已完成的Future；正在加载时返回同一个Future，不会重复加载。
+        """
+        with self._lock:
+            if user_id in self.user_indexes:
+                future = Future()
+                future.set_result(True)
+                return future
+            future = self._loading.get(user_id)
+            if future is None:
+                future = self._loader.submit(self._load_user, user_id)
+                self._loading[user_id] = future
+        return future
+
+    def _load_user(self, user_id: str) -> bool:
+        """后台加载任务：使用独立的数据库会话构建用户索引"""
         try:
-            # 加载轻量级的多语言模型
-            logger.info("正在加载句子嵌入模型...")
-            self.model = SentenceTransformer(settings.RAG_MODEL_NAME)
-            self.dimension = self.model.get_sentence_embedding_dimension()
-            
-            # 创建FAISS索引 (使用余弦相似度)
-            self.index = faiss.IndexFlatIP(self.dimension)
-            
-            self.initialized = True
-            logger.info(f"RAG服务初始化成功 (模型: {settings.RAG_MODEL_NAME}, 维度: {self.dimension})")
-        except Exception as e:
-            logger.error(f"RAG服务初始化失败: {str(e)}")
-            self.initialized = False
-    
+            db = SessionLocal()
+            try:
+                return self.build_user_hotword_index(db, user_id)
+            finally:
+                db.close()
+        finally:
+            with self._lock:
+                self._loading.pop(user_id, None)
+
+    async def ensure_user_index(self, user_id: str) -> bool:
+        """在事件循环中等待用户索引加载完成，不阻塞其他连接"""
+        return await asyncio.wrap_future(self.touch_user(user_id))
+
+    def shutdown(self):
+        """停止后台加载线程和查询批处理线程，并写入尚未保存的索引"""
+        self._loader.shutdown(wait=False, cancel_futures=True)
+        if self.query_encoder is not None:
+            self.query_encoder.close()
+        self.persister.stop()
+
+    def _index_paths(self, user_id: str) -> Tuple[str, str]:
+        """用户索引文件和二进制元数据文件的路径"""
+        return (os.path.join(self.index_dir, f"user_{user_id}.index"),
+                os.path.join(self.index_dir, f"user_{user_id}.meta"))
+
+    def _persist_user(self, user_id: str) -> bool:
+        """后台写入任务：用户索引在写入前已被删除时跳过"""
+        if user_id not in self.hotword_metadata:
+            return True
+        return self.save_user_index(user_id)
+
     def save_user_index(self, user_id: str) -> bool:
-        """保存用户索引到文件"""
+        """保存用户索引到文件，索引和元数据都先写临时文件再替换"""
         try:
             if user_id not in self.hotword_metadata:
                 logger.warning(f"用户 {user_id} 的索引不存在，无法保存")
                 return False
                 
-            index_file = os.path.join(self.index_dir, f"user_{user_id}.index")
-            metadata_file = os.path.join(self.index_dir, f"user_{user_id}.metadata")
-            
-            # 保存FAISS索引
-            user_embeddings = self.hotword_embeddings.get(user_id)
-            if user_embeddings is not None:
-                # 创建临时索引只包含该用户的向量
-                temp_index = faiss.IndexFlatIP(self.dimension)
-                temp_index.add(user_embeddings)
-                faiss.write_index(temp_index, index_file)
-                
-            # 保存元数据
-            metadata = self.hotword_metadata[user_id].copy()
-            metadata['last_updated'] = datetime.now().isoformat()
-            metadata['dimension'] = self.dimension
+            index_file, metadata_file = self._index_paths(user_id)
             
-            with open(metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2)
+            with self._user_lock(user_id):
+                # 保存FAISS索引
+                user_index = self.user_indexes.get(user_id)
+                if user_index is not None:
+                    index_store.write_index(user_index, index_file)
+                    
+                # 保存元数据（按列存放的二进制格式）
+                metadata = self.hotword_metadata[user_id]
+                rows = self._label_rows[user_id]
+                labels = [0] * len(rows)
+                for label, row in rows.items():
+                    labels[row] = label
+                index_store.write_metadata(metadata_file, metadata, labels,
+                                           self._deleted_labels.get(user_id, ()), self.dimension)
                 
             logger.info(f"用户 {user_id} 的索引已保存到文件")
             return True
@@ -78,10 +225,13 @@ class RAGService:
             return False
     
     def load_user_index(self, user_id: str) -> bool:
-        """从文件加载用户索引"""
+        """从文件加载用户索引
+
+        启用RAG_INDEX_MMAP时向量数据直接映射索引文件，不复制到进程内存，
+        多个进程可共享同一份页缓存；第一次修改该用户的索引时才复制为普通索引。
+        """
         try:
-            index_file = os.path.join(self.index_dir, f"user_{user_id}.index")
-            metadata_file = os.path.join(self.index_dir, f"user_{user_id}.metadata")
+            index_file, metadata_file = self._index_paths(user_id)
             
             # 检查文件是否存在
             if not os.path.exists(index_file) or not os.path.exists(metadata_file):
@@ -89,25 +239,37 @@ class RAGService:
                 return False
                 
             # 加载元数据
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
+            metadata = index_store.read_metadata(metadata_file)
                 
             # 验证维度兼容性
-            if metadata.get('dimension', 0) != self.dimension:
+            if metadata['dimension'] != self.dimension:
                 logger.warning(f"用户 {user_id} 的索引维度不匹配，需要重建")
                 return False
                 
-            # 加载FAISS索引
-            temp_index = faiss.read_index(index_file)
-            embeddings = np.zeros((temp_index.ntotal, self.dimension), dtype=np.float32)
-            temp_index.reconstruct_n(0, temp_index.ntotal, embeddings)
+            # 加载FAISS索引，直接作为该用户的索引使用
+            use_mmap = settings.RAG_INDEX_MMAP
+            user_index = index_store.read_index(index_file, use_mmap=use_mmap)
+            deleted_labels = set(metadata['deleted_labels'].tolist())
+            if (not isinstance(user_index, faiss.IndexIDMap2) or user_index.d != self.dimension
+                    or user_index.ntotal != len(metadata['words']) + len(deleted_labels)):
+                logger.warning(f"用户 {user_id} 的索引文件与元数据不一致，需要重建")
+                return False
             
             # 恢复到服务中
-            self.hotword_embeddings[user_id] = embeddings
-            self.hotword_metadata[user_id] = metadata
-            
-            # 重建全局索引
-            self._rebuild_global_index()
+            ann_index.apply_search_params(user_index, settings.rag_config)
+            labels = metadata['labels'].tolist()
+            metadata = {key: metadata[key] for key in ('words', 'weights', 'ids')}
+            with self._user_lock(user_id):
+                self.user_indexes[user_id] = user_index
+                self.hotword_metadata[user_id] = metadata
+                self._label_rows[user_id] = dict(zip(labels, range(len(labels))))
+                self._deleted_labels[user_id] = deleted_labels
+                self._trained_counts[user_id] = user_index.ntotal
+                if use_mmap:
+                    self._mmapped_users.add(user_id)
+                else:
+                    self._mmapped_users.discard(user_id)
+                self._invalidate_text_indexes(user_id)
             
             logger.info(f"用户 {user_id} 的索引已从文件加载，包含 {len(metadata.get('words', []))} 个热词")
             return True
@@ -116,19 +278,257 @@ class RAGService:
             logger.error(f"加载用户索引失败: {str(e)}")
             return False
     
-    def _rebuild_global_index(self):
-        """重建全局FAISS索引"""
+    def _new_index(self) -> faiss.Index:
+        """创建空的用户索引（归一化向量的内积即余弦相似度），以热词ID为键"""
+        return ann_index.empty_index(self.dimension)
+
+    @staticmethod
+    def _hotword_label(hotword_id) -> int:
+        """将热词ID（UUID字符串）映射为FAISS使用的int64 ID"""
         try:
-            self.index.reset()
-            
-            for user_id, embeddings in self.hotword_embeddings.items():
-                if embeddings is not None and len(embeddings) > 0:
-                    self.index.add(embeddings)
-                    
-            logger.debug("全局索引重建完成")
-            
+            return uuid.UUID(str(hotword_id)).int & _LABEL_MASK
+        except ValueError:
+            digest = hashlib.blake2b(str(hotword_id).encode('utf-8'), digest_size=8).digest()
+            return int.from_bytes(digest, 'little') & _LABEL_MASK
+
+    def _model_encode(self, texts: List[str]) -> np.ndarray:
+        """直接调用模型编码文本为归一化的float32向量"""
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """编码热词等批量文本，已缓存的文本不再经过模型计算"""
+        if self.embedding_cache is not None:
+            return self.embedding_cache.encode(texts, self._model_encode)
+        return self._model_encode(texts)
+
+    def _encode_query(self, text: str) -> np.ndarray:
+        """编码单条查询，未命中缓存时与其他线程的并发查询合并为一次模型调用"""
+        encode_fn = self.query_encoder.encode if self.query_encoder is not None else self._model_encode
+        if self.embedding_cache is not None:
+            return self.embedding_cache.encode([text], encode_fn)
+        return encode_fn([text])
+
+    def get_user_index(self, user_id: str) -> Optional[faiss.Index]:
+        """获取用户的FAISS索引，不存在时返回None"""
+        return self.user_indexes.get(user_id)
+
+    def set_user_hotwords(self, user_id: str, hotwords: Iterable) -> int:
+        """用给定的热词（需有id、word、weight属性）重建该用户的索引，返回热词数量
+
+        只影响该用户，其他用户的索引保持不变。
+        """
+        hotwords = list(hotwords)
+        if not hotwords:
+            self._drop_user(user_id)
+            return 0
+        built = self._build_user_index(user_id, hotwords)
+        with self._user_lock(user_id):
+            self._install_user_index(user_id, built)
+        return len(hotwords)
+
+    def _build_user_index(self, user_id: str, hotwords: List) -> Tuple[faiss.Index, Dict, np.ndarray]:
+        """编码热词并构建新索引，不持有锁，返回 (索引, 元数据, 索引ID)"""
+        hotword_texts = [hw.word for hw in hotwords]
+        logger.info(f"正在为用户 {user_id} 生成 {len(hotword_texts)} 个热词的向量嵌入...")
+        embeddings = self._encode(hotword_texts)
+        labels = np.array([self._hotword_label(hw.id) for hw in hotwords], dtype=np.int64)
+
+        # 先在新索引中构建完成再替换，查询不会看到构建到一半的索引
+        user_index = ann_index.build_index(embeddings, labels, settings.rag_config)
+        metadata = {
+            'words': hotword_texts,
+            'weights': [hw.weight for hw in hotwords],
+            'ids': [hw.id for hw in hotwords]
+        }
+        return user_index, metadata, labels
+
+    def _install_user_index(self, user_id: str, built: Tuple[faiss.Index, Dict, np.ndarray]):
+        """用构建好的索引替换用户当前的索引，调用方需持有该用户的锁"""
+        user_index, metadata, labels = built
+        self.user_indexes[user_id] = user_index
+        self.hotword_metadata[user_id] = metadata
+        self._label_rows[user_id] = {int(label): row for row, label in enumerate(labels)}
+        self._deleted_labels[user_id] = set()
+        self._trained_counts[user_id] = len(labels)
+        self._mmapped_users.discard(user_id)
+        self._invalidate_text_indexes(user_id)
+
+    def add_hotwords(self, user_id: str, hotwords: Iterable) -> int:
+        """新增热词向量，已存在的热词ID会被替换；只编码传入的热词，返回处理数量"""
+        hotwords = list(hotwords)
+        if not hotwords:
+            return 0
+        embeddings = self._encode([hw.word for hw in hotwords])
+        labels = [self._hotword_label(hw.id) for hw in hotwords]
+
+        with self._user_lock(user_id):
+            user_index = self.user_indexes.get(user_id)
+            if user_index is None:
+                user_index = self._new_index()
+                self.user_indexes[user_id] = user_index
+                self.hotword_metadata[user_id] = {'words': [], 'weights': [], 'ids': []}
+                self._label_rows[user_id] = {}
+                self._deleted_labels[user_id] = set()
+                self._trained_counts[user_id] = 0
+
+            replaced = [label for label in labels if label in self._label_rows[user_id]]
+            # 不支持删除的索引中，同一ID的旧向量仍然存在，不能直接追加，改为整体重建
+            rebuild = not ann_index.supports_removal(user_index) and (
+                replaced or self._deleted_labels[user_id].intersection(labels))
+            if not rebuild:
+                user_index = self._writable_index(user_id)
+            if replaced and not rebuild:
+                user_index.remove_ids(np.array(replaced, dtype=np.int64))
+            for label in replaced:
+                self._remove_row(user_id, label)
+
+            if not rebuild:
+                user_index.add_with_ids(embeddings, np.array(labels, dtype=np.int64))
+            metadata = self.hotword_metadata[user_id]
+            rows = self._label_rows[user_id]
+            for hw, label in zip(hotwords, labels):
+                rows[label] = len(metadata['ids'])
+                metadata['words'].append(hw.word)
+                metadata['weights'].append(hw.weight)
+                metadata['ids'].append(hw.id)
+
+            self._invalidate_text_indexes(user_id)
+            reason = "替换不支持删除的索引中的向量" if rebuild else self._rebuild_reason(user_id)
+        if reason:
+            self._rebuild_user_index(user_id, reason)
+        return len(hotwords)
+
+    def update_hotword(self, user_id: str, hotword) -> bool:
+        """更新单个热词；只有词本身变化时才重新编码，返回是否重新编码"""
+        label = self._hotword_label(hotword.id)
+        with self._user_lock(user_id):
+            row = self._label_rows.get(user_id, {}).get(label)
+            if row is not None and self.hotword_metadata[user_id]['words'][row] == hotword.word:
+                self.hotword_metadata[user_id]['weights'][row] = hotword.weight
+                self._invalidate_text_indexes(user_id)
+                return False
+        self.add_hotwords(user_id, [hotword])
+        return True
+
+    def remove_hotwords(self, user_id: str, hotword_ids: Iterable) -> int:
+        """按热词ID删除向量，返回实际删除的数量"""
+        with self._user_lock(user_id):
+            rows = self._label_rows.get(user_id)
+            if not rows:
+                return 0
+            labels = [label for label in (self._hotword_label(hotword_id) for hotword_id in hotword_ids)
+                      if label in rows]
+            if not labels:
+                return 0
+            user_index = self.user_indexes[user_id]
+            if ann_index.supports_removal(user_index):
+                self._writable_index(user_id).remove_ids(np.array(labels, dtype=np.int64))
+            else:
+                # 只标记删除，查询时过滤，标记过多时由重建策略清理
+                self._deleted_labels[user_id].update(labels)
+            for label in labels:
+                self._remove_row(user_id, label)
+            self._invalidate_text_indexes(user_id)
+            reason = self._rebuild_reason(user_id)
+        if reason:
+            self._rebuild_user_index(user_id, reason)
+        return len(labels)
+
+    def _remove_row(self, user_id: str, label: int):
+        """从元数据中删除一行，用最后一行填补空位，调用方需持有锁"""
+        rows = self._label_rows[user_id]
+        metadata = self.hotword_metadata[user_id]
+        row = rows.pop(label)
+        last = len(metadata['ids']) - 1
+        if row != last:
+            for key in ('words', 'weights', 'ids'):
+                metadata[key][row] = metadata[key][last]
+            rows[self._hotword_label(metadata['ids'][row])] = row
+        for key in ('words', 'weights', 'ids'):
+            metadata[key].pop()
+
+    def _invalidate_text_indexes(self, user_id: str):
+        """热词变化后递增版本号，并丢弃按文本构建的缓存结构（下次使用时重新构建），调用方需持有锁"""
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        self._matchers.pop(user_id, None)
+        self._prefix_indexes.pop(user_id, None)
+
+    def _writable_index(self, user_id: str) -> faiss.Index:
+        """返回可修改的用户索引，映射文件的只读索引先复制到内存，调用方需持有锁"""
+        if user_id in self._mmapped_users:
+            self.user_indexes[user_id] = index_store.materialize(self.user_indexes[user_id])
+            self._mmapped_users.discard(user_id)
+        return self.user_indexes[user_id]
+
+    def _rebuild_reason(self, user_id: str) -> Optional[str]:
+        """按重建策略检查用户索引，返回需要重建的原因，调用方需持有锁"""
+        return ann_index.needs_rebuild(
+            self.user_indexes[user_id],
+            settings.rag_config,
+            live_count=len(self._label_rows[user_id]),
+            deleted_count=len(self._deleted_labels[user_id]),
+            trained_count=self._trained_counts.get(user_id, 0)
+        )
+
+    def _rebuild_user_index(self, user_id: str, reason: str):
+        """按当前元数据重建用户索引（向量大多来自缓存），调用方不能持有锁
+
+        在锁内取元数据快照，锁外编码和构建，期间查询继续使用旧索引；
+        替换前热词若又有变化（版本号不同），按新的元数据重新构建。
+        """
+        logger.info(f"重建用户 {user_id} 的热词索引: {reason}")
+        lock = self._user_lock(user_id)
+        while True:
+            with lock:
+                metadata = self.hotword_metadata.get(user_id)
+                if metadata is None:
+                    return
+                version = self._versions.get(user_id, 0)
+                hotwords = [
+                    SimpleNamespace(id=hotword_id, word=word, weight=weight)
+                    for word, weight, hotword_id in zip(metadata['words'], metadata['weights'], metadata['ids'])
+                ]
+            built = self._build_user_index(user_id, hotwords) if hotwords else None
+            with lock:
+                if self._versions.get(user_id, 0) != version:
+                    continue
+                if built is None:
+                    self._drop_user(user_id)
+                else:
+                    self._install_user_index(user_id, built)
+                return
+
+    def sync_user_hotwords(self, db: Session, user_id: str, added: Iterable = (), updated: Iterable = (),
+                           removed_ids: Iterable = ()) -> bool:
+        """把数据库中的热词变化同步到用户索引
+
+        索引已在内存中时只处理变化的热词；否则完整构建（此时数据库中已包含这些变化）。
+        """
+        if not self.initialized:
+            return False
+        if self.get_user_index(user_id) is None:
+            return self.build_user_hotword_index(db, user_id)
+        try:
+            self.add_hotwords(user_id, added)
+            for hotword in updated:
+                self.update_hotword(user_id, hotword)
+            self.remove_hotwords(user_id, removed_ids)
+            self.persister.mark_dirty(user_id)
+            return True
         except Exception as e:
-            logger.error(f"重建全局索引失败: {str(e)}")
+            logger.error(f"同步用户热词索引失败: {str(e)}")
+            return False
+
+    def _drop_user(self, user_id: str):
+        """从内存中移除用户的索引和元数据"""
+        with self._user_lock(user_id):
+            self.user_indexes.pop(user_id, None)
+            self.hotword_metadata.pop(user_id, None)
+            self._label_rows.pop(user_id, None)
+            self._deleted_labels.pop(user_id, None)
+            self._trained_counts.pop(user_id, None)
+            self._mmapped_users.discard(user_id)
+            self._invalidate_text_indexes(user_id)
     
     def build_user_hotword_index(self, db: Session, user_id: str) -> bool:
         """为特定用户构建热词索引"""
@@ -139,18 +539,20 @@ class RAGService:
             return False
             
         try:
-            # 尝试从文件加载现有索引
-            if self.load_user_index(user_id):
+            # 尝试使用内存中或文件中的现有索引
+            if user_id in self.user_indexes or self.load_user_index(user_id):
                 # 检查数据库中的热词是否有更新
                 db_hotwords = db.query(models.Hotword).filter(
                     models.Hotword.user_id == user_id
                 ).all()
                 
-                db_words = {hw.word: hw.weight for hw in db_hotwords}
-                cached_words = {word: weight for word, weight in zip(
-                    self.hotword_metadata[user_id]['words'],
-                    self.hotword_metadata[user_id]['weights']
-                )}
+                # 按ID比较：删除后重新创建的同名热词ID不同，索引中的旧ID需要替换
+                db_words = {str(hw.id): (hw.word, hw.weight) for hw in db_hotwords}
+                with self._user_lock(user_id):
+                    metadata = self.hotword_metadata.get(user_id, {'words': [], 'weights': [], 'ids': []})
+                    cached_words = {str(hotword_id): (word, weight) for word, weight, hotword_id in zip(
+                        metadata['words'], metadata['weights'], metadata['ids']
+                    )}
                 
                 # 如果数据一致，直接使用缓存的索引
                 if db_words == cached_words:
@@ -165,33 +567,14 @@ class RAGService:
             if not hotwords:
                 logger.info(f"用户 {user_id} 没有热词，跳过索引构建")
                 # 清理可能存在的旧索引
-                if user_id in self.hotword_embeddings:
-                    del self.hotword_embeddings[user_id]
-                if user_id in self.hotword_metadata:
-                    del self.hotword_metadata[user_id]
+                self._drop_user(user_id)
                 return True
             
-            # 提取热词文本和权重
-            hotword_texts = [hw.word for hw in hotwords]
-            hotword_weights = [hw.weight for hw in hotwords]
-            
-            # 生成嵌入向量
-            logger.info(f"正在为用户 {user_id} 生成 {len(hotword_texts)} 个热词的向量嵌入...")
-            embeddings = self.model.encode(hotword_texts, normalize_embeddings=True)
-            
-            # 更新内存中的数据
-            self.hotword_embeddings[user_id] = embeddings
-            self.hotword_metadata[user_id] = {
-                'words': hotword_texts,
-                'weights': hotword_weights,
-                'ids': [hw.id for hw in hotwords]
-            }
-            
-            # 重建全局索引
-            self._rebuild_global_index()
+            # 只重建该用户的索引
+            self.set_user_hotwords(user_id, hotwords)
             
-            # 保存到文件
-            self.save_user_index(user_id)
+            # 由后台线程合并写入文件
+            self.persister.mark_dirty(user_id)
             
             logger.info(f"为用户 {user_id} 构建了包含 {len(hotwords)} 个热词的索引")
             return True
@@ -206,29 +589,45 @@ class RAGService:
             logger.warning("RAG服务未初始化")
             return []
             
-        if user_id not in self.hotword_metadata:
+        if user_id not in self.user_indexes:
             logger.warning(f"用户 {user_id} 的热词索引不存在")
             return []
             
         try:
-            # 对输入文本进行编码
-            query_embedding = self.model.encode([text], normalize_embeddings=True)
-            
-            # 在FAISS索引中搜索
-            similarities, indices = self.index.search(query_embedding, min(top_k, len(self.hotword_metadata[user_id]['words'])))
+            # 对输入文本进行编码（不持有锁）
+            query_embedding = self._encode_query(text)
             
-            # 构建结果
+            # 只在该用户的索引中搜索，耗时只与该用户的热词数量有关；
+            # 搜索期间持有锁，避免与增删向量同时进行，并保证ID与元数据对应
             predictions = []
-            metadata = self.hotword_metadata[user_id]
-            
-            for i, (similarity, idx) in enumerate(zip(similarities[0], indices[0])):
-                if similarity >= threshold:  # 只返回相似度超过阈值的结果
-                    predictions.append({
-                        'word': metadata['words'][idx],
-                        'weight': metadata['weights'][idx],
-                        'similarity': float(similarity),
-                        'rank': i + 1
-                    })
+            with self._user_lock(user_id):
+                user_index = self.user_indexes.get(user_id)
+                if user_index is None or user_index.ntotal == 0:
+                    return []
+                metadata = self.hotword_metadata[user_id]
+                rows = self._label_rows[user_id]
+                # 多取已标记删除的数量，保证过滤后仍有top_k个候选
+                search_k = min(top_k + len(self._deleted_labels[user_id]), user_index.ntotal)
+                started = time.perf_counter()
+                similarities, labels = user_index.search(query_embedding, search_k)
+                self.search_stats.record_latency(time.perf_counter() - started)
+                
+                # 构建结果
+                rank = 0
+                for similarity, label in zip(similarities[0], labels[0]):
+                    row = rows.get(int(label))
+                    if row is None:
+                        continue
+                    rank += 1
+                    if rank > top_k:
+                        break
+                    if similarity >= threshold:  # 只返回相似度超过阈值的结果
+                        predictions.append({
+                            'word': metadata['words'][row],
+                            'weight': metadata['weights'][row],
+                            'similarity': float(similarity),
+                            'rank': rank
+                        })
             
             # 按权重和相似度排序
             predictions.sort(key=lambda x: (x['weight'] * x['similarity']), reverse=True)
@@ -239,8 +638,31 @@ class RAGService:
             logger.error(f"热词预测失败: {str(e)}")
             return []
     
+    def _get_matcher(self, user_id: str) -> Optional[HotwordMatcher]:
+        """获取用户热词的匹配器，热词变化后第一次使用时重新构建"""
+        with self._user_lock(user_id):
+            matcher = self._matchers.get(user_id)
+            if matcher is None and user_id in self.hotword_metadata:
+                metadata = self.hotword_metadata[user_id]
+                matcher = HotwordMatcher(metadata['words'], metadata['weights'])
+                self._matchers[user_id] = matcher
+            return matcher
+
+    def _get_prefix_index(self, user_id: str) -> PrefixIndex:
+        """获取用户热词的前缀索引，热词变化后第一次使用时重新构建"""
+        with self._user_lock(user_id):
+            prefix_index = self._prefix_indexes.get(user_id)
+            if prefix_index is None:
+                prefix_index = PrefixIndex(self.hotword_metadata.get(user_id, {}).get('words', []))
+                self._prefix_indexes[user_id] = prefix_index
+            return prefix_index
+
     def enhance_transcription_with_hotwords(self, transcription_text: str, user_id: str) -> Dict:
-        """使用热词增强转写结果"""
+        """使用热词增强转写结果
+
+        用户的全部热词编译为一个Aho-Corasick匹配器，对转写文本扫描一遍即可找出所有出现的热词，
+        并在同一遍中把它们修正为热词原文的大小写；向量检索的结果只作为相关热词推荐返回。
+        """
         if not transcription_text:
             return {
                 'enhanced_text': transcription_text,
@@ -251,25 +673,31 @@ class RAGService:
         try:
             # 预测相关热词
             predicted_hotwords = self.predict_hotwords(transcription_text, user_id, top_k=10, threshold=0.3)
+            similarities = {pred['word']: pred['similarity'] for pred in predicted_hotwords}
             
             enhanced_text = transcription_text
             detected_hotwords = []
             confidence_boost = 1.0
             
-            # 检查是否有热词在转写文本中
-            for hotword_info in predicted_hotwords:
-                word = hotword_info['word']
-                if word.lower() in transcription_text.lower():
-                    detected_hotwords.append(hotword_info)
+            matcher = self._get_matcher(user_id)
+            if matcher is not None:
+                enhanced_text, matches = matcher.match(transcription_text)
+                
+                # 按首次出现的顺序汇总检测到的热词
+                occurrences: Dict[int, int] = {}
+                for _, _, pattern in matches:
+                    occurrences[pattern] = occurrences.get(pattern, 0) + 1
+                for rank, (pattern, count) in enumerate(occurrences.items(), 1):
+                    word, weight = matcher.words[pattern], matcher.weights[pattern]
+                    detected_hotwords.append({
+                        'word': word,
+                        'weight': weight,
+                        'similarity': similarities.get(word, 1.0),
+                        'rank': rank,
+                        'occurrences': count
+                    })
                     # 根据热词权重提升置信度
-                    confidence_boost += (hotword_info['weight'] / 10) * 0.1
-            
-            # 应用简单的热词替换增强（在实际应用中可能更复杂）
-            for hotword_info in detected_hotwords:
-                word = hotword_info['word']
-                # 确保正确的大小写
-                enhanced_text = enhanced_text.replace(word.lower(), word)
-                enhanced_text = enhanced_text.replace(word.upper(), word)
+                    confidence_boost += (weight / 10) * 0.1
             
             return {
                 'enhanced_text': enhanced_text,
@@ -286,6 +714,12 @@ class RAGService:
                 'confidence_boost': 1.0
             }
     
+    async def enhance_transcription_async(self, transcription_text: str, user_id: str) -> Dict:
+        """在事件循环中使用热词增强转写结果，查询编码（可能等待批处理线程）在线程池中进行"""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.enhance_transcription_with_hotwords, transcription_text, user_id
+        )
+
     def get_hotword_suggestions(self, partial_text: str, user_id: str, max_suggestions: int = 5) -> List[str]:
         """根据部分输入文本获取热词建议"""
         if not partial_text or len(partial_text) < 2:
@@ -295,19 +729,13 @@ class RAGService:
             return []
             
         try:
-            # 预测相关热词
-            predictions = self.predict_hotwords(partial_text, user_id, top_k=max_suggestions * 2, threshold=0.2)
-            
-            # 过滤出以部分文本开头的热词或相似的热词
-            suggestions = []
-            metadata = self.hotword_metadata[user_id]
-            
             # 首先添加前缀匹配的热词
-            for word in metadata['words']:
-                if word.lower().startswith(partial_text.lower()) and len(suggestions) < max_suggestions:
-                    suggestions.append(word)
+            suggestions = self._get_prefix_index(user_id).lookup(partial_text, max_suggestions)
+            if len(suggestions) >= max_suggestions:
+                return suggestions
             
-            # 然后添加语义相似的热词
+            # 前缀匹配不足时再用语义相似的热词补充
+            predictions = self.predict_hotwords(partial_text, user_id, top_k=max_suggestions * 2, threshold=0.2)
             for pred in predictions:
                 if pred['word'] not in suggestions and len(suggestions) < max_suggestions:
                     suggestions.append(pred['word'])
@@ -321,23 +749,18 @@ class RAGService:
     def clear_user_index(self, user_id: str) -> bool:
         """清除用户索引"""
         try:
-            # 从内存中删除
-            if user_id in self.hotword_embeddings:
-                del self.hotword_embeddings[user_id]
-            if user_id in self.hotword_metadata:
-                del self.hotword_metadata[user_id]
+            # 从内存中删除，并取消尚未执行的写入
+            self._drop_user(user_id)
+            self.persister.discard(user_id)
                 
-            # 删除文件
-            index_file = os.path.join(self.index_dir, f"user_{user_id}.index")
-            metadata_file = os.path.join(self.index_dir, f"user_{user_id}.metadata")
+            # 删除文件（包括旧版本的JSON元数据）
+            index_file, metadata_file = self._index_paths(user_id)
+            legacy_metadata_file = os.path.join(self.index_dir, f"user_{user_id}.metadata")
             
-            for file_path in [index_file, metadata_file]:
+            for file_path in [index_file, metadata_file, legacy_metadata_file]:
                 if os.path.exists(file_path):
                     os.remove(file_path)
                     
-            # 重建全局索引
-            self._rebuild_global_index()
-            
             logger.info(f"用户 {user_id} 的索引已清除")
             return True
             
@@ -345,11 +768,63 @@ class RAGService:
             logger.error(f"清除用户索引失败: {str(e)}")
             return False
     
+    def get_user_index_stats(self, user_id: str) -> Optional[Dict]:
+        """获取用户索引的类型和规模，索引不存在时返回None"""
+        with self._user_lock(user_id):
+            user_index = self.user_indexes.get(user_id)
+            if user_index is None:
+                return None
+            return {
+                'index_type': ann_index.index_type_of(user_index),
+                'vectors': user_index.ntotal,
+                'live_vectors': len(self._label_rows[user_id]),
+                'deleted_vectors': len(self._deleted_labels[user_id]),
+                'trained_vectors': self._trained_counts.get(user_id, 0),
+                'mmapped': user_id in self._mmapped_users
+            }
+
+    def measure_recall(self, user_id: str, sample_size: int = 50, top_k: int = 10) -> Optional[float]:
+        """抽样用户自己的热词作为查询，比较当前索引与暴力搜索的top_k结果，返回平均召回率
+
+        flat索引的召回率恒为1；近似索引可据此调整efSearch、nprobe等参数。
+        """
+        with self._user_lock(user_id):
+            user_index = self.user_indexes.get(user_id)
+            metadata = self.hotword_metadata.get(user_id)
+            if user_index is None or not metadata or not metadata['words']:
+                return None
+            words = list(metadata['words'])
+            labels = np.array([self._hotword_label(hotword_id) for hotword_id in metadata['ids']], dtype=np.int64)
+            deleted = len(self._deleted_labels[user_id])
+
+        embeddings = self._encode(words)
+        exact_index = ann_index.empty_index(self.dimension)
+        exact_index.add_with_ids(embeddings, labels)
+        k = min(top_k, len(words))
+        sample = random.sample(range(len(words)), min(sample_size, len(words)))
+        queries = embeddings[sample]
+
+        _, exact_labels = exact_index.search(queries, k)
+        with self._user_lock(user_id):
+            user_index = self.user_indexes.get(user_id)
+            if user_index is None:
+                return None
+            live = self._label_rows[user_id]
+            _, approx_labels = user_index.search(queries, min(k + deleted, user_index.ntotal))
+
+        recalls = []
+        for exact_row, approx_row in zip(exact_labels, approx_labels):
+            found = [int(label) for label in approx_row if int(label) in live][:k]
+            recalls.append(len(set(found) & set(int(label) for label in exact_row)) / k)
+        recall = float(np.mean(recalls))
+        self.search_stats.record_recall(recall)
+        return recall
+
     def get_service_stats(self) -> Dict:
         """获取RAG服务统计信息"""
         try:
             total_users = len(self.hotword_metadata)
-            total_hotwords = sum(len(meta.get('words', [])) for meta in self.hotword_metadata.values())
+            total_hotwords = sum(len(meta.get('words', [])) for meta in list(self.hotword_metadata.values()))
             
             return {
                 'initialized': self.initialized,
@@ -358,6 +833,12 @@ class RAGService:
                 'total_users_indexed': total_users,
                 'total_hotwords': total_hotwords,
                 'index_dir': self.index_dir,
+                'embedding_cache': self.embedding_cache.get_stats() if self.embedding_cache is not None else None,
+                'query_batching': self.query_encoder.get_stats() if self.query_encoder is not None else None,
+                'persistence': self.persister.get_stats(),
+                'index_type': settings.RAG_INDEX_TYPE,
+                'index_types': self._count_index_types(),
+                'search': self.search_stats.get_stats(),
                 'memory_usage_mb': self._estimate_memory_usage()
             }
             
@@ -365,18 +846,27 @@ class RAGService:
             logger.error(f"获取服务统计失败: {str(e)}")
             return {'error': str(e)}
     
+    def _count_index_types(self) -> Dict[str, int]:
+        """统计各类型用户索引的数量"""
+        counts: Dict[str, int] = {}
+        # 复制一份再遍历，其他用户的索引可能同时被替换
+        for user_index in list(self.user_indexes.values()):
+            index_type = ann_index.index_type_of(user_index)
+            counts[index_type] = counts.get(index_type, 0) + 1
+        return counts
+
     def _estimate_memory_usage(self) -> float:
         """估算内存使用量（MB）"""
         try:
             total_size = 0
             
-            # 估算嵌入向量的大小
-            for embeddings in self.hotword_embeddings.values():
-                if embeddings is not None:
-                    total_size += embeddings.nbytes
+            # 估算索引中向量的大小（映射文件的索引由页缓存按需加载，不计入）
+            for user_id, user_index in list(self.user_indexes.items()):
+                if user_id not in self._mmapped_users:
+                    total_size += user_index.ntotal * user_index.d * 4
                     
             # 估算元数据的大小
-            for metadata in self.hotword_metadata.values():
+            for metadata in list(self.hotword_metadata.values()):
                 total_size += len(str(metadata).encode('utf-8'))
                 
             return total_size / (1024 * 1024)  # 转换为MB
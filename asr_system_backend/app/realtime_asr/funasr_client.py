@@ -3,124 +3,281 @@ FunASR 实时客户端
 负责与 FunASR 服务器建立 WebSocket 连接并进行实时音频转写
 """
 
+import ssl
 import json
 import asyncio
 import websockets
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator
+from ..config import get_settings
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# 实时识别的中间结果模式，其余模式（offline、2pass-offline）为整句的最终结果
+PARTIAL_MODES = ("online", "2pass-online")
 
 class FunASRRealtimeClient:
-    """FunASR 实时转写客户端"""
-    
-    def __init__(self, host: str = "127.0.0.1", port: int = 10095):
+    """FunASR 实时转写客户端
+
+    使用 FunASR 的 online/2pass 模式：连接建立后先发送配置，之后持续发送PCM数据，
+    服务端在识别出内容时主动推送结果，不与发送的音频块一一对应。
+
+    发送和接收相互独立：send_audio() 只把数据放入有界的发送队列，由发送任务写入连接；
+    接收任务把服务端推送的结果放入结果队列，由 results() 按到达顺序产出。
+    发送队列写满时 send_audio() 会等待，调用方也可以通过 backpressure 或
+    try_send_audio() 的返回值感知拥塞，持续发送不再受网络往返时间限制。
+    """
+
+    # 发送队列中的结束标记
+    _END = object()
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, mode: str = "2pass",
+                 sample_rate: int = 16000, hotwords: str = "", wav_name: str = "realtime",
+                 use_ssl: Optional[bool] = None, max_pending_chunks: Optional[int] = None):
         """
         初始化 FunASR 实时客户端
-        
+
         Args:
             host: FunASR 服务器地址
             port: FunASR 服务器端口
+            mode: 识别模式，online 或 2pass
+            sample_rate: PCM 采样率
+            hotwords: FunASR 格式的热词 JSON
+            wav_name: 会话名称，会出现在服务端返回的结果中
+            use_ssl: 是否使用 wss 连接
+            max_pending_chunks: 发送队列中最多缓存的音频块数
         """
-        self.host = host
-        self.port = port
-        self.ws: Optional[websockets.WebSocketClientProtocol] = None
+        self.host = host or settings.FUNASR_HOST
+        self.port = port or settings.FUNASR_PORT
+        self.use_ssl = settings.FUNASR_USE_SSL if use_ssl is None else use_ssl
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.hotwords = hotwords
+        self.wav_name = wav_name
+        self.chunk_size = [5, 10, 5]
+        self.chunk_interval = 10
+        self.max_pending_chunks = max(1, max_pending_chunks or settings.FUNASR_STREAM_QUEUE_SIZE)
+        self.ws = None
         self.is_connected = False
-        self.task_id: Optional[str] = None
-        
+        self._outbound: Optional[asyncio.Queue] = None
+        self._results: Optional[asyncio.Queue] = None
+        self._sender_task: Optional[asyncio.Task] = None
+        self._receiver_task: Optional[asyncio.Task] = None
+        self._session_done = asyncio.Event()
+        self._error: Optional[Exception] = None
+        self.bytes_sent = 0
+        self.chunks_dropped = 0
+        self.results_received = 0
+
     async def connect(self) -> bool:
         """
-        连接到 FunASR 服务器
-        
+        连接到 FunASR 服务器，发送识别配置并启动收发任务
+
         Returns:
             bool: 连接是否成功
         """
         try:
-            ws_url = f"ws://{self.host}:{self.port}/ws/decode"
-            self.ws = await websockets.connect(ws_url)
-            self.is_connected = True
-            
-            # 发送启动命令
+            ssl_context = None
+            scheme = "ws"
+            if self.use_ssl:
+                # FunASR容器默认使用自签名证书，不校验证书
+                ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+                ssl_context.check_hostname = False
+                ssl_context.verify_mode = ssl.CERT_NONE
+                scheme = "wss"
+            self.ws = await websockets.connect(
+                f"{scheme}://{self.host}:{self.port}",
+                subprotocols=["binary"],
+                ping_interval=None,
+                ssl=ssl_context
+            )
+
+            # 发送启动配置，FunASR 不会对配置单独回复
             start_command = {
-                "mode": "online",
-                "chunk_size": 3200,  # 200ms @ 16kHz
-                "chunk_interval": 200,  # 每200ms发送一次
-                "wav_format": True,  # 使用 WAV 格式
-                "audio_fs": 16000,  # 采样率
-                "audio_channels": 1,  # 单声道
-                "audio_bits": 16,  # 16位
+                "mode": self.mode,
+                "chunk_size": self.chunk_size,
+                "chunk_interval": self.chunk_interval,
+                "wav_name": self.wav_name,
+                "wav_format": "pcm",
+                "audio_fs": self.sample_rate,
+                "is_speaking": True,
+                "hotwords": self.hotwords,
+                "itn": True
             }
-            
             await self.ws.send(json.dumps(start_command))
-            response = await self.ws.recv()
-            response_data = json.loads(response)
-            
-            if response_data.get("status") == 0:
-                self.task_id = response_data.get("task_id")
-                logger.info(f"Connected to FunASR server, task_id: {self.task_id}")
-                return True
-            else:
-                logger.error(f"Failed to start streaming: {response_data}")
-                return False
-                
+
+            self._outbound = asyncio.Queue(maxsize=self.max_pending_chunks)
+            self._results = asyncio.Queue()
+            self._session_done.clear()
+            self._error = None
+            self._sender_task = asyncio.create_task(self._sender())
+            self._receiver_task = asyncio.create_task(self._receiver())
+            self.is_connected = True
+            logger.info(f"Connected to FunASR server in {self.mode} mode: {self.wav_name}")
+            return True
+
         except Exception as e:
             logger.error(f"Failed to connect to FunASR server: {e}")
             self.is_connected = False
             return False
-            
-    async def send_audio(self, audio_chunk: bytes) -> Dict[str, Any]:
+
+    @property
+    def stride(self) -> int:
+        """FunASR 建议的单次发送字节数（默认600ms的16位PCM）"""
+        return int(60 * self.chunk_size[1] / self.chunk_interval / 1000 * self.sample_rate * 2)
+
+    @property
+    def pending_chunks(self) -> int:
+        """发送队列中等待发送的音频块数"""
+        return self._outbound.qsize() if self._outbound else 0
+
+    @property
+    def backpressure(self) -> bool:
+        """发送队列超过一半容量时为True，调用方可据此降低发送速率"""
+        return self.pending_chunks * 2 >= self.max_pending_chunks
+
+    def _check_sendable(self):
+        if not self.is_connected or not self.ws:
+            raise ConnectionError("Not connected to FunASR server")
+        if self._error is not None:
+            raise ConnectionError(f"FunASR connection failed: {self._error}")
+
+    async def send_audio(self, audio_chunk: bytes) -> None:
+        """
+        将PCM数据放入发送队列，队列已满时等待，不等待识别结果
+
+        Args:
+            audio_chunk: 16位单声道PCM数据
         """
-        发送音频数据到 FunASR 服务器
-        
+        self._check_sendable()
+        await self._outbound.put(audio_chunk)
+
+    def try_send_audio(self, audio_chunk: bytes) -> bool:
+        """
+        尝试将PCM数据放入发送队列，队列已满时丢弃并返回False
+
         Args:
-            audio_chunk: 音频数据块
-            
+            audio_chunk: 16位单声道PCM数据
+
         Returns:
-            Dict[str, Any]: 识别结果
+            bool: 是否已放入发送队列
         """
-        if not self.is_connected or not self.ws:
-            raise ConnectionError("Not connected to FunASR server")
-            
+        self._check_sendable()
         try:
-            # 发送音频数据
-            await self.ws.send(audio_chunk)
-            
-            # 接收识别结果
-            response = await self.ws.recv()
-            result = json.loads(response)
-            
-            return {
-                "text": result.get("text", ""),
-                "is_final": result.get("is_final", False),
-                "confidence": result.get("confidence", 0.0),
-                "segments": result.get("segments", []),
-                "status": result.get("status", -1)
-            }
-            
+            self._outbound.put_nowait(audio_chunk)
+            return True
+        except asyncio.QueueFull:
+            self.chunks_dropped += 1
+            return False
+
+    async def _sender(self):
+        """发送任务：从发送队列取数据写入连接，积压的小块合并为一帧发送"""
+        try:
+            while True:
+                chunk = await self._outbound.get()
+                if chunk is self._END:
+                    await self.ws.send(json.dumps({"is_speaking": False}))
+                    return
+                buffer = bytearray(chunk)
+                end_requested = False
+                while len(buffer) < self.stride and not self._outbound.empty():
+                    queued = self._outbound.get_nowait()
+                    if queued is self._END:
+                        end_requested = True
+                        break
+                    buffer.extend(queued)
+                await self.ws.send(bytes(buffer))
+                self.bytes_sent += len(buffer)
+                if end_requested:
+                    await self.ws.send(json.dumps({"is_speaking": False}))
+                    return
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Error while sending audio data: {e}")
-            raise
-            
-    async def stop(self) -> None:
-        """停止转写并关闭连接"""
+            self._error = e
+
+    async def _receiver(self):
+        """接收任务：把服务端推送的结果放入结果队列，连接关闭或会话结束时放入结束标记"""
+        try:
+            async for message in self.ws:
+                if not isinstance(message, str):
+                    continue
+                try:
+                    result = self._normalize_result(json.loads(message))
+                except json.JSONDecodeError:
+                    continue
+                self.results_received += 1
+                self._results.put_nowait(result)
+                if result["session_end"]:
+                    break
+        except websockets.exceptions.ConnectionClosed as e:
+            logger.info(f"FunASR connection closed: {e}")
+        except Exception as e:
+            logger.error(f"Error while receiving results: {e}")
+            self._error = e
+        finally:
+            self._results.put_nowait(None)
+            self._session_done.set()
+
+    @staticmethod
+    def _normalize_result(message: Dict[str, Any]) -> Dict[str, Any]:
+        mode = message.get("mode", "")
+        return {
+            "text": message.get("text", ""),
+            "mode": mode,
+            "is_final": mode not in PARTIAL_MODES,
+            "timestamp": message.get("timestamp"),
+            "session_end": bool(message.get("is_final", False))
+        }
+
+    async def results(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        按到达顺序产出识别结果，会话结束或连接关闭时结束
+
+        Yields:
+            Dict[str, Any]: 识别结果，is_final 为 False 时是中间结果
+        """
+        if self._results is None:
+            return
+        while True:
+            result = await self._results.get()
+            if result is None:
+                # 保留结束标记，使重复迭代也能正常结束
+                self._results.put_nowait(None)
+                return
+            yield result
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """发送完队列中剩余的音频和结束标记，等待剩余结果返回后关闭连接"""
         if self.ws:
             try:
-                # 发送结束命令
-                end_command = {
-                    "end": True,
-                    "task_id": self.task_id
-                }
-                await self.ws.send(json.dumps(end_command))
-                
-                # 等待最后的结果
-                response = await self.ws.recv()
-                logger.info(f"Final response: {response}")
-                
+                if self._error is None and not self._sender_task.done():
+                    await asyncio.wait_for(self._outbound.put(self._END), timeout=timeout)
+                # 最终结果由 results() 的消费者接收，这里只等待会话结束
+                await asyncio.wait_for(self._session_done.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.info("Timed out waiting for final FunASR result")
             except Exception as e:
                 logger.error(f"Error while stopping transcription: {e}")
-            
+
             finally:
+                for task in (self._sender_task, self._receiver_task):
+                    if task is not None and not task.done():
+                        task.cancel()
                 await self.ws.close()
                 self.ws = None
                 self.is_connected = False
-                self.task_id = None 
\ No newline at end of file
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取收发统计信息"""
+        return {
+            "connected": self.is_connected,
+            "pending_chunks": self.pending_chunks,
+            "max_pending_chunks": self.max_pending_chunks,
+            "backpressure": self.backpressure,
+            "bytes_sent": self.bytes_sent,
+            "chunks_dropped": self.chunks_dropped,
+            "results_received": self.results_received
+        }
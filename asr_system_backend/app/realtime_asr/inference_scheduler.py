@@ -0,0 +1,40 @@
+"""
+实时转写批量推理调度器
+汇总所有会话待转写的音频窗口，合并为一次模型调用，再把文本分发回各个会话
+"""
+
+import asyncio
+import logging
+from concurrent.futures import Executor, Future
+from typing import Callable, List, Optional
+import numpy as np
+from ..micro_batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+class BatchInferenceScheduler(MicroBatcher):
+    """跨会话的批量推理调度器
+
+    各会话调用 transcribe() 提交一个音频窗口后等待结果，多个会话的窗口合并为一次 transcribe_fn 调用，
+    按提交顺序把文本返回给对应会话。并发会话越多，越能利用模型的批量维度，CPU上的总吞吐也越高。
+    指定 executor 时批次在该线程池（推理线程池）中执行，最多同时执行 max_in_flight 批。
+    """
+
+    name = "批量转写"
+    thread_name = "whisper-batch-scheduler"
+
+    def __init__(self, transcribe_fn: Callable[[List[np.ndarray]], List[str]], max_batch_size: int = 8,
+                 max_wait_ms: float = 50.0, executor: Optional[Executor] = None, max_in_flight: int = 1):
+        super().__init__(max_batch_size, max_wait_ms, executor=executor, max_in_flight=max_in_flight)
+        self.transcribe_fn = transcribe_fn
+
+    def submit(self, audio: np.ndarray, session_id: Optional[str] = None) -> Future:
+        """提交一个音频窗口，返回转写文本的Future"""
+        return self.submit_payload((audio, session_id))
+
+    async def transcribe(self, audio: np.ndarray, session_id: Optional[str] = None) -> str:
+        """在事件循环中等待音频窗口的转写结果"""
+        return await asyncio.wrap_future(self.submit(audio, session_id))
+
+    def _execute(self, payloads: List[tuple]) -> List[str]:
+        return self.transcribe_fn([audio for audio, _ in payloads])
@@ -0,0 +1,133 @@
+"""
+Whisper 模型注册表与推理线程池
+进程内每个模型只加载一次，所有实时会话只读共享；推理在专用的线程池中执行
+支持三种推理后端：pytorch（fp32）、int8（动态量化，CPU）、onnx（ONNX Runtime，CPU）
+"""
+
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+import torch
+from transformers import WhisperProcessor, WhisperForConditionalGeneration
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# ONNX Runtime后端为可选依赖，未安装optimum[onnxruntime]时退回int8动态量化
+try:
+    from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+except ImportError:
+    ORTModelForSpeechSeq2Seq = None
+
+BACKENDS = ("pytorch", "int8", "onnx")
+
+def quantize_int8(model: WhisperForConditionalGeneration) -> torch.nn.Module:
+    """把模型中的Linear层动态量化为int8，权重预先量化，激活在推理时按批量化，只能在CPU上运行"""
+    from torch.ao.quantization import quantize_dynamic
+    return quantize_dynamic(model.cpu(), {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_whisper(model_name: str, backend: str = "pytorch", onnx_dir: str = ""):
+    """按推理后端加载Whisper模型，返回 (处理器, 模型, 实际使用的后端)
+
+    onnx后端优先读取onnx_dir中已导出的模型，未配置时从model_name导出。
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的推理后端: {backend}")
+    processor = WhisperProcessor.from_pretrained(model_name)
+
+    if backend == "onnx":
+        if ORTModelForSpeechSeq2Seq is not None:
+            source = onnx_dir or model_name
+            model = ORTModelForSpeechSeq2Seq.from_pretrained(
+                source, export=not onnx_dir, provider="CPUExecutionProvider"
+            )
+            return processor, model, backend
+        logger.warning("未安装optimum[onnxruntime]，Whisper推理改用int8动态量化")
+        backend = "int8"
+
+    model = WhisperForConditionalGeneration.from_pretrained(model_name)
+    model.eval()
+    if backend == "int8":
+        model = quantize_int8(model)
+    elif torch.cuda.is_available():
+        model = model.to("cuda")
+    return processor, model, backend
+
+class WhisperModelRegistry:
+    """按模型名称和推理后端缓存已加载的处理器和模型
+
+    模型加载后切换到eval模式，推理只在torch.inference_mode下进行，不修改参数，可被多个线程共享。
+    """
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, str], Tuple[WhisperProcessor, torch.nn.Module]] = {}
+        self._backends: Dict[Tuple[str, str], str] = {}  # 请求的后端 -> 实际使用的后端
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str, backend: str = "pytorch", onnx_dir: str = "") -> Tuple[WhisperProcessor, torch.nn.Module]:
+        """获取模型，首次调用时加载，并发调用只会加载一次"""
+        key = (model_name, backend)
+        loaded = self._models.get(key)
+        if loaded is not None:
+            return loaded
+        with self._lock:
+            loaded = self._models.get(key)
+            if loaded is None:
+                logger.info(f"加载Whisper模型: {model_name}（{backend}）")
+                processor, model, used_backend = load_whisper(model_name, backend, onnx_dir)
+                loaded = (processor, model)
+                self._models[key] = loaded
+                self._backends[key] = used_backend
+            return loaded
+
+    def backend_of(self, model_name: str, backend: str) -> Optional[str]:
+        """已加载模型实际使用的后端（onnx不可用时为int8），未加载时返回None"""
+        return self._backends.get((model_name, backend))
+
+    def loaded_models(self):
+        """已加载的模型名称"""
+        return [model_name for model_name, _ in self._models]
+
+# 全局模型注册表实例
+_registry = WhisperModelRegistry()
+
+def get_model_registry() -> WhisperModelRegistry:
+    """获取模型注册表实例"""
+    return _registry
+
+def torch_threads_per_worker(workers: int, configured: int = 0) -> int:
+    """每个推理线程使用的torch线程数，未配置时把CPU核数平均分给各推理线程，避免超额订阅"""
+    if configured > 0:
+        return configured
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_inference_executor() -> ThreadPoolExecutor:
+    """获取专用的推理线程池，与默认线程池中的文件读写等任务隔离"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            config = settings.whisper_config
+            workers = max(1, config["inference_workers"])
+            threads = torch_threads_per_worker(workers, config["torch_threads"])
+            _executor = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix="whisper-inference",
+                initializer=torch.set_num_threads,
+                initargs=(threads,)
+            )
+            logger.info(f"Whisper推理线程池: {workers} 个线程，每个线程使用 {threads} 个torch线程")
+        return _executor
+
+def shutdown_inference_executor():
+    """关闭推理线程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
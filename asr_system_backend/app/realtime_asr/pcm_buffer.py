@@ -0,0 +1,86 @@
+"""
+PCM 环形缓冲区
+为实时转写会话累积音频，内存固定，写入和取模型输入的开销与会话时长无关
+"""
+
+import numpy as np
+
+
+class PCMRingBuffer:
+    """预分配的 float32 环形缓冲区
+
+    存储区长度为容量的两倍，每次写入同时写到镜像位置，
+    因此最近任意不超过容量的一段样本在存储区中总是连续的，view() 可以直接返回切片而不复制。
+    缓冲区写满后继续写入会覆盖最早的样本，并计入 dropped。
+    """
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._storage = np.zeros(capacity * 2, dtype=dtype)
+        self._write_pos = 0  # 下一个样本写入的位置（0 <= _write_pos < capacity）
+        self._length = 0  # 当前有效样本数
+        self.dropped = 0  # 因缓冲区已满被覆盖的样本数
+
+    def __len__(self) -> int:
+        return self._length
+
+    def write(self, samples: np.ndarray):
+        """追加样本，超过容量时覆盖最早的样本"""
+        samples = np.asarray(samples, dtype=self._storage.dtype).reshape(-1)
+        if len(samples) > self.capacity:
+            self.dropped += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        count = len(samples)
+        if count == 0:
+            return
+
+        capacity = self.capacity
+        first = min(count, capacity - self._write_pos)
+        for offset in (0, capacity):
+            start = self._write_pos + offset
+            self._storage[start:start + first] = samples[:first]
+        rest = count - first
+        if rest:
+            # 回绕到存储区开头，镜像写到后半部分
+            self._storage[:rest] = samples[first:]
+            self._storage[capacity:capacity + rest] = samples[first:]
+
+        overflow = self._length + count - capacity
+        if overflow > 0:
+            self.dropped += overflow
+        self._length = min(self._length + count, capacity)
+        self._write_pos = (self._write_pos + count) % capacity
+
+    def view(self, count: int = None) -> np.ndarray:
+        """返回最近count个样本（默认全部有效样本）的只读视图，不复制数据
+
+        视图在之后的写入覆盖到这些样本之前有效。
+        """
+        count = self._length if count is None else min(count, self._length)
+        end = self._write_pos + self.capacity
+        window = self._storage[end - count:end]
+        window.flags.writeable = False
+        return window
+
+    def peek(self, count: int = None) -> np.ndarray:
+        """返回最早count个样本（默认全部有效样本）的只读视图，不复制数据
+
+        与consume()配合使用：先取最早的一段处理，处理完再从同一端丢弃。
+        """
+        count = self._length if count is None else min(count, self._length)
+        start = self._write_pos + self.capacity - self._length
+        window = self._storage[start:start + count]
+        window.flags.writeable = False
+        return window
+
+    def consume(self, count: int, keep: int = 0):
+        """丢弃最早的count个样本，但至少保留其中最后keep个作为下一段的重叠部分"""
+        remove = max(0, min(count, self._length) - keep)
+        self._length -= remove
+
+    def clear(self):
+        """清空缓冲区，不释放存储"""
+        self._length = 0
+        self._write_pos = 0
@@ -1,29 +1,85 @@
 import numpy as np
 import torch
-from transformers import WhisperProcessor, WhisperForConditionalGeneration
 import io
 import wave
-from typing import Optional
+from typing import List, Optional
 import asyncio
 import soundfile as sf
 import tempfile
 import subprocess
 import os
+import threading
+from ..config import get_settings
+from .pcm_buffer import PCMRingBuffer
+from .inference_scheduler import BatchInferenceScheduler
+from .model_registry import get_model_registry, get_inference_executor
+
+settings = get_settings()
+
+SAMPLE_RATE = 16000  # Whisper期望的采样率
+
+def get_whisper_model():
+    """按配置的推理后端获取共享的Whisper处理器和模型"""
+    config = settings.whisper_config
+    return get_model_registry().get(config["model_name"], config["backend"], config["onnx_dir"])
+
+def run_batch_transcription(windows: List[np.ndarray]) -> List[str]:
+    """用共享的Whisper模型一次转写多个音频窗口"""
+    processor, model = get_whisper_model()
+    # 准备输入特征，各窗口由特征提取器补齐到相同长度
+    input_features = processor(
+        windows, 
+        sampling_rate=SAMPLE_RATE, 
+        return_tensors="pt"
+    ).input_features
+    
+    # 输入与模型放在同一设备（量化和ONNX后端只在CPU上运行）
+    input_features = input_features.to(model.device)
+    
+    # 一次生成整批的转写
+    with torch.inference_mode():
+        predicted_ids = model.generate(input_features)
+    transcriptions = processor.batch_decode(
+        predicted_ids, 
+        skip_special_tokens=True
+    )
+    
+    return [transcription.strip() for transcription in transcriptions]
+
+# 所有会话共用的批量推理调度器
+_scheduler: Optional[BatchInferenceScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_inference_scheduler() -> BatchInferenceScheduler:
+    """获取批量推理调度器实例，批次在专用的推理线程池中执行"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            config = settings.whisper_config
+            _scheduler = BatchInferenceScheduler(
+                run_batch_transcription,
+                max_batch_size=config["batch_max_size"],
+                max_wait_ms=config["batch_wait_ms"],
+                executor=get_inference_executor(),
+                max_in_flight=max(1, config["inference_workers"])
+            )
+        return _scheduler
 
 class RealtimeASRHandler:
-    def __init__(self):
-        # 初始化Whisper模型
-        self.processor = WhisperProcessor.from_pretrained("openai/whisper-small")
-        self.model = WhisperForConditionalGeneration.from_pretrained("openai/whisper-small")
-        if torch.cuda.is_available():
-            self.model = self.model.to("cuda")
+    def __init__(self, session_id: Optional[str] = None):
+        # 获取共享的Whisper模型（进程内只加载一次）
+        self.processor, self.model = get_whisper_model()
         
         # 音频缓冲设置
-        self.sample_rate = 16000  # Whisper期望的采样率
-        self.audio_buffer = np.array([], dtype=np.float32)
-        self.buffer_size = self.sample_rate * 3  # 3秒的音频缓冲
+        self.sample_rate = SAMPLE_RATE
+        self.buffer_size = self.sample_rate * 3  # 每3秒音频转写一次
+        self.overlap_samples = int(0.5 * self.sample_rate)  # 保留0.5秒与下一段重叠，实现平滑过渡
+        # 预留一个窗口的空间，转写期间到达的音频不会覆盖正在转写的数据
+        self.audio_buffer = PCMRingBuffer(self.buffer_size * 2)
         
         # 转写设置
+        self.session_id = session_id
+        self.scheduler = get_inference_scheduler()
         self.is_processing = False
         self.last_transcription = ""
 
@@ -34,20 +90,26 @@ class RealtimeASRHandler:
             if audio_array is None:
                 return None
             
-            # 添加到缓冲区
-            self.audio_buffer = np.append(self.audio_buffer, audio_array)
+            # 添加到缓冲区（写入开销只与本次数据量有关）
+            self.audio_buffer.write(audio_array)
             
             # 如果缓冲区达到指定大小，进行处理
             if len(self.audio_buffer) >= self.buffer_size and not self.is_processing:
                 self.is_processing = True
+                transcriptions = []
                 try:
-                    # 处理音频并获取转写结果
-                    transcription = await self._transcribe_audio()
-                    self.last_transcription = transcription
-                    
-                    # 清除已处理的音频数据，保留最后0.5秒以实现平滑过渡
-                    overlap_samples = int(0.5 * self.sample_rate)
-                    self.audio_buffer = self.audio_buffer[-overlap_samples:]
+                    # 一次写入的音频可能超过一个窗口，按窗口依次处理直到不足一个窗口
+                    while len(self.audio_buffer) >= self.buffer_size:
+                        # 取最早的一个窗口，与下面consume()丢弃的是同一端；
+                        # 推理在其他线程中进行，期间的写入可能覆盖视图，因此交给调度器前复制一份
+                        window = self.audio_buffer.peek(self.buffer_size)
+                        transcription = await self._transcribe_audio(window.copy())
+                        if transcription:
+                            transcriptions.append(transcription)
+                        
+                        # 清除已处理的音频数据，保留最后0.5秒以实现平滑过渡
+                        self.audio_buffer.consume(len(window), keep=self.overlap_samples)
+                    self.last_transcription = " ".join(transcriptions)
                     
                 finally:
                     self.is_processing = False
@@ -109,36 +171,15 @@ class RealtimeASRHandler:
             except:
                 pass
 
-    async def _transcribe_audio(self) -> str:
-        # 在事件循环中运行转写任务
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._run_transcription)
-
-    def _run_transcription(self) -> str:
+    async def _transcribe_audio(self, audio: np.ndarray) -> str:
+        # 交给调度器与其他会话的窗口合并推理
         try:
-            # 准备输入特征
-            input_features = self.processor(
-                self.audio_buffer, 
-                sampling_rate=self.sample_rate, 
-                return_tensors="pt"
-            ).input_features
-            
-            if torch.cuda.is_available():
-                input_features = input_features.to("cuda")
-            
-            # 生成转写
-            predicted_ids = self.model.generate(input_features)
-            transcription = self.processor.batch_decode(
-                predicted_ids, 
-                skip_special_tokens=True
-            )[0]
-            
-            return transcription.strip()
+            return await self.scheduler.transcribe(audio, self.session_id)
         except Exception as e:
             print(f"转写过程出错: {str(e)}")
             return ""
 
     async def cleanup(self):
         # 清理资源
-        self.audio_buffer = np.array([], dtype=np.float32)
+        self.audio_buffer.clear()
         self.is_processing = False 
\ No newline at end of file
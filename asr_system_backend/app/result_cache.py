@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class TranscriptionResultCache:
+    """内容寻址的转写结果缓存
+
+    键由音频内容哈希和解码参数（模式、ITN、热词摘要）组成。
+    内存层按LRU淘汰，同时受条目数、总字节数和TTL限制；
+    可选的磁盘层按键保存JSON文件，进程重启后仍可命中，总大小超过disk_max_bytes时按LRU删除最久未用的文件。
+    协程中应使用aget/aput，磁盘读写在线程池中执行。
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 86400, disk_dir: Optional[str] = None, disk_max_bytes: int = 512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (过期时间, 序列化结果)
+        self._total_bytes = 0
+        self._disk_entries: "OrderedDict[str, int]" = OrderedDict()  # key -> 文件大小，按最近使用排序
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _scan_disk(self):
+        """启动时按修改时间（命中时会更新）重建磁盘层的LRU顺序，并立即执行容量限制"""
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, name[:-len(".json")], stat.st_size))
+        with self._lock:
+            for _, key, size in sorted(files):
+                self._disk_entries[key] = size
+                self._disk_bytes += size
+            victims = self._evict_disk()
+        self._remove_files(victims)
+
+    @staticmethod
+    def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+        """分块计算文件内容的SHA-256"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(content_digest: str, mode: str = "offline", itn: bool = True, hotwords: str = "") -> str:
+        """根据内容哈希和解码参数生成缓存键"""
+        hotwords_digest = hashlib.sha256(hotwords.encode('utf-8')).hexdigest()[:16]
+        params = f"{mode}|itn={int(itn)}|hw={hotwords_digest}"
+        return hashlib.sha256(f"{content_digest}|{params}".encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _store(self, key: str, expires_at: float, payload: bytes):
+        """写入内存层并按LRU淘汰，调用方需持有锁"""
+        if len(payload) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._total_bytes -= len(old[1])
+        self._entries[key] = (expires_at, payload)
+        self._total_bytes += len(payload)
+
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._total_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _get_memory(self, key: str, now: float) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[1])
+            self._entries.pop(key)
+            self._total_bytes -= len(entry[1])
+            return None
+
+    def _get_disk(self, key: str, now: float) -> Optional[Dict]:
+        payload = self._read_disk(key, now) if self.disk_dir else None
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self._store(key, payload[0], payload[1])
+            self.hits += 1
+            self.disk_hits += 1
+        return json.loads(payload[1])
+
+    def get(self, key: str) -> Optional[Dict]:
+        """查询缓存，未命中或已过期时返回None"""
+        now = time.time()
+        cached = self._get_memory(key, now)
+        if cached is not None:
+            return cached
+        return self._get_disk(key, now)
+
+    async def aget(self, key: str) -> Optional[Dict]:
+        """协程版本的get，内存层未命中时在线程池中读取磁盘层"""
+        now = time.time()
+        cached = self._get_memory(key, now)
+        if cached is not None or not self.disk_dir:
+            if cached is None:
+                with self._lock:
+                    self.misses += 1
+            return cached
+        return await asyncio.get_running_loop().run_in_executor(None, self._get_disk, key, now)
+
+    def _put_memory(self, key: str, result: Dict) -> float:
+        payload = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, expires_at, payload)
+        return expires_at
+
+    def put(self, key: str, result: Dict):
+        """写入缓存"""
+        expires_at = self._put_memory(key, result)
+        if self.disk_dir:
+            self._write_disk(key, expires_at, result)
+
+    async def aput(self, key: str, result: Dict):
+        """协程版本的put，磁盘写入在线程池中执行"""
+        expires_at = self._put_memory(key, result)
+        if self.disk_dir:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_disk, key, expires_at, result)
+
+    def _forget_disk(self, key: str):
+        """从磁盘层索引中移除，调用方需持有锁"""
+        size = self._disk_entries.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def _evict_disk(self):
+        """磁盘层超过容量时按LRU选出要删除的键，调用方需持有锁"""
+        victims = []
+        while self._disk_entries and self._disk_bytes > self.disk_max_bytes:
+            key, size = self._disk_entries.popitem(last=False)
+            self._disk_bytes -= size
+            self.disk_evictions += 1
+            victims.append(key)
+        return victims
+
+    def _remove_files(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def _read_disk(self, key: str, now: float):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget_disk(key)
+            return None
+        except Exception as e:
+            logger.warning(f"读取磁盘缓存失败: {str(e)}")
+            return None
+
+        if record.get("expires_at", 0) <= now:
+            with self._lock:
+                self._forget_disk(key)
+            self._remove_files([key])
+            return None
+        with self._lock:
+            if key in self._disk_entries:
+                self._disk_entries.move_to_end(key)
+        try:
+            # 更新修改时间，重启后仍按最近使用顺序淘汰
+            os.utime(path)
+        except OSError:
+            pass
+        return record["expires_at"], json.dumps(record["result"], ensure_ascii=False).encode('utf-8')
+
+    def _write_disk(self, key: str, expires_at: float, result: Dict):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再重命名，避免其他进程读到半个文件
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"expires_at": expires_at, "result": result}, f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"写入磁盘缓存失败: {str(e)}")
+            return
+
+        with self._lock:
+            self._forget_disk(key)
+            self._disk_entries[key] = size
+            self._disk_bytes += size
+            victims = self._evict_disk()
+        self._remove_files(victims)
+
+    def clear(self):
+        """清空内存层缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "disk_dir": self.disk_dir,
+                "disk_entries": len(self._disk_entries),
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes,
+                "disk_evictions": self.disk_evictions,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+def create_result_cache() -> Optional[TranscriptionResultCache]:
+    """根据配置创建转写结果缓存，未启用时返回None"""
+    if not settings.ASR_RESULT_CACHE_ENABLED:
+        return None
+    return TranscriptionResultCache(
+        max_entries=settings.ASR_RESULT_CACHE_MAX_ENTRIES,
+        max_bytes=settings.ASR_RESULT_CACHE_MAX_BYTES,
+        ttl=settings.ASR_RESULT_CACHE_TTL,
+        disk_dir=settings.ASR_RESULT_CACHE_DIR,
+        disk_max_bytes=settings.ASR_RESULT_CACHE_DISK_MAX_BYTES
+    )
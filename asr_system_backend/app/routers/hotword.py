@@ -5,9 +5,12 @@ from .. import schemas, models
 from ..database import get_db
 from .auth import get_current_user
 from ..rag_service import get_rag_service
+from ..config import get_settings
 import csv
 from io import StringIO
 
+settings = get_settings()
+
 router = APIRouter(
     prefix="/hotwords",
     tags=["hotwords"]
@@ -22,12 +25,12 @@ def create_hotword(
     """
     创建新的热词
     """
-    # 查询用户当前的热词数量，检查是否达到上限（假设上限为100）
+    # 查询用户当前的热词数量，检查是否达到上限
     count = db.query(models.Hotword).filter(models.Hotword.user_id == current_user.id).count()
-    if count >= 100:
+    if count >= settings.HOTWORD_MAX_PER_USER:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="热词数量已达上限（100个）"
+            detail=f"热词数量已达上限（{settings.HOTWORD_MAX_PER_USER}个）"
         )
     
     # 检查是否已存在相同的热词
@@ -52,13 +55,13 @@ def create_hotword(
     db.commit()
     db.refresh(db_hotword)
     
-    # 重建用户的RAG索引
+    # 只为新热词生成向量并加入用户的RAG索引
     try:
         rag_service = get_rag_service()
         if rag_service.initialized:
-            rag_service.build_user_hotword_index(db, current_user.id)
+            rag_service.sync_user_hotwords(db, current_user.id, added=[db_hotword])
     except Exception as e:
-        print(f"重建RAG索引失败: {str(e)}")
+        print(f"更新RAG索引失败: {str(e)}")
     
     return db_hotword
 
@@ -125,13 +128,13 @@ def update_hotword(
     db.commit()
     db.refresh(hotword)
     
-    # 重建用户的RAG索引
+    # 只替换该热词的向量（仅修改权重时不重新编码）
     try:
         rag_service = get_rag_service()
         if rag_service.initialized:
-            rag_service.build_user_hotword_index(db, current_user.id)
+            rag_service.sync_user_hotwords(db, current_user.id, updated=[hotword])
     except Exception as e:
-        print(f"重建RAG索引失败: {str(e)}")
+        print(f"更新RAG索引失败: {str(e)}")
     
     return hotword
 
@@ -165,13 +168,13 @@ def delete_hotword(
     db.delete(hotword)
     db.commit()
     
-    # 重建用户的RAG索引
+    # 只从用户的RAG索引中删除该热词的向量
     try:
         rag_service = get_rag_service()
         if rag_service.initialized:
-            rag_service.build_user_hotword_index(db, current_user.id)
+            rag_service.sync_user_hotwords(db, current_user.id, removed_ids=[hotword_id])
     except Exception as e:
-        print(f"重建RAG索引失败: {str(e)}")
+        print(f"更新RAG索引失败: {str(e)}")
     
     return {"message": "热词已成功删除"}
 
@@ -197,6 +200,7 @@ async def bulk_import_hotwords(
     # 尝试解析CSV
     added_count = 0
     skipped_count = 0
+    new_hotwords = []
     
     try:
         text = content.decode('utf-8')
@@ -204,13 +208,13 @@ async def bulk_import_hotwords(
         
         # 查询用户当前热词数量
         current_count = db.query(models.Hotword).filter(models.Hotword.user_id == current_user.id).count()
-        max_allowed = 100
+        max_allowed = settings.HOTWORD_MAX_PER_USER
         remaining = max_allowed - current_count
         
         if remaining <= 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="热词数量已达上限（100个）"
+                detail=f"热词数量已达上限（{max_allowed}个）"
             )
         
         # 开始导入
@@ -254,18 +258,19 @@ async def bulk_import_hotwords(
                 weight=weight
             )
             db.add(db_hotword)
+            new_hotwords.append(db_hotword)
             added_count += 1
         
         # 提交事务
         db.commit()
         
-        # 重建用户的RAG索引
+        # 只为新导入的热词生成向量
         try:
             rag_service = get_rag_service()
             if rag_service.initialized:
-                rag_service.build_user_hotword_index(db, current_user.id)
+                rag_service.sync_user_hotwords(db, current_user.id, added=new_hotwords)
         except Exception as e:
-            print(f"重建RAG索引失败: {str(e)}")
+            print(f"更新RAG索引失败: {str(e)}")
         
         return {
             "added_count": added_count,
@@ -3,8 +3,6 @@
 
 import asyncio
 import logging
-import os
-import subprocess
 import uuid
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
 from sqlalchemy.orm import Session
@@ -12,6 +10,8 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models import User
 from ..auth_service import decode_access_token
+from ..asr_engine import get_asr_engine
+from ..audio_decoder import FFmpegPCMDecoder
 
 # --- 日志和路由配置 ---
 logging.basicConfig(level=logging.INFO)
@@ -19,18 +19,27 @@ logger = logging.getLogger(__name__)
 # 创建一个全新的路由器实例
 router = APIRouter()
 
+# 等待ffmpeg输出当前音频块解码结果的最长时间(秒)
+DECODE_WAIT_SECONDS = 0.5
+
 # --- 新的、独立的连接管理器 ---
 class PollingConnectionManager:
     """为新功能创建一个独立的连接管理器，避免与现有功能混淆。"""
     def __init__(self):
         self.active_connections: dict[str, WebSocket] = {}
+        # 每个连接一个常驻的ffmpeg解码进程
+        self.decoders: dict[str, FFmpegPCMDecoder] = {}
 
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
         self.active_connections[client_id] = websocket
+        self.decoders[client_id] = FFmpegPCMDecoder()
         logger.info(f"[Polling WS] 客户端 {client_id} 已连接。")
 
     def disconnect(self, client_id: str):
+        decoder = self.decoders.pop(client_id, None)
+        if decoder is not None:
+            decoder.kill()
         if client_id in self.active_connections:
             del self.active_connections[client_id]
             logger.info(f"[Polling WS] 客户端 {client_id} 已断开。")
@@ -54,39 +63,17 @@ async def get_current_user_from_polling_ws(token: str = Query(...), db: Session
         return None
 
 
-# --- 音频处理核心函数 (与上次提供的逻辑相同) ---
-async def process_polling_chunk(client_id: str, audio_data: bytes):
-    temp_id = str(uuid.uuid4())
-    webm_path = f"/tmp/{temp_id}.webm"
-    wav_path = f"/tmp/{temp_id}.wav"
-    
+# --- 音频处理核心函数 ---
+async def process_polling_chunk(client_id: str, decoder: FFmpegPCMDecoder):
     try:
-        with open(webm_path, "wb") as f:
-            f.write(audio_data)
-
-        command = f"ffmpeg -i {webm_path} -ar 16000 -ac 1 -y {wav_path}"
-        process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        _, stderr = await process.communicate()
-
-        if process.returncode != 0:
-            logger.error(f"[Polling WS] FFmpeg转换失败: {stderr.decode()}")
-            await polling_manager.send_json(client_id, {"type": "error", "message": "音频格式处理失败"})
+        # 取走该连接解码进程已输出的PCM；刚写入的块可能还在解码，稍等片刻
+        pcm_data = await decoder.read_pcm(wait=DECODE_WAIT_SECONDS)
+        if not pcm_data:
             return
 
-        root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
-        client_script_path = os.path.join(root_dir, "client", "funasr_wss_client.py")
-        
-        transcribe_command = ["python", client_script_path, "--host", "127.0.0.1", "--port", "10095", "--mode", "offline", "--audio_in", wav_path]
-        
-        transcribe_process = await asyncio.create_subprocess_exec(*transcribe_command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        transcribe_stdout, transcribe_stderr = await transcribe_process.communicate()
-        output = transcribe_stdout.decode() + transcribe_stderr.decode()
-        
-        transcription = ""
-        for line in output.split("\n"):
-            if "pid0_0: demo:" in line:
-                transcription = line.split("pid0_0: demo:")[-1].strip()
-                break
+        # 直接发送内存中的PCM数据，不再经过临时文件
+        result = await get_asr_engine().transcribe_pcm(pcm_data, decoder.sample_rate, wav_name=client_id)
+        transcription = result.get("text", "").strip()
         
         logger.info(f"[Polling WS] 客户端 {client_id} 的转写结果: '{transcription}'")
 
@@ -99,9 +86,6 @@ async def process_polling_chunk(client_id: str, audio_data: bytes):
     except Exception as e:
         logger.error(f"[Polling WS] 处理音频块时出错: {e}")
         await polling_manager.send_json(client_id, {"type": "error", "message": "服务器处理音频时出错"})
-    finally:
-        if os.path.exists(webm_path): os.remove(webm_path)
-        if os.path.exists(wav_path): os.remove(wav_path)
 
 
 # --- 新的WebSocket端点定义 ---
@@ -124,7 +108,17 @@ async def websocket_polling_endpoint(
         
         while True:
             audio_data = await websocket.receive_bytes()
-            asyncio.create_task(process_polling_chunk(client_id, audio_data))
+            decoder = polling_manager.decoders.get(client_id)
+            if decoder is None:
+                continue
+            # 按接收顺序写入解码进程，转写在后台进行，不阻塞接收下一块数据
+            try:
+                await decoder.feed(audio_data)
+            except (OSError, RuntimeError) as e:
+                logger.error(f"[Polling WS] 客户端 {client_id} 音频解码失败: {e}")
+                await polling_manager.send_json(client_id, {"type": "error", "message": "音频格式处理失败"})
+                continue
+            asyncio.create_task(process_polling_chunk(client_id, decoder))
 
     except WebSocketDisconnect:
         polling_manager.disconnect(client_id)
@@ -40,6 +40,9 @@ class IndexStatsResponse(BaseModel):
     index_dimension: int
     is_initialized: bool
     last_updated: Optional[str] = None
+    index: Optional[Dict[str, Any]] = None  # 索引类型和向量数量
+    search: Optional[Dict[str, Any]] = None  # 查询延迟和召回率统计
+    recall: Optional[float] = None
 
 class BulkAddRequest(BaseModel):
     words: List[Dict[str, Any]] = Field(..., description="热词列表，格式：[{'word': 'xxx', 'weight': 5}]")
@@ -51,13 +54,16 @@ class IndexManagementResponse(BaseModel):
 
 @router.get("/health", summary="RAG服务健康检查")
 def health_check():
-    """RAG服务健康检查"""
+    """RAG服务健康检查，readiness中包含模型预热状态和用户索引加载情况"""
     rag_service = get_rag_service()
+    readiness = rag_service.get_readiness()
     return {
-        "status": "healthy" if rag_service.initialized else "initializing",
+        "status": "healthy" if rag_service.initialized else (
+            "unhealthy" if readiness["status"] == "failed" else "initializing"),
         "service": "RAG Vector Search Engine",
         "version": "1.0.0",
-        "initialized": rag_service.initialized
+        "initialized": rag_service.initialized,
+        "readiness": readiness
     }
 
 @router.post("/search", response_model=VectorSearchResponse, summary="向量相似度搜索")
@@ -81,9 +87,9 @@ def vector_search(
         if not rag_service.initialized:
             rag_service.initialize()
             
-        # 确保用户索引已构建
+        # 确保用户索引已加载，同一用户的并发请求共用一次加载
         if current_user.id not in rag_service.hotword_metadata:
-            rag_service.build_user_hotword_index(db, current_user.id)
+            rag_service.touch_user(current_user.id).result()
         
         # 执行向量搜索
         predictions = rag_service.predict_hotwords(
@@ -122,10 +128,11 @@ def vector_search(
 
 @router.get("/index/stats", response_model=IndexStatsResponse, summary="获取索引统计信息")
 def get_index_stats(
+    measure_recall: bool = False,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """获取用户热词索引的统计信息"""
+    """获取用户热词索引的统计信息，measure_recall为True时抽样测量近似索引的召回率"""
     try:
         rag_service = get_rag_service()
         
@@ -142,7 +149,10 @@ def get_index_stats(
             total_hotwords=hotword_count,
             index_dimension=rag_service.dimension if rag_service.initialized else 0,
             is_initialized=rag_service.initialized and has_index,
-            last_updated=None  # TODO: 可以添加时间戳跟踪
+            last_updated=None,  # TODO: 可以添加时间戳跟踪
+            index=rag_service.get_user_index_stats(current_user.id),
+            search=rag_service.search_stats.get_stats(),
+            recall=rag_service.measure_recall(current_user.id) if measure_recall and has_index else None
         )
         
     except Exception as e:
@@ -212,6 +222,7 @@ def bulk_add_to_index(
             
         added_count = 0
         skipped_count = 0
+        new_hotwords = []
         
         for word_data in request.words:
             word = word_data.get("word", "").strip()
@@ -238,14 +249,15 @@ def bulk_add_to_index(
                 weight=weight
             )
             db.add(db_hotword)
+            new_hotwords.append(db_hotword)
             added_count += 1
             
         # 提交数据库更改
         db.commit()
         
-        # 重建索引
+        # 只为新增的热词生成向量
         if added_count > 0:
-            rag_service.build_user_hotword_index(db, current_user.id)
+            rag_service.sync_user_hotwords(db, current_user.id, added=new_hotwords)
             
         return IndexManagementResponse(
             success=True,
@@ -283,9 +295,9 @@ def get_suggestions(
         if not rag_service.initialized:
             rag_service.initialize()
             
-        # 确保用户索引已构建
+        # 确保用户索引已加载，同一用户的并发请求共用一次加载
         if current_user.id not in rag_service.hotword_metadata:
-            rag_service.build_user_hotword_index(db, current_user.id)
+            rag_service.touch_user(current_user.id).result()
             
         # 获取建议
         suggestions = rag_service.get_hotword_suggestions(
@@ -10,6 +10,7 @@ from ..database import get_db
 from ..asr_engine import get_asr_engine
 from ..rag_service import get_rag_service
 from ..auth_service import decode_access_token
+from ..vad_gate import create_vad_gate, refine_segment
 import numpy as np
 import wave
 import io
@@ -88,6 +89,7 @@ async def websocket_realtime_transcribe(
 ):
     """实时语音转写WebSocket端点"""
     connection_id = f"conn_{hash(websocket)}"
+    vad_gate = None
     
     try:
         # 认证用户
@@ -108,13 +110,10 @@ async def websocket_realtime_transcribe(
         if not asr_engine.initialized:
             asr_engine.initialize()
             
-        # 初始化RAG服务
+        # 在后台加载用户的热词索引（模型未就绪时一并加载），不阻塞连接建立；
+        # 加载完成前的转写结果不做热词增强
         rag_service = get_rag_service()
-        if not rag_service.initialized:
-            rag_service.initialize()
-            
-        # 为用户构建热词索引
-        rag_service.build_user_hotword_index(db, user.id)
+        rag_service.touch_user(user.id)
         
         # 音频数据缓冲区
         audio_buffer = bytearray()
@@ -122,6 +121,10 @@ async def websocket_realtime_transcribe(
         chunk_duration = 2.0  # 2秒一个处理块
         chunk_size = int(sample_rate * chunk_duration * 2)  # 16-bit PCM
         
+        # 语音门控：静音不发送给ASR，按语音边界切分片段；未启用时按固定2秒分块
+        vad_gate = create_vad_gate(sample_rate)
+        silence_notified = 0  # 上次提示静音时门控已丢弃的字节数
+        
         await manager.send_message(connection_id, {
             "type": "ready",
             "message": "实时转写服务已准备就绪",
@@ -135,11 +138,37 @@ async def websocket_realtime_transcribe(
         while True:
             # 接收音频数据
             data = await websocket.receive()
+            if data["type"] == "websocket.disconnect":
+                # receive()不会抛出断开异常，转换后统一在下面处理
+                raise WebSocketDisconnect(data.get("code", 1000))
             
             if data["type"] == "websocket.receive":
                 if "bytes" in data:
                     # 处理二进制音频数据
                     audio_data = data["bytes"]
+                    
+                    if vad_gate is not None:
+                        for segment in vad_gate.feed(audio_data):
+                            asyncio.create_task(
+                                process_voiced_segment(
+                                    segment,
+                                    connection_id,
+                                    user.id,
+                                    asr_engine,
+                                    rag_service,
+                                    db,
+                                    sample_rate
+                                )
+                            )
+                        # 连续丢弃的静音每满一个处理块提示一次
+                        if not vad_gate.in_speech and vad_gate.bytes_dropped - silence_notified >= chunk_size:
+                            silence_notified = vad_gate.bytes_dropped
+                            await manager.send_message(connection_id, {
+                                "type": "silence_detected",
+                                "message": "检测到静音"
+                            })
+                        continue
+                    
                     audio_buffer.extend(audio_data)
                     
                     # 当缓冲区积累足够数据时进行转写
@@ -174,6 +203,18 @@ async def websocket_realtime_transcribe(
                         
     except WebSocketDisconnect:
         logger.info(f"WebSocket连接 {connection_id} 主动断开")
+        if vad_gate is not None:
+            # 门控中尚未结束的最后一段语音在断开前转写完，不丢弃
+            for segment in vad_gate.flush():
+                await process_voiced_segment(
+                    segment,
+                    connection_id,
+                    user.id,
+                    asr_engine,
+                    rag_service,
+                    db,
+                    sample_rate
+                )
         manager.disconnect(connection_id)
     except Exception as e:
         logger.error(f"WebSocket错误: {str(e)}")
@@ -183,6 +224,21 @@ async def websocket_realtime_transcribe(
         })
         manager.disconnect(connection_id)
 
+async def process_voiced_segment(
+    segment: bytes,
+    connection_id: str,
+    user_id: str,
+    asr_engine,
+    rag_service,
+    db: Session,
+    sample_rate: int
+):
+    """用FSMN VAD复核门控切出的语音片段，只把确认为语音的部分交给ASR"""
+    loop = asyncio.get_running_loop()
+    pieces = await loop.run_in_executor(None, refine_segment, segment, sample_rate)
+    for piece in pieces:
+        await process_audio_chunk(piece, connection_id, user_id, asr_engine, rag_service, db, sample_rate)
+
 async def process_audio_chunk(
     audio_data: bytes,
     connection_id: str,
@@ -210,14 +266,15 @@ async def process_audio_chunk(
             
         try:
             # 使用ASR引擎转写音频
-            transcription_result = asr_engine.transcribe_audio(temp_file_path)
+            # 实时音频块几乎不会重复，不经过结果缓存
+            transcription_result = await asr_engine.transcribe(temp_file_path, use_cache=False)
             
             # 提取转写文本
             transcription_text = transcription_result.get("text", "").strip()
             
             if transcription_text:
-                # 使用RAG服务增强转写结果
-                enhanced_result = rag_service.enhance_transcription_with_hotwords(
+                # 使用RAG服务增强转写结果（在线程池中进行，不阻塞其他连接）
+                enhanced_result = await rag_service.enhance_transcription_async(
                     transcription_text, user_id
                 )
                 
@@ -3,8 +3,6 @@
 
 import asyncio
 import logging
-import os
-import subprocess
 import uuid
 from datetime import datetime, timedelta
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
@@ -13,17 +11,31 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models import User
 from ..auth_service import decode_access_token
+from ..asr_engine import get_asr_engine
+from ..audio_decoder import FFmpegPCMDecoder
+from ..config import get_settings
+from ..realtime_asr.funasr_client import FunASRRealtimeClient
+from ..vad_gate import VADGate, create_vad_gate, refine_segment
 
 # --- 日志和路由配置 ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 router = APIRouter()
+settings = get_settings()
 
-# --- 存储每个连接的音频缓冲区和状态 ---
+# --- 存储每个连接的解码进程和状态 ---
 # 使用字典来管理多个并发连接，key是唯一的client_id
-client_buffers: dict[str, bytearray] = {}
+# 每个连接持有一个常驻的ffmpeg进程，WebM数据持续写入，解码后的PCM在其中累积
+client_decoders: dict[str, FFmpegPCMDecoder] = {}
 client_last_processed_time: dict[str, datetime] = {}
-PROCESSING_INTERVAL_SECONDS = 5 # 每隔5秒处理一次累积的音频
+# 按时间间隔识别时，每个连接的语音门控：静音直接丢弃，只识别按语音边界切好的片段
+client_vad_gates: dict[str, VADGate] = {}
+PROCESSING_INTERVAL_SECONDS = 5 # 每隔5秒处理一次累积的音频（offline模式或流式连接不可用时）
+
+# 流式识别会话：每个连接对应一个FunASR online/2pass连接，以及转发音频和结果的后台任务
+client_streams: dict[str, FunASRRealtimeClient] = {}
+client_stream_tasks: dict[str, list[asyncio.Task]] = {}
+STREAM_READ_WAIT_SECONDS = 0.1 # 等待解码输出的最长时间，决定音频转发给FunASR的粒度
 
 # --- WebSocket连接管理器 ---
 class ConnectionManager:
@@ -33,19 +45,33 @@ class ConnectionManager:
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
         self.active_connections[client_id] = websocket
-        # 初始化该连接的缓冲区和时间戳
-        client_buffers[client_id] = bytearray()
+        # 初始化该连接的解码进程和时间戳
         client_last_processed_time[client_id] = datetime.now()
-        logger.info(f"客户端 {client_id} 已连接，并已创建音频缓冲区。")
+        decoder = FFmpegPCMDecoder()
+        try:
+            await decoder.start()
+        except OSError as e:
+            logger.error(f"无法启动ffmpeg解码进程: {e}")
+            await websocket.send_json({"type": "error", "message": "音频格式处理失败"})
+            return
+        client_decoders[client_id] = decoder
+        gate = create_vad_gate(decoder.sample_rate)
+        if gate is not None:
+            client_vad_gates[client_id] = gate
+        logger.info(f"客户端 {client_id} 已连接，并已启动音频解码进程。")
 
     def disconnect(self, client_id: str):
         # 清理资源
         if client_id in self.active_connections:
             del self.active_connections[client_id]
-        if client_id in client_buffers:
-            del client_buffers[client_id]
+        decoder = client_decoders.pop(client_id, None)
+        if decoder is not None:
+            decoder.kill()
         if client_id in client_last_processed_time:
             del client_last_processed_time[client_id]
+        gate = client_vad_gates.pop(client_id, None)
+        if gate is not None and gate.frames_total:
+            logger.info(f"客户端 {client_id} 的语音门控统计: {gate.get_stats()}")
         logger.info(f"客户端 {client_id} 已断开，相关资源已清理。")
 
     async def send_json(self, client_id: str, data: dict):
@@ -65,57 +91,49 @@ async def get_current_user_from_ws_token(token: str, db: Session):
         return None
 
 # --- 音频处理核心函数 ---
-async def process_accumulated_audio(client_id: str):
+async def process_accumulated_audio(client_id: str, final: bool = False):
     """
-    处理指定客户端累积的音频数据。
-    这个函数会被定时调用或者在接收到新数据时触发检查。
+    处理指定客户端已解码的音频数据。
+    这个函数会被定时调用；final为True时关闭解码进程并处理剩余的全部数据。
     """
-    # 检查缓冲区中是否有数据
-    if client_id not in client_buffers or len(client_buffers[client_id]) == 0:
+    decoder = client_decoders.get(client_id)
+    if decoder is None:
         return
 
-    # 复制缓冲区内容进行处理，并清空原缓冲区
-    audio_data_to_process = client_buffers[client_id]
-    client_buffers[client_id] = bytearray()
-    
+    # 取走已解码的PCM，解码进程继续在后台处理后续数据
+    if final:
+        pcm_data = await decoder.close()
+    else:
+        pcm_data = await decoder.read_pcm()
+
     # 更新处理时间戳
     client_last_processed_time[client_id] = datetime.now()
-    
-    logger.info(f"开始处理客户端 {client_id} 的 {len(audio_data_to_process)} 字节音频数据。")
 
-    # 后续逻辑与之前的实现完全一致：保存、转换、调用脚本、返回结果、清理
-    temp_id = str(uuid.uuid4())
-    webm_path = f"/tmp/{temp_id}.webm"
-    wav_path = f"/tmp/{temp_id}.wav"
-    
-    try:
-        with open(webm_path, "wb") as f:
-            f.write(audio_data_to_process)
+    gate = client_vad_gates.get(client_id)
+    if gate is None:
+        segments = [pcm_data] if pcm_data else []
+    else:
+        # 只识别已结束的语音片段，说到一半的部分留在门控中等下一次处理
+        segments = gate.feed(pcm_data) if pcm_data else []
+        if final:
+            segments += gate.flush()
+        loop = asyncio.get_running_loop()
+        voiced = []
+        for segment in segments:
+            voiced += await loop.run_in_executor(None, refine_segment, segment, decoder.sample_rate)
+        segments = voiced
 
-        command = f"ffmpeg -i {webm_path} -ar 16000 -ac 1 -y {wav_path}"
-        process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        _, stderr = await process.communicate()
+    for segment in segments:
+        await transcribe_segment(client_id, segment, decoder.sample_rate)
 
-        if process.returncode != 0:
-            error_message = f"FFmpeg转换失败: {stderr.decode()}"
-            logger.error(error_message)
-            await manager.send_json(client_id, {"type": "error", "message": "音频格式处理失败"})
-            return
+async def transcribe_segment(client_id: str, pcm_data: bytes, sample_rate: int):
+    """识别一段PCM并把结果发送给前端"""
+    logger.info(f"开始处理客户端 {client_id} 的 {len(pcm_data)} 字节PCM数据。")
 
-        root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
-        client_script_path = os.path.join(root_dir, "client", "funasr_wss_client.py")
-        
-        transcribe_command = ["python", client_script_path, "--host", "127.0.0.1", "--port", "10095", "--mode", "offline", "--audio_in", wav_path]
-        
-        transcribe_process = await asyncio.create_subprocess_exec(*transcribe_command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        transcribe_stdout, _ = await transcribe_process.communicate()
-        output = transcribe_stdout.decode()
-        
-        transcription = ""
-        for line in output.split("\n"):
-            if "pid0_0: demo:" in line:
-                transcription = line.split("pid0_0: demo:")[-1].strip()
-                break
+    try:
+        # 直接发送内存中的PCM数据，不再经过临时文件
+        result = await get_asr_engine().transcribe_pcm(pcm_data, sample_rate, wav_name=client_id)
+        transcription = result.get("text", "").strip()
         
         logger.info(f"客户端 {client_id} 的转写结果: '{transcription}'")
 
@@ -134,9 +152,122 @@ async def process_accumulated_audio(client_id: str):
     except Exception as e:
         logger.error(f"处理累积音频时出错: {e}")
         await manager.send_json(client_id, {"type": "error", "message": "服务器处理音频时出错"})
-    finally:
-        if os.path.exists(webm_path): os.remove(webm_path)
-        if os.path.exists(wav_path): os.remove(wav_path)
+
+# --- 流式识别 ---
+async def start_stream(client_id: str) -> bool:
+    """
+    为客户端建立到FunASR的流式识别连接。
+    offline模式或连接失败时返回False，由调用方退回按时间间隔整段识别。
+    """
+    decoder = client_decoders.get(client_id)
+    if settings.FUNASR_REALTIME_MODE == "offline" or decoder is None:
+        return False
+
+    stream = FunASRRealtimeClient(
+        mode=settings.FUNASR_REALTIME_MODE,
+        sample_rate=decoder.sample_rate,
+        hotwords=get_asr_engine().load_hotwords(),
+        wav_name=client_id
+    )
+    if not await stream.connect():
+        logger.warning(f"客户端 {client_id} 无法建立FunASR流式连接，改为每隔{PROCESSING_INTERVAL_SECONDS}秒整段识别。")
+        return False
+
+    client_streams[client_id] = stream
+    client_stream_tasks[client_id] = [
+        asyncio.create_task(pump_decoded_audio(client_id, decoder, stream)),
+        asyncio.create_task(forward_stream_results(client_id, stream))
+    ]
+    return True
+
+async def pump_decoded_audio(client_id: str, decoder: FFmpegPCMDecoder, stream: FunASRRealtimeClient):
+    """
+    把解码进程输出的PCM持续转发给FunASR。
+    发送队列已满时send_audio会等待，未取走的PCM留在解码进程的缓冲中，不会丢失。
+    """
+    congested = False
+    try:
+        while True:
+            pcm_data = await decoder.read_pcm(wait=STREAM_READ_WAIT_SECONDS)
+            if pcm_data:
+                await stream.send_audio(pcm_data)
+            if stream.backpressure != congested:
+                congested = stream.backpressure
+                if congested:
+                    logger.warning(f"客户端 {client_id} 的FunASR发送队列积压: {stream.get_stats()}")
+                else:
+                    logger.info(f"客户端 {client_id} 的FunASR发送队列已恢复")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"客户端 {client_id} 转发音频到FunASR时出错: {e}")
+        await manager.send_json(client_id, {"type": "error", "message": "服务器处理音频时出错"})
+
+async def forward_stream_results(client_id: str, stream: FunASRRealtimeClient):
+    """
+    将FunASR推送的识别结果转发给前端。
+    中间结果以transcription_partial返回当前句子已识别的内容，
+    整句的最终结果（2pass的离线修正）以transcription_result返回。
+    """
+    partial_text = ""
+    try:
+        async for result in stream.results():
+            if result["is_final"]:
+                partial_text = ""
+                transcription = result["text"].strip()
+                if not transcription:
+                    continue
+                logger.info(f"客户端 {client_id} 的转写结果: '{transcription}'")
+                await manager.send_json(client_id, {
+                    "type": "transcription_result",
+                    "data": {
+                        "text": transcription,
+                        "confidence": 0.95,
+                        "hotwords_detected": [],
+                        "confidence_boost": 1.0,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                })
+            elif result["text"]:
+                partial_text += result["text"]
+                await manager.send_json(client_id, {
+                    "type": "transcription_partial",
+                    "data": {
+                        "text": partial_text,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                })
+    except Exception as e:
+        # 前端已断开时发送会失败，此时只记录日志
+        logger.info(f"客户端 {client_id} 的识别结果转发结束: {e}")
+
+async def finish_stream(client_id: str, flush: bool = True):
+    """
+    结束客户端的流式识别。
+    flush为True时先把解码进程剩余的音频发给FunASR，并等待最终结果转发完成。
+    """
+    stream = client_streams.pop(client_id, None)
+    tasks = client_stream_tasks.pop(client_id, [])
+    if stream is None:
+        return
+    pump_task, forward_task = tasks
+
+    pump_task.cancel()
+    await asyncio.gather(pump_task, return_exceptions=True)
+
+    decoder = client_decoders.get(client_id)
+    if flush and decoder is not None:
+        try:
+            pcm_data = await decoder.close()
+            if pcm_data:
+                await stream.send_audio(pcm_data)
+        except Exception as e:
+            logger.error(f"客户端 {client_id} 发送剩余音频时出错: {e}")
+
+    await stream.stop(timeout=5.0 if flush else 0)
+    _, pending = await asyncio.wait([forward_task], timeout=1.0)
+    for task in pending:
+        task.cancel()
 
 # --- WebSocket端点定义 ---
 @router.websocket("/ws/asr/transcribe/realtime")
@@ -147,7 +278,8 @@ async def websocket_endpoint(
 ):
     """
     处理实时语音转写的WebSocket端点。
-    这个版本会累积音频数据，并按固定时间间隔进行处理。
+    默认把音频流式转发给FunASR（online/2pass），识别结果产生后立即返回；
+    offline模式或流式连接不可用时，累积音频并按固定时间间隔进行处理。
     """
     user = await get_current_user_from_ws_token(token, db)
     if not user:
@@ -156,6 +288,7 @@ async def websocket_endpoint(
 
     client_id = str(uuid.uuid4())
     await manager.connect(websocket, client_id)
+    streaming = await start_stream(client_id)
     
     try:
         await manager.send_json(client_id, {"type": "connection_established", "user_id": user.username})
@@ -165,24 +298,38 @@ async def websocket_endpoint(
             # 1. 接收前端发送的一小块音频数据
             audio_data = await websocket.receive_bytes()
             
-            # 2. 将接收到的数据追加到该客户端的缓冲区
-            if client_id in client_buffers:
-                client_buffers[client_id].extend(audio_data)
+            # 2. 将接收到的数据写入该客户端的解码进程
+            decoder = client_decoders.get(client_id)
+            if decoder is not None:
+                try:
+                    await decoder.feed(audio_data)
+                except RuntimeError as e:
+                    logger.error(f"客户端 {client_id} 音频解码失败: {e}")
+                    await manager.send_json(client_id, {"type": "error", "message": "音频格式处理失败"})
+
+            # 3. 流式识别时解码后的音频由后台任务直接转发，不需要按时间间隔处理
+            if streaming:
+                continue
 
-            # 3. 检查是否达到了处理时间
+            # 4. 检查是否达到了处理时间
             now = datetime.now()
             last_processed = client_last_processed_time.get(client_id, now)
             
             if now - last_processed >= timedelta(seconds=PROCESSING_INTERVAL_SECONDS):
-                # 如果距离上次处理已超过5秒，则立即处理累积的音频
+                # 如果距离上次处理已超过5秒，则立即处理已解码的音频
+                client_last_processed_time[client_id] = now
                 # 使用create_task使其在后台运行，不阻塞接收下一块数据
                 asyncio.create_task(process_accumulated_audio(client_id))
 
     except WebSocketDisconnect:
         # 客户端断开连接时，处理最后剩余的音频数据
         logger.info(f"客户端 {client_id} 正在断开连接，处理剩余音频...")
-        await process_accumulated_audio(client_id)
+        if streaming:
+            await finish_stream(client_id)
+        else:
+            await process_accumulated_audio(client_id, final=True)
         manager.disconnect(client_id)
     except Exception as e:
         logger.error(f"WebSocket连接出现意外错误 ({client_id}): {e}")
+        await finish_stream(client_id, flush=False)
         manager.disconnect(client_id)
\ No newline at end of file
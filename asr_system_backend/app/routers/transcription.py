@@ -1,86 +1,151 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from sqlalchemy.orm import Session
 import os
-import subprocess
+import shutil
+import hashlib
+import asyncio
+import tempfile
 import logging
+from typing import Tuple
+from .. import models, schemas
+from ..asr_engine import get_asr_engine
+from ..config import get_settings
+from ..database import get_db
+from ..services import get_transcription_queue, TASK_UPLOAD_PREFIX
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 router = APIRouter(
     prefix="/api/asr",
     tags=["transcription"]
 )
 
+def _write_chunk(buffer, digest, chunk: bytes):
+    """写入一块上传数据并更新哈希，在线程池中执行"""
+    digest.update(chunk)
+    buffer.write(chunk)
+
+async def save_upload_file(file: UploadFile, workspace: str) -> Tuple[str, str]:
+    """将上传文件分块保存到工作目录，返回保存后的路径和内容的SHA-256
+
+    文件读写和哈希计算都在线程池中进行，大文件上传时不阻塞事件循环。
+    """
+    # 只保留文件名部分，扩展名用于判断音频格式
+    filename = os.path.basename(file.filename or "") or "upload.wav"
+    file_path = os.path.join(workspace, filename)
+    loop = asyncio.get_running_loop()
+
+    # 分块保存上传的文件，不在内存中保留完整内容
+    received = 0
+    digest = hashlib.sha256()
+    buffer = await loop.run_in_executor(None, open, file_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(settings.ASR_STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+            if received > settings.MAX_UPLOAD_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"文件大小超过限制（{settings.ASR_MAX_FILE_SIZE_MB}MB）"
+                )
+            await loop.run_in_executor(None, _write_chunk, buffer, digest, chunk)
+    finally:
+        await loop.run_in_executor(None, buffer.close)
+    logger.info(f"Saved {received} bytes to: {file_path}")
+    return file_path, digest.hexdigest()
+
 @router.post("/transcribe/file")
 async def transcribe_file(file: UploadFile = File(...)):
     """
     上传音频文件并返回转写结果
     """
+    logger.info(f"Processing file: {file.filename}")
+
+    # 每个请求使用独立的临时目录，并发请求之间不会互相覆盖文件
+    with tempfile.TemporaryDirectory(prefix="asr_", dir=settings.TEMP_DIR) as workspace:
+        try:
+            file_path, content_digest = await save_upload_file(file, workspace)
+
+            # 在当前进程中调用ASR引擎进行转写
+            result = await get_asr_engine().transcribe(file_path, content_digest=content_digest)
+            transcription = result.get("text", "").strip()
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing file: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    if transcription:
+        logger.info(f"Found transcription: {transcription}")
+    else:
+        logger.warning("No transcription found in result")
+
+    return {
+        "result": transcription
+    }
+
+@router.post("/tasks")
+async def submit_transcription_task(file: UploadFile = File(...)):
+    """
+    上传音频文件并提交异步转写任务，立即返回任务ID
+    """
+    # 任务文件保存在独立目录中，提交后改名为任务的工作目录，由处理任务的worker负责清理
+    workspace = tempfile.mkdtemp(prefix=TASK_UPLOAD_PREFIX, dir=settings.UPLOAD_DIR)
     try:
-        # 获取项目根目录
-        current_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        root_dir = os.path.dirname(current_dir)  # 回到asr-system目录
-        
-        logger.info(f"Processing file: {file.filename}")
-        
-        # 临时文件路径
-        file_path = os.path.join(root_dir, "client", f"temp_{file.filename}")
-        temp_script = os.path.join(root_dir, "client", "temp_test.sh")
-        
-        # 保存上传的文件
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        logger.info(f"Saved file to: {file_path}")
-        
-        # 修改test_demo.sh中的音频文件路径
-        demo_script = os.path.join(root_dir, "client", "test_demo.sh")
-        with open(demo_script, "r") as f:
-            script_content = f.read()
-        
-        # 替换音频文件路径
-        script_content = script_content.replace("BAC009S0764W0179.wav", f"temp_{file.filename}")
-        
-        # 保存临时脚本
-        with open(temp_script, "w") as f:
-            f.write(script_content)
-        
-        # 设置脚本可执行权限
-        os.chmod(temp_script, 0o755)
-        logger.info("Created and configured temporary script")
-        
-        # 执行脚本
-        os.chdir(root_dir)  # 切换到项目根目录
-        logger.info(f"Executing script from directory: {root_dir}")
-        result = subprocess.run([f"./client/temp_test.sh"], shell=True, capture_output=True, text=True)
-        output = result.stdout + result.stderr
-        logger.info("Script execution completed")
-        
-        # 解析结果
-        transcription = ""
-        for line in output.split("\n"):
-            if "pid0_0: demo:" in line:
-                transcription = line.split("pid0_0: demo:")[-1].strip()
-                logger.info(f"Found transcription: {transcription}")
-                break
-        
-        if not transcription:
-            logger.warning("No transcription found in output")
-            logger.debug(f"Full output: {output}")
-            
-        return {
-            "result": transcription
-        }
-        
+        file_path, content_digest = await save_upload_file(file, workspace)
+        task_id = await get_transcription_queue().submit(file_path, file.filename, content_digest=content_digest)
+    except asyncio.QueueFull:
+        shutil.rmtree(workspace, ignore_errors=True)
+        raise HTTPException(status_code=503, detail="转写任务队列已满，请稍后重试")
+    except HTTPException:
+        shutil.rmtree(workspace, ignore_errors=True)
+        raise
     except Exception as e:
-        logger.error(f"Error processing file: {str(e)}")
+        shutil.rmtree(workspace, ignore_errors=True)
+        logger.error(f"Error submitting task: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-        
-    finally:
-        # 清理临时文件
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        if os.path.exists(temp_script):
-            os.remove(temp_script)
-        logger.info("Cleaned up temporary files") 
\ No newline at end of file
+
+    return {
+        "task_id": task_id,
+        "status": "pending"
+    }
+
+@router.get("/tasks/{task_id}", response_model=schemas.TranscriptionTaskOut)
+def get_transcription_task(task_id: str, db: Session = Depends(get_db)):
+    """
+    查询转写任务状态
+    """
+    task = db.query(models.TranscriptionTask).filter(models.TranscriptionTask.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return task
+
+@router.get("/tasks/{task_id}/result")
+def get_transcription_result(task_id: str, db: Session = Depends(get_db)):
+    """
+    获取转写任务结果，任务未完成时result为空
+    """
+    task = db.query(models.TranscriptionTask).filter(models.TranscriptionTask.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {
+        "task_id": task.id,
+        "status": task.status,
+        "result": task.result_text if task.status == "completed" else None,
+        "error_message": task.error_message
+    }
+
+@router.get("/stats")
+def get_asr_stats():
+    """
+    获取ASR引擎连接池、结果缓存及任务队列的统计信息
+    """
+    stats = get_asr_engine().get_stats()
+    stats["task_queue"] = get_transcription_queue().get_stats()
+    return stats
@@ -1,56 +1,260 @@
 import os
-import subprocess
-from datetime import datetime
+import math
+import shutil
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
 from sqlalchemy.orm import Session
 from . import models
+from .asr_engine import get_asr_engine
 from .config import get_settings
+from .database import SessionLocal
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# 任务文件先上传到 upload_ 开头的临时目录，任务创建后改名为 task_<任务ID>，
+# 启动时据此只清理确已中止的任务和上传的目录
+TASK_UPLOAD_PREFIX = "upload_"
+TASK_WORKSPACE_PREFIX = "task_"
+
+def task_workspace(task_id: str) -> str:
+    """任务工作目录的路径"""
+    return os.path.join(settings.UPLOAD_DIR, f"{TASK_WORKSPACE_PREFIX}{task_id}")
+
+async def run_db(fn, *args):
+    """在线程池中执行同步的数据库操作，不阻塞事件循环"""
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
 class TranscriptionService:
     @staticmethod
-    def process_transcription_task(db: Session, task_id: str, file_path: str, hotword_list_id: str = None):
+    async def process_transcription_task(db: Session, task_id: str, file_path: str, timeout: Optional[float] = None,
+                                         content_digest: Optional[str] = None):
         """处理转写任务"""
+        # 更新任务状态
+        task = await run_db(
+            lambda: db.query(models.TranscriptionTask).filter(models.TranscriptionTask.id == task_id).first()
+        )
+        if not task:
+            return
+
+        task.status = "processing"
+        await run_db(db.commit)
+
         try:
-            # 更新任务状态
-            task = db.query(models.TranscriptionTask).filter(models.TranscriptionTask.id == task_id).first()
-            if not task:
-                return
-            
-            task.status = "processing"
-            db.commit()
-            
-            # 调用本地客户端进行转写
-            client_path = os.path.join(os.path.dirname(__file__), "client", "funasr_wss_client.py")
-            cmd = ["python", client_path, "--host", "localhost", "--port", "10095", "--mode", "offline", "--audio_in", file_path]
-            
-            # 执行命令并捕获输出
-            process = subprocess.run(cmd, capture_output=True, text=True)
-            terminal_output = process.stdout + process.stderr
-            
-            # 更新任务状态和输出
-            task.status = "completed" if process.returncode == 0 else "failed"
-            task.terminal_output = terminal_output
-            task.completed_at = datetime.utcnow()
-            db.commit()
-            
-            # 清理临时文件
-            try:
-                os.remove(file_path)
-            except:
-                pass
-                
+            # 调用ASR引擎进行转写，超时的任务直接标记为失败
+            result = await asyncio.wait_for(
+                get_asr_engine().transcribe(file_path, content_digest=content_digest),
+                timeout=timeout
+            )
+
+            task.status = "completed"
+            task.result_text = result.get("text", "").strip()
+        except asyncio.TimeoutError:
+            task.status = "failed"
+            task.error_message = f"转写超时（{timeout}秒）"
+        except asyncio.CancelledError:
+            task.status = "failed"
+            task.error_message = "服务关闭，任务已中止"
+            raise
         except Exception as e:
             # 更新任务状态为失败
-            task = db.query(models.TranscriptionTask).filter(models.TranscriptionTask.id == task_id).first()
-            if task:
-                task.status = "failed"
-                task.terminal_output = str(e)
-                task.completed_at = datetime.utcnow()
-                db.commit()
-            
-            # 清理临时文件
+            task.status = "failed"
+            task.error_message = str(e)
+        finally:
+            task.completed_at = datetime.utcnow()
+            await run_db(db.commit)
+
+
+class TranscriptionJobQueue:
+    """有界的转写任务队列
+
+    提交任务时只写入数据库并入队，立即返回任务ID；
+    固定数量的后台worker从队列中取出任务执行，每个任务单独计算超时。
+    停止时仍在排队的任务标记为失败并删除工作目录；启动时同样处理已中止的未完成任务。
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 100, timeout: Optional[float] = None):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks = []
+
+    @property
+    def started(self) -> bool:
+        return bool(self._worker_tasks)
+
+    @property
+    def stale_after(self) -> Optional[float]:
+        """任务从创建到结束的最长时间（秒），未设置超时时为None
+
+        排在队尾的任务最多等待前面各轮任务依次超时，再加上自身的超时。
+        """
+        if not self.timeout:
+            return None
+        return self.timeout * (math.ceil(self.max_pending / self.workers) + 1)
+
+    async def start(self):
+        """启动后台worker"""
+        if self.started:
+            return
+        await run_db(self._recover_stale_tasks)
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        logger.info(f"转写任务队列已启动，worker数量: {self.workers}，队列上限: {self.max_pending}")
+
+    async def stop(self):
+        """停止所有worker，正在执行和仍在排队的任务都标记为失败"""
+        for worker in self._worker_tasks:
+            worker.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+        abandoned = []
+        while self._queue is not None and not self._queue.empty():
+            abandoned.append(self._queue.get_nowait())
+            self._queue.task_done()
+        if abandoned:
+            await run_db(self._abandon_tasks, abandoned)
+            logger.info(f"转写任务队列停止，{len(abandoned)} 个排队中的任务已标记为失败")
+
+    @staticmethod
+    def _mark_failed(task_ids, message: str):
+        db = SessionLocal()
+        try:
+            db.query(models.TranscriptionTask).filter(
+                models.TranscriptionTask.id.in_(task_ids)
+            ).update({"status": "failed", "error_message": message, "completed_at": datetime.utcnow()},
+                     synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _abandon_tasks(self, jobs):
+        """把未执行的任务标记为失败并删除其工作目录"""
+        self._mark_failed([task_id for task_id, _, _ in jobs], "服务关闭，任务未执行")
+        for _, file_path, _ in jobs:
+            shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+
+    def _recover_stale_tasks(self):
+        """把已中止的未完成任务标记为失败，并删除这些任务的工作目录
+
+        数据库和上传目录可能由多个worker进程或实例共享，只处理创建时间早于stale_after的任务
+        （仍在排队或执行的任务不会存在这么久），不影响其他进程中的任务。
+        """
+        stale_after = self.stale_after
+        if stale_after is None:
+            logger.info("未设置转写超时，无法判断任务是否已中止，跳过遗留任务的恢复")
+            return
+        cutoff = datetime.now() - timedelta(seconds=stale_after)
+        db = SessionLocal()
+        try:
+            stale_ids = [task_id for task_id, in db.query(models.TranscriptionTask.id).filter(
+                models.TranscriptionTask.status.in_(("pending", "processing")),
+                models.TranscriptionTask.created_at < cutoff
+            )]
+        finally:
+            db.close()
+        if stale_ids:
+            self._mark_failed(stale_ids, "服务重启，任务已中止")
+            for task_id in stale_ids:
+                shutil.rmtree(task_workspace(task_id), ignore_errors=True)
+            logger.warning(f"{len(stale_ids)} 个已中止的转写任务标记为失败")
+
+        # 上传到一半进程就退出时留下的目录
+        if os.path.isdir(settings.UPLOAD_DIR):
+            for name in os.listdir(settings.UPLOAD_DIR):
+                path = os.path.join(settings.UPLOAD_DIR, name)
+                if (name.startswith(TASK_UPLOAD_PREFIX) and os.path.isdir(path)
+                        and datetime.fromtimestamp(os.path.getmtime(path)) < cutoff):
+                    shutil.rmtree(path, ignore_errors=True)
+
+    @classmethod
+    def _create_task(cls, file_path: str, filename: str, user_id: Optional[str]):
+        """写入任务记录，并把上传目录改名为该任务的工作目录，返回 (任务ID, 新的文件路径)"""
+        db = SessionLocal()
+        try:
+            task = models.TranscriptionTask(user_id=user_id, filename=filename, status="pending")
+            db.add(task)
+            db.commit()
+            task_id = task.id
+        finally:
+            db.close()
+        workspace = task_workspace(task_id)
+        try:
+            os.rename(os.path.dirname(file_path), workspace)
+        except OSError:
+            cls._delete_task(task_id)
+            raise
+        return task_id, os.path.join(workspace, os.path.basename(file_path))
+
+    @staticmethod
+    def _delete_task(task_id: str):
+        db = SessionLocal()
+        try:
+            db.query(models.TranscriptionTask).filter(models.TranscriptionTask.id == task_id).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    async def submit(self, file_path: str, filename: str, user_id: Optional[str] = None,
+                     content_digest: Optional[str] = None) -> str:
+        """提交转写任务并返回任务ID；队列已满时抛出 asyncio.QueueFull"""
+        if not self.started:
+            raise RuntimeError("转写任务队列未启动")
+        if self._queue.full():
+            raise asyncio.QueueFull()
+
+        task_id, file_path = await run_db(self._create_task, file_path, filename, user_id)
+        try:
+            # 写入数据库期间其他请求可能已占满队列
+            self._queue.put_nowait((task_id, file_path, content_digest))
+        except asyncio.QueueFull:
+            await run_db(self._delete_task, task_id)
+            shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+            raise
+        logger.info(f"转写任务 {task_id} 已入队，当前排队数: {self._queue.qsize()}")
+        return task_id
+
+    async def _worker(self, worker_id: int):
+        """从队列中取出任务并执行"""
+        while True:
+            task_id, file_path, content_digest = await self._queue.get()
+            db = SessionLocal()
             try:
-                os.remove(file_path)
-            except:
-                pass 
\ No newline at end of file
+                await TranscriptionService.process_transcription_task(
+                    db, task_id, file_path, self.timeout, content_digest
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"worker {worker_id} 处理任务 {task_id} 失败: {str(e)}")
+            finally:
+                db.close()
+                # 清理任务的临时目录
+                shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+                self._queue.task_done()
+
+    def get_stats(self) -> dict:
+        """获取队列状态"""
+        return {
+            "workers": self.workers,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "max_pending": self.max_pending,
+            "timeout": self.timeout
+        }
+
+# 全局转写任务队列实例
+transcription_queue = TranscriptionJobQueue(
+    workers=settings.BACKGROUND_TASK_WORKERS,
+    max_pending=settings.TRANSCRIPTION_QUEUE_MAX_SIZE,
+    timeout=settings.ASR_PROCESSING_TIMEOUT
+)
+
+def get_transcription_queue() -> TranscriptionJobQueue:
+    """获取转写任务队列实例"""
+    return transcription_queue
@@ -0,0 +1,189 @@
+"""
+实时转写的语音活动检测门控
+在调用ASR之前丢弃静音，只把按语音边界切好的有声片段交给识别引擎
+"""
+
+import math
+import logging
+from collections import deque
+from typing import Dict, List, Optional
+import numpy as np
+from .config import get_settings
+from .audio_sharding import run_vad_model
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+BYTES_PER_SAMPLE = 2  # 16-bit PCM
+
+class VADGate:
+    """基于帧能量的流式语音门控（每个会话一个实例）
+
+    PCM按frame_ms分帧，能量超过energy_db的帧视为有声：
+    - 连续有声达到min_speech_ms才开始一个片段，避免敲击等短促噪声触发识别；
+    - 片段开头补上最多pad_ms的前导音频，避免吞掉起始的弱辅音；
+    - 静音持续end_silence_ms后在该处切开，片段末尾只保留pad_ms的静音；
+    - 片段达到max_segment_seconds时强制切开，限制单次识别的延迟。
+    其余静音帧直接丢弃，不发送给ASR。
+    """
+
+    def __init__(self, sample_rate: int = 16000, energy_db: float = -45.0, frame_ms: int = 30,
+                 min_speech_ms: int = 90, end_silence_ms: int = 400, pad_ms: int = 200,
+                 max_segment_seconds: float = 6.0):
+        self.sample_rate = sample_rate
+        self.energy_db = energy_db
+        frame_samples = max(1, int(sample_rate * frame_ms / 1000))
+        self.frame_bytes = frame_samples * BYTES_PER_SAMPLE
+
+        def to_frames(ms: float) -> int:
+            return max(1, int(math.ceil(ms / frame_ms)))
+
+        self.min_speech_frames = to_frames(min_speech_ms)
+        self.end_silence_frames = to_frames(end_silence_ms)
+        self.pad_frames = int(pad_ms // frame_ms)
+        self.max_segment_frames = max(self.min_speech_frames, to_frames(max_segment_seconds * 1000))
+
+        self._pending = bytearray()  # 不足一帧的剩余数据
+        # 未进入语音时保留的最近几帧：前导音频加上正在确认的有声帧
+        self._preroll: deque = deque(maxlen=self.pad_frames + self.min_speech_frames)
+        self._voiced_run = 0  # 未进入语音时连续有声的帧数
+        self._segment: Optional[bytearray] = None  # 当前语音片段，None表示处于静音
+        self._segment_frames = 0
+        self._silent_frames = 0  # 当前片段末尾连续静音的帧数
+
+        self.frames_total = 0
+        self.frames_voiced = 0
+        self.bytes_dropped = 0
+        self.bytes_emitted = 0
+        self.segments = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return self._segment is not None
+
+    def feed(self, pcm: bytes) -> List[bytes]:
+        """写入16-bit单声道PCM，返回本次已结束的语音片段（可能为空）"""
+        self._pending.extend(pcm)
+        usable = len(self._pending) - len(self._pending) % self.frame_bytes
+        if usable == 0:
+            return []
+        data = bytes(self._pending[:usable])
+        del self._pending[:usable]
+
+        samples = np.frombuffer(data, dtype=np.int16).reshape(-1, self.frame_bytes // BYTES_PER_SAMPLE)
+        energies = np.square(samples, dtype=np.float64).mean(axis=1)
+        # 与能量阈值比较时不取对数，直接比较均方值
+        threshold = (10 ** (self.energy_db / 20) * 32768.0) ** 2
+        segments = []
+        for index, voiced in enumerate(energies > threshold):
+            frame = data[index * self.frame_bytes:(index + 1) * self.frame_bytes]
+            segment = self._push_frame(frame, bool(voiced))
+            if segment:
+                segments.append(segment)
+        return segments
+
+    def _push_frame(self, frame: bytes, voiced: bool) -> Optional[bytes]:
+        self.frames_total += 1
+        if voiced:
+            self.frames_voiced += 1
+
+        if self._segment is None:
+            if len(self._preroll) == self._preroll.maxlen:
+                self.bytes_dropped += len(self._preroll[0])
+            self._preroll.append(frame)
+            self._voiced_run = self._voiced_run + 1 if voiced else 0
+            if self._voiced_run >= self.min_speech_frames:
+                self._segment = bytearray(b"".join(self._preroll))
+                self._segment_frames = len(self._preroll)
+                self._silent_frames = 0
+                self._preroll.clear()
+                self._voiced_run = 0
+            return None
+
+        self._segment.extend(frame)
+        self._segment_frames += 1
+        self._silent_frames = 0 if voiced else self._silent_frames + 1
+        if self._silent_frames >= self.end_silence_frames:
+            return self._close_segment()
+        if self._segment_frames >= self.max_segment_frames:
+            # 强制切开后仍处于语音中，后续帧直接进入新片段
+            segment = self._close_segment()
+            self._segment = bytearray()
+            self._segment_frames = 0
+            return segment
+        return None
+
+    def _close_segment(self) -> Optional[bytes]:
+        """结束当前片段，去掉末尾超过pad_ms的静音"""
+        segment, silent = self._segment, self._silent_frames
+        self._segment = None
+        self._segment_frames = 0
+        self._silent_frames = 0
+        trim = max(0, silent - self.pad_frames) * self.frame_bytes
+        if trim:
+            self.bytes_dropped += trim
+            del segment[len(segment) - trim:]
+        if not segment:
+            return None
+        self.segments += 1
+        self.bytes_emitted += len(segment)
+        return bytes(segment)
+
+    def flush(self) -> List[bytes]:
+        """会话结束时取出未结束的语音片段，丢弃剩余的静音"""
+        segment = self._close_segment() if self._segment is not None else None
+        self.bytes_dropped += sum(len(frame) for frame in self._preroll) + len(self._pending)
+        self._preroll.clear()
+        self._pending.clear()
+        self._voiced_run = 0
+        return [segment] if segment else []
+
+    def get_stats(self) -> Dict:
+        """获取门控统计信息"""
+        bytes_per_second = self.sample_rate * BYTES_PER_SAMPLE
+        return {
+            "frames_total": self.frames_total,
+            "frames_voiced": self.frames_voiced,
+            "segments": self.segments,
+            "seconds_emitted": self.bytes_emitted / bytes_per_second,
+            "seconds_dropped": self.bytes_dropped / bytes_per_second
+        }
+
+def refine_segment(pcm: bytes, sample_rate: int) -> List[bytes]:
+    """用项目自带的FSMN VAD模型复核能量门控给出的片段
+
+    只保留模型判定为语音的部分（相邻语音段之间的静音一并去掉），模型认为全是噪声时返回空列表。
+    未启用或模型不可用时原样返回。
+    """
+    if not settings.REALTIME_VAD_USE_MODEL:
+        return [pcm]
+    try:
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        speech_segments = run_vad_model(audio)
+    except Exception as e:
+        logger.warning(f"FSMN VAD复核失败，按能量门控结果识别: {str(e)}")
+        return [pcm]
+    if speech_segments is None:
+        return [pcm]
+
+    pieces = []
+    for beg_ms, end_ms in speech_segments:
+        start = int(beg_ms * sample_rate / 1000) * BYTES_PER_SAMPLE
+        end = min(len(pcm), int(end_ms * sample_rate / 1000) * BYTES_PER_SAMPLE)
+        if end > start:
+            pieces.append(pcm[start:end])
+    return pieces
+
+def create_vad_gate(sample_rate: int = 16000) -> Optional[VADGate]:
+    """根据配置创建语音门控，未启用时返回None"""
+    if not settings.REALTIME_VAD_ENABLED:
+        return None
+    return VADGate(
+        sample_rate=sample_rate,
+        energy_db=settings.REALTIME_VAD_ENERGY_DB,
+        frame_ms=settings.REALTIME_VAD_FRAME_MS,
+        min_speech_ms=settings.REALTIME_VAD_MIN_SPEECH_MS,
+        end_silence_ms=settings.REALTIME_VAD_END_SILENCE_MS,
+        pad_ms=settings.REALTIME_VAD_PAD_MS,
+        max_segment_seconds=settings.REALTIME_VAD_MAX_SEGMENT_SECONDS
+    )
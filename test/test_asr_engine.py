@@ -0,0 +1,290 @@
+import pytest
+import sys
+import os
+import json
+import asyncio
+import wave
+import threading
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import websockets
+from asr_system_backend.app.asr_engine import FunASRConnectionPool, ASREngine, _is_open as websocket_is_open
+
+
+class FakeFunASRServer:
+    """模拟FunASR离线模式的WebSocket服务"""
+
+    def __init__(self):
+        self.connections = 0
+        self.chunk_sizes = []  # 收到的每个二进制消息的大小
+        self.server = None
+        self.port = None
+
+    async def handler(self, websocket):
+        self.connections += 1
+        received = 0
+        async for message in websocket:
+            if isinstance(message, bytes):
+                received += len(message)
+                self.chunk_sizes.append(len(message))
+                continue
+            data = json.loads(message)
+            if data.get("is_speaking") is False:
+                await websocket.send(json.dumps({
+                    "mode": "offline",
+                    "text": f"收到{received}字节",
+                    "wav_name": data.get("wav_name", "demo"),
+                    "is_final": True
+                }))
+                received = 0
+
+    async def __aenter__(self):
+        self.server = await websockets.serve(self.handler, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class TestFunASRConnectionPool:
+    """FunASR连接池测试"""
+
+    def test_connection_reused_across_sessions(self):
+        """测试顺序任务复用同一个连接"""
+        async def run():
+            async with FakeFunASRServer() as server:
+                pool = FunASRConnectionPool(f"ws://127.0.0.1:{server.port}", min_size=1, max_size=2)
+                await pool.start()
+                for _ in range(3):
+                    async with pool.connection() as websocket:
+                        await websocket.send(json.dumps({"mode": "offline", "is_speaking": True}))
+                        await websocket.send(b"\x00" * 32)
+                        await websocket.send(json.dumps({"is_speaking": False}))
+                        result = json.loads(await websocket.recv())
+                        assert result["text"] == "收到32字节"
+                stats = pool.get_stats()
+                await pool.close()
+                return server.connections, stats
+
+        connections, stats = asyncio.run(run())
+        assert connections == 1
+        assert stats["size"] == 1
+        assert stats["idle"] == 1
+
+    def test_max_size_bounds_concurrency(self):
+        """测试并发借用不超过最大连接数"""
+        async def run():
+            async with FakeFunASRServer() as server:
+                pool = FunASRConnectionPool(f"ws://127.0.0.1:{server.port}", min_size=0, max_size=2)
+                peak = 0
+
+                async def borrow():
+                    nonlocal peak
+                    async with pool.connection():
+                        peak = max(peak, pool.get_stats()["size"])
+                        await asyncio.sleep(0.05)
+
+                await asyncio.gather(*(borrow() for _ in range(5)))
+                await pool.close()
+                return server.connections, peak
+
+        connections, peak = asyncio.run(run())
+        assert connections == 2
+        assert peak == 2
+
+    def test_failed_session_discards_connection(self):
+        """测试会话出错的连接不会放回池中"""
+        async def run():
+            async with FakeFunASRServer() as server:
+                pool = FunASRConnectionPool(f"ws://127.0.0.1:{server.port}", min_size=0, max_size=2)
+                with pytest.raises(RuntimeError):
+                    async with pool.connection():
+                        raise RuntimeError("会话失败")
+                stats = pool.get_stats()
+                await pool.close()
+                return stats
+
+        stats = asyncio.run(run())
+        assert stats["size"] == 0
+        assert stats["idle"] == 0
+
+    def test_release_from_another_loop_frees_slot(self):
+        """测试在其他事件循环中归还连接时关闭连接并释放名额，之后仍可借出"""
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        def on_pool_loop(coro):
+            return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout=5)
+
+        try:
+            server = on_pool_loop(FakeFunASRServer().__aenter__())
+            pool = FunASRConnectionPool(f"ws://127.0.0.1:{server.port}", min_size=0, max_size=1)
+            websocket = on_pool_loop(pool.acquire())
+
+            asyncio.run(pool.release(websocket))
+            stats = pool.get_stats()
+            assert stats["size"] == 0
+            assert stats["idle"] == 0
+            assert not websocket_is_open(websocket)
+
+            # 名额已释放，max_size为1时仍能借出新连接
+            other = on_pool_loop(asyncio.wait_for(pool.acquire(), timeout=2))
+            assert other is not websocket
+            on_pool_loop(pool.release(other))
+            on_pool_loop(pool.close())
+            on_pool_loop(server.__aexit__(None, None, None))
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+
+    def test_reconnect_gives_up_after_retries(self):
+        """测试服务不可用时按重试次数放弃"""
+        async def run():
+            pool = FunASRConnectionPool("ws://127.0.0.1:9", min_size=0, max_size=1,
+                                        max_retries=2, backoff_base=0.01, backoff_max=0.02)
+            with pytest.raises(OSError):
+                await pool.acquire()
+            stats = pool.get_stats()
+            await pool.close()
+            return stats
+
+        assert asyncio.run(run())["size"] == 0
+
+
+class TestASREngineAsyncAPI:
+    """ASR引擎异步接口测试"""
+
+    def test_sync_wrapper_rejected_inside_event_loop(self):
+        """测试在事件循环中调用同步接口会直接报错而不是阻塞"""
+        engine = ASREngine()
+
+        async def run():
+            with pytest.raises(RuntimeError):
+                engine.transcribe_audio(__file__)
+
+        asyncio.run(run())
+
+    def test_transcribe_missing_file(self):
+        """测试转写不存在的文件"""
+        engine = ASREngine()
+        with pytest.raises(FileNotFoundError):
+            asyncio.run(engine.transcribe("/nonexistent/audio.wav"))
+
+    def test_long_wav_transcribed_in_parallel_shards(self, monkeypatch, tmp_path):
+        """测试超过阈值的WAV按分片并行转写后按顺序拼接"""
+        from asr_system_backend.app import asr_engine as asr_engine_module
+        monkeypatch.setattr(asr_engine_module.settings, "ASR_LONG_AUDIO_THRESHOLD_SECONDS", 1)
+        monkeypatch.setattr(asr_engine_module.settings, "ASR_SHARD_SECONDS", 1)
+        monkeypatch.setattr(asr_engine_module.settings, "ASR_SHARD_OVERLAP_SECONDS", 0)
+        monkeypatch.setattr(asr_engine_module, "detect_speech_segments", lambda path: None)
+
+        wav_path = str(tmp_path / "long.wav")
+        with wave.open(wav_path, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(16000)
+            wav_file.writeframes(b"\x00\x00" * 16000 * 3)
+
+        async def run():
+            async with FakeFunASRServer() as server:
+                engine = ASREngine()
+                engine.result_cache = None
+                engine.pool = FunASRConnectionPool(f"ws://127.0.0.1:{server.port}", min_size=0, max_size=4)
+                result = await engine.transcribe(wav_path, hotwords="")
+                await engine.shutdown()
+                return result, server.connections
+
+        result, connections = asyncio.run(run())
+        assert result["text"] == "收到32000字节" * 3
+        assert [s["start_time"] for s in result["segments"]] == [0, 1, 2]
+        assert result["duration"] == 3
+        assert connections == 3
+
+    def test_transcribe_pcm_streams_memory_buffer(self):
+        """测试直接转写内存中的PCM数据"""
+        async def run():
+            async with FakeFunASRServer() as server:
+                engine = ASREngine()
+                engine.pool = FunASRConnectionPool(f"ws://127.0.0.1:{server.port}", min_size=0, max_size=1)
+                result = await engine.transcribe_pcm(b"\x00\x00" * 32000, hotwords="")
+                await engine.shutdown()
+                return result
+
+        result = asyncio.run(run())
+        assert result["text"] == "收到64000字节"
+        assert result["duration"] == 2
+
+    @pytest.mark.parametrize("suffix", [".wav", ".pcm"])
+    def test_file_streamed_in_chunk_size_strides(self, monkeypatch, tmp_path, suffix):
+        """测试文件按ASR_STREAM_CHUNK_SIZE的步长分块发送，且读取不在事件循环线程中进行"""
+        from asr_system_backend.app import asr_engine as asr_engine_module
+        monkeypatch.setattr(asr_engine_module.settings, "ASR_STREAM_CHUNK_SIZE", 1000)
+        audio_path = str(tmp_path / f"audio{suffix}")
+        if suffix == ".wav":
+            with wave.open(audio_path, 'wb') as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(16000)
+                wav_file.writeframes(b"\x00\x00" * 1750)
+        else:
+            with open(audio_path, 'wb') as f:
+                f.write(b"\x00" * 3500)
+
+        read_threads = []
+        iter_chunks = ASREngine._iter_audio_chunks
+
+        def recording_iter(path, stride):
+            for chunk in iter_chunks(path, stride):
+                read_threads.append(threading.get_ident())
+                yield chunk
+
+        monkeypatch.setattr(ASREngine, "_iter_audio_chunks", staticmethod(recording_iter))
+
+        async def run():
+            async with FakeFunASRServer() as server:
+                engine = ASREngine()
+                engine.result_cache = None
+                engine.pool = FunASRConnectionPool(f"ws://127.0.0.1:{server.port}", min_size=0, max_size=1)
+                result = await engine.transcribe(audio_path, hotwords="")
+                await engine.shutdown()
+                return result, server.chunk_sizes, threading.get_ident()
+
+        result, chunk_sizes, loop_thread = asyncio.run(run())
+        assert result["text"] == "收到3500字节"
+        assert chunk_sizes == [1000, 1000, 1000, 500]
+        assert read_threads and loop_thread not in read_threads
+
+    def test_failed_send_closes_chunk_generator(self):
+        """测试发送失败时关闭读取音频的生成器，并且关闭不在事件循环线程中进行"""
+        closed_on = []
+
+        def chunks():
+            try:
+                while True:
+                    yield b"\x00" * 10
+            finally:
+                closed_on.append(threading.get_ident())
+
+        class BrokenWebSocket:
+            sent = 0
+
+            async def send(self, message):
+                if isinstance(message, bytes):
+                    self.sent += 1
+                    if self.sent == 2:
+                        raise ConnectionError("连接断开")
+
+        async def run():
+            with pytest.raises(ConnectionError):
+                await ASREngine()._run_offline_session(BrokenWebSocket(), {"mode": "offline"}, chunks())
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(run())
+        assert len(closed_on) == 1
+        assert closed_on[0] != loop_thread
+
@@ -0,0 +1,73 @@
+import pytest
+import sys
+import os
+import stat
+import asyncio
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from asr_system_backend.app.audio_decoder import FFmpegPCMDecoder
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    """模拟ffmpeg：忽略参数，把stdin原样写到stdout"""
+    script = tmp_path / "ffmpeg"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "while True:\n"
+        "    data = sys.stdin.buffer.read1(4096)\n"
+        "    if not data:\n"
+        "        break\n"
+        "    sys.stdout.buffer.write(data)\n"
+        "    sys.stdout.buffer.flush()\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+class TestFFmpegPCMDecoder:
+    """常驻ffmpeg解码进程测试"""
+
+    def test_single_process_for_many_chunks(self, fake_ffmpeg):
+        """测试多个音频块复用同一个进程并增量输出"""
+        async def run():
+            decoder = FFmpegPCMDecoder(ffmpeg_path=fake_ffmpeg)
+            await decoder.start()
+            pid = decoder._process.pid
+            outputs = []
+            for _ in range(3):
+                await decoder.feed(b"\x01\x02" * 100)
+                outputs.append(await decoder.read_pcm(wait=2))
+            assert decoder._process.pid == pid
+            await decoder.close()
+            return outputs
+
+        outputs = asyncio.run(run())
+        assert all(output for output in outputs)
+        assert sum(len(output) for output in outputs) <= 600
+
+    def test_close_flushes_remaining_pcm(self, fake_ffmpeg):
+        """测试关闭时返回剩余的完整采样"""
+        async def run():
+            decoder = FFmpegPCMDecoder(ffmpeg_path=fake_ffmpeg)
+            await decoder.feed(b"\x00" * 1001)
+            remaining = await decoder.close()
+            return remaining, decoder.get_stats()
+
+        remaining, stats = asyncio.run(run())
+        # 奇数的最后一个字节不构成完整采样
+        assert len(remaining) == 1000
+        assert stats["running"] is False
+        assert stats["bytes_in"] == 1001
+
+    def test_missing_ffmpeg_raises(self):
+        """测试找不到ffmpeg时启动失败"""
+        async def run():
+            decoder = FFmpegPCMDecoder(ffmpeg_path="/nonexistent/ffmpeg")
+            with pytest.raises(OSError):
+                await decoder.feed(b"\x00")
+
+        asyncio.run(run())
@@ -0,0 +1,114 @@
+import pytest
+import sys
+import os
+import threading
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from asr_system_backend.app import audio_sharding
+from asr_system_backend.app.audio_sharding import plan_fixed_shards, plan_vad_shards, stitch_shard_results
+
+
+class TestShardPlanning:
+    """长音频分片规划测试"""
+
+    def test_fixed_shards_cover_audio_with_overlap(self):
+        """测试固定窗口分片覆盖完整音频且相邻分片重叠"""
+        shards = plan_fixed_shards(total_frames=16000 * 70, sample_rate=16000, shard_seconds=30, overlap_seconds=1)
+        assert shards[0] == (0, 16000 * 30, 0)
+        assert shards[1] == (16000 * 29, 16000 * 59, 16000)
+        assert shards[-1][1] == 16000 * 70
+        for (_, prev_end, _), (start, _, overlap) in zip(shards, shards[1:]):
+            assert prev_end - start == overlap
+
+    def test_vad_shards_cut_at_silence(self):
+        """测试VAD分片合并相邻语音段并在静音处切开"""
+        segments = [(0, 10000), (12000, 25000), (27000, 40000), (41000, 50000)]
+        shards = plan_vad_shards(16000 * 60, 16000, segments, shard_seconds=30, overlap_seconds=1)
+        assert shards == [(0, 16000 * 25, 0), (16000 * 27, 16000 * 50, 0)]
+
+    def test_long_vad_segment_split_with_overlap(self):
+        """测试超长语音段再按固定窗口切分"""
+        shards = plan_vad_shards(16000 * 100, 16000, [(5000, 75000)], shard_seconds=30, overlap_seconds=1)
+        assert shards[0] == (16000 * 5, 16000 * 35, 0)
+        assert shards[1][2] == 16000
+        assert shards[-1][1] == 16000 * 75
+
+
+class TestShardStitching:
+    """分片结果拼接测试"""
+
+    def test_overlap_text_deduplicated(self):
+        """测试去掉重叠区域重复识别的文字和时间戳"""
+        shards = [(0, 16000 * 30, 0), (16000 * 29, 16000 * 59, 16000)]
+        results = [
+            {"text": "今天天气很好", "timestamp": "[[0,100],[100,200],[200,300],[300,400],[400,500],[500,600]]"},
+            {"text": "很好我们出去玩", "timestamp": [[0, 100], [100, 200], [200, 300], [300, 400],
+                                                  [400, 500], [500, 600], [600, 700]]}
+        ]
+        text, segments, timestamps = stitch_shard_results(shards, results, 16000)
+        assert text == "今天天气很好我们出去玩"
+        assert [s["text"] for s in segments] == ["今天天气很好", "我们出去玩"]
+        assert len(timestamps) == len(text)
+        # 第二个分片的时间戳加上分片起点偏移
+        assert timestamps[6] == [29200, 29300]
+        assert segments[1]["start_time"] == pytest.approx(29.2)
+
+    def test_overlap_ignores_punctuation(self):
+        """测试带标点的结果也能对齐重叠部分，时间戳按token数而不是字符数丢弃"""
+        shards = [(0, 16000 * 30, 0), (16000 * 29, 16000 * 59, 16000)]
+        results = [
+            {"text": "今天天气很好。", "timestamp": [[i * 100, i * 100 + 100] for i in range(6)]},
+            {"text": "很好，我们出去玩。", "timestamp": [[i * 100, i * 100 + 100] for i in range(7)]}
+        ]
+        text, segments, timestamps = stitch_shard_results(shards, results, 16000)
+        assert text == "今天天气很好。我们出去玩。"
+        assert len(timestamps) == 11
+        assert timestamps[6] == [29200, 29300]
+
+    def test_overlap_counts_english_words_as_tokens(self):
+        """测试英文按词对齐，每个词对应一个时间戳"""
+        shards = [(0, 16000 * 30, 0), (16000 * 29, 16000 * 59, 16000)]
+        results = [
+            {"text": "see you Tomorrow.", "timestamp": [[0, 100], [100, 200], [200, 300]]},
+            {"text": "tomorrow, OK", "timestamp": [[0, 300], [300, 400]]}
+        ]
+        text, _, timestamps = stitch_shard_results(shards, results, 16000)
+        assert text == "see you Tomorrow.OK"
+        assert timestamps[-1] == [29300, 29400]
+
+    def test_segments_without_timestamps_use_shard_bounds(self):
+        """测试无时间戳时使用分片边界作为分段时间"""
+        shards = [(0, 16000 * 10, 0), (16000 * 12, 16000 * 20, 0)]
+        text, segments, timestamps = stitch_shard_results(shards, [{"text": "你好"}, {"text": "世界"}], 16000)
+        assert text == "你好世界"
+        assert segments[1]["start_time"] == 12
+        assert segments[1]["end_time"] == 20
+        assert timestamps == []
+
+
+class TestVADModelLock:
+    """共享VAD模型的并发调用测试"""
+
+    def test_calls_are_serialized(self, monkeypatch):
+        """测试多个线程同时调用时模型不会被并发执行"""
+        active = []
+        peak = []
+
+        def fake_model(audio_in):
+            active.append(1)
+            peak.append(len(active))
+            time.sleep(0.01)
+            active.pop()
+            return [[[0, 100]]]
+
+        monkeypatch.setattr(audio_sharding, "get_vad_model", lambda: fake_model)
+        threads = [threading.Thread(target=audio_sharding.detect_speech_segments, args=("a.wav",)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max(peak) == 1
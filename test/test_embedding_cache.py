@@ -0,0 +1,112 @@
+import pytest
+import sys
+import os
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from asr_system_backend.app.embedding_cache import EmbeddingCache
+
+
+class CountingEncoder:
+    """记录调用次数的确定性编码器"""
+
+    def __init__(self, dimension=8):
+        self.dimension = dimension
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text:
+                vectors[row, ord(char) % self.dimension] += 1.0
+        return vectors
+
+    @property
+    def encoded(self):
+        return [text for call in self.calls for text in call]
+
+
+class TestEmbeddingCache:
+    """句向量缓存测试"""
+
+    def test_repeated_texts_are_encoded_once(self):
+        """测试重复的文本只经过一次模型计算"""
+        cache = EmbeddingCache("model-a", 8)
+        encoder = CountingEncoder()
+
+        first = cache.encode(["语音识别", "热词"], encoder)
+        second = cache.encode(["热词", "语音识别", "新词"], encoder)
+
+        assert encoder.encoded == ["语音识别", "热词", "新词"]
+        np.testing.assert_array_equal(second[0], first[1])
+        np.testing.assert_array_equal(second[1], first[0])
+        stats = cache.get_stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 3
+
+    def test_duplicates_in_one_batch_are_deduplicated(self):
+        """测试同一批中的重复文本只计算一次"""
+        cache = EmbeddingCache("model-a", 8)
+        encoder = CountingEncoder()
+
+        vectors = cache.encode(["热词", "热词", "其他"], encoder)
+
+        assert encoder.calls == [["热词", "其他"]]
+        np.testing.assert_array_equal(vectors[0], vectors[1])
+
+    def test_normalized_text_shares_entry(self):
+        """测试全半角和多余空白不影响缓存命中"""
+        cache = EmbeddingCache("model-a", 8)
+        encoder = CountingEncoder()
+
+        cache.encode(["deep learning"], encoder)
+        cache.encode(["  ｄｅｅｐ   learning "], encoder)
+
+        assert encoder.encoded == ["deep learning"]
+
+    def test_model_name_is_part_of_key(self):
+        """测试不同模型的向量互不复用"""
+        assert EmbeddingCache("model-a", 8).make_key("热词") != EmbeddingCache("model-b", 8).make_key("热词")
+
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的条目"""
+        cache = EmbeddingCache("model-a", 8, max_entries=2)
+        encoder = CountingEncoder()
+
+        cache.encode(["a"], encoder)
+        cache.encode(["b"], encoder)
+        cache.encode(["a"], encoder)  # a变为最近使用
+        cache.encode(["c"], encoder)  # 淘汰b
+        cache.encode(["a", "b"], encoder)
+
+        assert encoder.encoded == ["a", "b", "c", "b"]
+        assert cache.get_stats()["entries"] == 2
+
+    def test_disk_tier_survives_new_instance(self, tmp_path):
+        """测试磁盘缓存可被新的实例（如其他worker或重启后的进程）复用"""
+        encoder = CountingEncoder()
+        first = EmbeddingCache("org/model-a", 8, disk_dir=str(tmp_path))
+        vectors = first.encode(["语音识别", "热词"], encoder)
+
+        second = EmbeddingCache("org/model-a", 8, disk_dir=str(tmp_path))
+        reloaded = second.encode(["热词", "语音识别"], encoder)
+
+        assert len(encoder.calls) == 1
+        np.testing.assert_array_equal(reloaded, vectors[::-1])
+        assert second.get_stats()["disk_hits"] == 2
+
+    def test_disk_tier_sees_entries_written_later(self, tmp_path):
+        """测试已打开的实例能读取其他实例之后追加的向量"""
+        encoder = CountingEncoder()
+        reader = EmbeddingCache("model-a", 8, disk_dir=str(tmp_path))
+        writer = EmbeddingCache("model-a", 8, disk_dir=str(tmp_path))
+
+        writer.encode(["第一批"], encoder)
+        reader.encode(["第一批"], encoder)
+        writer.encode(["第二批"], encoder)
+        reader.encode(["第二批"], encoder)
+
+        assert encoder.encoded == ["第一批", "第二批"]
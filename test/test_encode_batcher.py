@@ -0,0 +1,90 @@
+import pytest
+import sys
+import os
+import threading
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from asr_system_backend.app.encode_batcher import MicroBatchEncoder
+
+
+class RecordingEncoder:
+    """记录每次调用的批次，并把文本长度编码为向量"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        if self.fail:
+            raise ValueError("模型异常")
+        return np.array([[len(text), float(text.startswith("q"))] for text in texts], dtype=np.float32)
+
+
+def run_concurrently(encoder, texts_per_thread):
+    """多个线程同时提交，返回每个线程得到的结果"""
+    results = [None] * len(texts_per_thread)
+    barrier = threading.Barrier(len(texts_per_thread))
+
+    def worker(i):
+        barrier.wait()
+        results[i] = encoder.encode(texts_per_thread[i], timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(texts_per_thread))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestMicroBatchEncoder:
+    """查询编码微批处理测试"""
+
+    def test_concurrent_queries_are_coalesced(self):
+        """测试并发查询合并为更少的模型调用，且结果按请求正确分发"""
+        model = RecordingEncoder()
+        encoder = MicroBatchEncoder(model, max_batch_size=64, max_wait_ms=50)
+        queries = [["q" + "x" * i] for i in range(16)]
+
+        results = run_concurrently(encoder, queries)
+        encoder.close()
+
+        assert len(model.batches) < len(queries)
+        for i, result in enumerate(results):
+            assert result.shape == (1, 2)
+            assert result[0, 0] == len(queries[i][0])
+        assert encoder.get_stats()["requests"] == len(queries)
+
+    def test_batch_size_limit(self):
+        """测试单次模型调用的文本数不超过上限"""
+        model = RecordingEncoder()
+        encoder = MicroBatchEncoder(model, max_batch_size=4, max_wait_ms=50)
+
+        results = run_concurrently(encoder, [["q1", "q22"] for _ in range(6)])
+        encoder.close()
+
+        assert all(len(batch) <= 4 for batch in model.batches)
+        assert sum(len(batch) for batch in model.batches) == 12
+        for result in results:
+            np.testing.assert_array_equal(result[:, 0], [2, 3])
+
+    def test_errors_reach_every_caller(self):
+        """测试模型异常会传递给同一批次的所有调用方"""
+        encoder = MicroBatchEncoder(RecordingEncoder(fail=True), max_wait_ms=1)
+
+        with pytest.raises(ValueError):
+            encoder.encode(["q"], timeout=5)
+        encoder.close()
+
+    def test_closed_encoder_rejects_requests(self):
+        """测试关闭后不再接受新的请求"""
+        encoder = MicroBatchEncoder(RecordingEncoder(), max_wait_ms=1)
+        encoder.encode(["q"], timeout=5)
+        encoder.close()
+
+        with pytest.raises(RuntimeError):
+            encoder.encode(["q"])
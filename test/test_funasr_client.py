@@ -0,0 +1,113 @@
+import pytest
+import sys
+import os
+import json
+import asyncio
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import websockets
+from asr_system_backend.app.realtime_asr.funasr_client import FunASRRealtimeClient
+
+
+class FakeStreamingServer:
+    """模拟FunASR 2pass模式：每收到一块音频推送一条中间结果，结束时推送整句结果"""
+
+    def __init__(self):
+        self.config = None
+        self.chunks = 0
+        self.server = None
+        self.port = None
+
+    async def handler(self, websocket):
+        async for message in websocket:
+            if isinstance(message, bytes):
+                self.chunks += 1
+                await websocket.send(json.dumps({"mode": "2pass-online", "text": "字", "is_final": False}))
+                continue
+            data = json.loads(message)
+            if self.config is None:
+                self.config = data
+            elif data.get("is_speaking") is False:
+                await websocket.send(json.dumps({
+                    "mode": "2pass-offline", "text": "字" * self.chunks + "。", "is_final": True
+                }))
+
+    async def __aenter__(self):
+        self.server = await websockets.serve(self.handler, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class TestFunASRRealtimeClient:
+    """FunASR流式识别客户端测试"""
+
+    def test_partial_and_final_results(self):
+        """测试中间结果和整句结果按到达顺序产出"""
+        async def run():
+            async with FakeStreamingServer() as server:
+                client = FunASRRealtimeClient("127.0.0.1", server.port, mode="2pass", use_ssl=False)
+                assert await client.connect()
+                results = []
+
+                async def consume():
+                    async for result in client.results():
+                        results.append(result)
+
+                consumer = asyncio.create_task(consume())
+                for _ in range(3):
+                    await client.send_audio(b"\x00" * client.stride)
+                await client.stop(timeout=2)
+                await asyncio.wait_for(consumer, timeout=2)
+                return server.config, results
+
+        config, results = asyncio.run(run())
+        assert config["mode"] == "2pass"
+        assert config["wav_format"] == "pcm"
+        assert [r["is_final"] for r in results] == [False, False, False, True]
+        assert results[-1]["text"] == "字字字。"
+        assert results[-1]["session_end"] is True
+
+    def test_send_without_connection(self):
+        """测试未连接时发送音频"""
+        client = FunASRRealtimeClient("127.0.0.1", 1, use_ssl=False)
+        with pytest.raises(ConnectionError):
+            asyncio.run(client.send_audio(b"\x00"))
+
+    def test_send_does_not_wait_for_results(self):
+        """测试服务端不回复时发送也不会阻塞"""
+        async def run():
+            async with FakeStreamingServer() as server:
+                client = FunASRRealtimeClient("127.0.0.1", server.port, mode="online", use_ssl=False)
+                assert await client.connect()
+                # 发送远多于队列容量的数据，只要服务端在读取就不会卡住
+                for _ in range(client.max_pending_chunks * 3):
+                    await asyncio.wait_for(client.send_audio(b"\x00" * 320), timeout=2)
+                await client.stop(timeout=2)
+                return client.get_stats()
+
+        stats = asyncio.run(run())
+        assert stats["bytes_sent"] == 320 * stats["max_pending_chunks"] * 3
+        assert stats["pending_chunks"] == 0
+
+    def test_bounded_queue_signals_backpressure(self):
+        """测试发送队列写满后拒绝新的数据"""
+        async def run():
+            async with FakeStreamingServer() as server:
+                client = FunASRRealtimeClient("127.0.0.1", server.port, use_ssl=False, max_pending_chunks=4)
+                assert await client.connect()
+                # 发送任务尚未运行，数据全部留在队列中
+                accepted = [client.try_send_audio(b"\x00" * 320) for _ in range(6)]
+                backpressure = client.backpressure
+                await client.stop(timeout=2)
+                return accepted, backpressure, client.chunks_dropped
+
+        accepted, backpressure, dropped = asyncio.run(run())
+        assert accepted == [True] * 4 + [False] * 2
+        assert backpressure is True
+        assert dropped == 2
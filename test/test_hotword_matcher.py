@@ -0,0 +1,78 @@
+import pytest
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from asr_system_backend.app.hotword_matcher import HotwordMatcher, PrefixIndex
+
+
+def matched_words(matcher, text):
+    return sorted((start, matcher.words[pattern]) for start, _, pattern in matcher.find_all(text))
+
+
+class TestHotwordMatcher:
+    """Aho-Corasick热词匹配器测试"""
+
+    def test_finds_overlapping_patterns(self):
+        """测试所有相互重叠的匹配都能找到"""
+        matcher = HotwordMatcher(["学习", "机器学习", "习惯", "惯性"], [1, 1, 1, 1])
+        assert matched_words(matcher, "机器学习惯性") == [(0, "机器学习"), (2, "学习"), (3, "习惯"), (4, "惯性")]
+
+    def test_latin_hotwords_need_word_boundaries(self):
+        """测试英文热词不会匹配到单词内部，不修改也不计入检测结果"""
+        matcher = HotwordMatcher(["AI", "Go"], [5, 5])
+        assert matcher.match("we said it is good") == ("we said it is good", [])
+        assert matcher.find_all("said good") == []
+
+        text, matches = matcher.match("ai helps, let's go")
+        assert text == "AI helps, let's Go"
+        assert [(start, end) for start, end, _ in matches] == [(0, 2), (16, 18)]
+
+    def test_latin_hotwords_next_to_cjk_and_punctuation(self):
+        """测试英文热词紧挨中文或标点时仍能匹配，数字也按词边界处理"""
+        matcher = HotwordMatcher(["AI", "5G"], [5, 5])
+        assert matcher.match("用ai做5g网络")[0] == "用AI做5G网络"
+        assert matcher.match("(ai)")[0] == "(AI)"
+        assert matcher.match("15g或ai_x")[1] == []
+
+    def test_case_insensitive_and_fixes_casing(self):
+        """测试不区分大小写匹配，并修正为热词原文的写法"""
+        matcher = HotwordMatcher(["PyTorch", "FunASR"], [5, 8])
+        text, matches = matcher.match("用pytorch和FUNASR部署，再试一次Pytorch")
+        assert text == "用PyTorch和FunASR部署，再试一次PyTorch"
+        assert [matcher.words[pattern] for _, _, pattern in matches] == ["PyTorch", "FunASR", "PyTorch"]
+
+    def test_prefers_leftmost_longest_match(self):
+        """测试重叠时选择最靠左、最长的热词，替换不会互相破坏"""
+        matcher = HotwordMatcher(["机器学习", "学习", "深度学习平台"], [5, 3, 7])
+        _, matches = matcher.match("机器学习和深度学习平台")
+        assert [matcher.words[pattern] for _, _, pattern in matches] == ["机器学习", "深度学习平台"]
+
+    def test_case_variants_keep_highest_weight(self):
+        """测试只有大小写不同的热词合并为一个，保留权重较高的写法"""
+        matcher = HotwordMatcher(["ai", "AI", ""], [2, 9, 10])
+        assert len(matcher) == 1
+        assert matcher.match("ai模型")[0] == "AI模型"
+
+    def test_no_match_returns_text_unchanged(self):
+        """测试没有热词出现时原样返回"""
+        matcher = HotwordMatcher(["语音识别"], [5])
+        assert matcher.match("今天天气不错") == ("今天天气不错", [])
+
+
+class TestPrefixIndex:
+    """热词前缀索引测试"""
+
+    def test_lookup_is_case_insensitive_and_ordered(self):
+        """测试前缀查询不区分大小写，按字典序返回"""
+        index = PrefixIndex(["TensorFlow", "tensor", "Transformer", "语音识别", "语音合成"])
+        assert index.lookup("tens", 5) == ["tensor", "TensorFlow"]
+        assert index.lookup("语音", 5) == ["语音合成", "语音识别"]
+        assert index.lookup("xyz", 5) == []
+
+    def test_lookup_respects_limit(self):
+        """测试结果数量不超过上限"""
+        index = PrefixIndex([f"word{i:03d}" for i in range(500)])
+        assert index.lookup("word", 3) == ["word000", "word001", "word002"]
@@ -0,0 +1,77 @@
+import pytest
+import sys
+import os
+import time
+import threading
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from asr_system_backend.app.index_persister import IndexPersister
+
+
+class RecordingSaver:
+    def __init__(self, delay=0.0):
+        self.saved = []
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, user_id):
+        time.sleep(self.delay)
+        with self.lock:
+            self.saved.append(user_id)
+        return True
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestIndexPersister:
+    """索引延迟写入测试"""
+
+    def test_marks_within_interval_are_coalesced(self):
+        """测试同一用户在时间窗口内的多次变化只写入一次"""
+        saver = RecordingSaver()
+        persister = IndexPersister(saver, interval=0.1)
+        for _ in range(20):
+            persister.mark_dirty("alice")
+        persister.mark_dirty("bob")
+
+        assert wait_until(lambda: len(saver.saved) == 2)
+        time.sleep(0.2)
+        assert sorted(saver.saved) == ["alice", "bob"]
+        assert persister.get_stats()["marks"] == 21
+        persister.stop()
+
+    def test_mark_returns_without_waiting_for_disk(self):
+        """测试标记不等待写入完成"""
+        saver = RecordingSaver(delay=0.3)
+        persister = IndexPersister(saver, interval=0.01)
+        started = time.monotonic()
+        persister.mark_dirty("alice")
+        assert time.monotonic() - started < 0.1
+        persister.stop()
+        assert saver.saved == ["alice"]
+
+    def test_stop_flushes_pending_users(self):
+        """测试停止时立即写入尚未到期的变化"""
+        saver = RecordingSaver()
+        persister = IndexPersister(saver, interval=60)
+        persister.mark_dirty("alice")
+        persister.mark_dirty("bob")
+        persister.discard("bob")
+
+        persister.stop()
+        assert saver.saved == ["alice"]
+        assert persister.get_stats()["pending_users"] == 0
+
+    def test_zero_interval_saves_synchronously(self):
+        """测试间隔为0时在调用线程中立即写入"""
+        saver = RecordingSaver()
+        persister = IndexPersister(saver, interval=0)
+        persister.mark_dirty("alice")
+        assert saver.saved == ["alice"]
@@ -0,0 +1,118 @@
+import pytest
+import sys
+import os
+import asyncio
+import threading
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from asr_system_backend.app.realtime_asr.inference_scheduler import BatchInferenceScheduler
+
+
+class RecordingModel:
+    """记录每次调用的批次大小，并把窗口长度作为转写文本"""
+
+    def __init__(self, fail=False):
+        self.batch_sizes = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def __call__(self, windows):
+        with self.lock:
+            self.batch_sizes.append(len(windows))
+        if self.fail:
+            raise ValueError("模型异常")
+        return [f"len={len(window)}" for window in windows]
+
+
+async def transcribe_sessions(scheduler, lengths):
+    """模拟多个会话同时提交不同长度的窗口"""
+    return await asyncio.gather(*[
+        scheduler.transcribe(np.zeros(length, dtype=np.float32), session_id=f"s{i}")
+        for i, length in enumerate(lengths)
+    ])
+
+
+class TestBatchInferenceScheduler:
+    """批量推理调度器测试"""
+
+    def test_merges_sessions_and_routes_results(self):
+        """测试并发会话的窗口合并为一次推理，结果按会话返回"""
+        model = RecordingModel()
+        scheduler = BatchInferenceScheduler(model, max_batch_size=8, max_wait_ms=200)
+        try:
+            lengths = [100, 200, 300, 400, 500]
+            results = asyncio.run(transcribe_sessions(scheduler, lengths))
+        finally:
+            scheduler.close()
+
+        assert results == [f"len={length}" for length in lengths]
+        assert model.batch_sizes == [5]
+        assert scheduler.get_stats()["max_batch_seen"] == 5
+
+    def test_respects_max_batch_size(self):
+        """测试单批窗口数不超过上限"""
+        model = RecordingModel()
+        scheduler = BatchInferenceScheduler(model, max_batch_size=2, max_wait_ms=200)
+        try:
+            results = asyncio.run(transcribe_sessions(scheduler, [1, 2, 3, 4, 5]))
+        finally:
+            scheduler.close()
+
+        assert results == [f"len={length}" for length in [1, 2, 3, 4, 5]]
+        assert max(model.batch_sizes) <= 2
+        assert sum(model.batch_sizes) == 5
+
+    def test_failure_propagates_to_every_session(self):
+        """测试推理失败时同批的会话都收到异常"""
+        scheduler = BatchInferenceScheduler(RecordingModel(fail=True), max_batch_size=4, max_wait_ms=100)
+        try:
+            futures = [scheduler.submit(np.zeros(10)) for _ in range(3)]
+            for future in futures:
+                with pytest.raises(ValueError):
+                    future.result(timeout=5)
+        finally:
+            scheduler.close()
+
+        assert scheduler.get_stats()["failures"] >= 1
+
+    def test_submit_after_close_raises(self):
+        """测试关闭后不能再提交"""
+        scheduler = BatchInferenceScheduler(RecordingModel())
+        scheduler.close()
+        with pytest.raises(RuntimeError):
+            scheduler.submit(np.zeros(10))
+
+    def test_executor_limits_batches_in_flight(self):
+        """测试批次在指定线程池中执行，且同时执行的批次数不超过上限"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        active = []
+        peak = []
+        lock = threading.Lock()
+        thread_names = set()
+
+        def slow_model(windows):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+                thread_names.add(threading.current_thread().name)
+            threading.Event().wait(0.05)
+            with lock:
+                active.pop()
+            return ["ok"] * len(windows)
+
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="test-inference")
+        scheduler = BatchInferenceScheduler(slow_model, max_batch_size=1, max_wait_ms=0,
+                                            executor=executor, max_in_flight=2)
+        try:
+            results = asyncio.run(transcribe_sessions(scheduler, [1] * 6))
+        finally:
+            scheduler.close()
+            executor.shutdown()
+
+        assert results == ["ok"] * 6
+        assert max(peak) <= 2
+        assert all(name.startswith("test-inference") for name in thread_names)
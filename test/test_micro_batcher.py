@@ -0,0 +1,58 @@
+import pytest
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from asr_system_backend.app.micro_batcher import MicroBatcher
+
+
+class SumBatcher(MicroBatcher):
+    """把每个请求的数字列表求和，批量大小按数字个数计算"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = []
+
+    def _size(self, payload):
+        return len(payload)
+
+    def _execute(self, payloads):
+        self.calls.append([list(payload) for payload in payloads])
+        return [sum(payload) for payload in payloads]
+
+
+class TestMicroBatcher:
+    """通用微批处理器测试"""
+
+    def test_oversized_request_starts_next_batch(self):
+        """测试放不下的请求留到下一批，不会丢失"""
+        batcher = SumBatcher(max_batch_size=4, max_wait_ms=200)
+        futures = [batcher.submit_payload(payload) for payload in ([1, 2], [3], [4, 5], [6])]
+
+        assert [future.result(timeout=5) for future in futures] == [3, 3, 9, 6]
+        batcher.close()
+        assert all(sum(len(payload) for payload in call) <= 4 for call in batcher.calls)
+        stats = batcher.get_stats()
+        assert stats["requests"] == 4
+        assert stats["avg_batch_size"] == 6 / stats["batches"]
+
+    def test_cancelled_requests_are_skipped(self):
+        """测试调用方已取消的请求不参与计算"""
+        batcher = SumBatcher(max_batch_size=8, max_wait_ms=100)
+        cancelled = batcher.submit_payload([100])
+        assert cancelled.cancel()
+        kept = batcher.submit_payload([1])
+
+        assert kept.result(timeout=5) == 1
+        batcher.close()
+        assert [[1]] in batcher.calls and all([100] not in call for call in batcher.calls)
+
+    def test_closed_batcher_rejects_requests(self):
+        """测试关闭后拒绝新的请求"""
+        batcher = SumBatcher(max_batch_size=2, max_wait_ms=0)
+        assert batcher.submit_payload([1]).result(timeout=5) == 1
+        batcher.close()
+        with pytest.raises(RuntimeError):
+            batcher.submit_payload([1])
@@ -0,0 +1,70 @@
+import pytest
+import sys
+import os
+import threading
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from asr_system_backend.app.realtime_asr import model_registry
+from asr_system_backend.app.realtime_asr.model_registry import WhisperModelRegistry, torch_threads_per_worker
+
+
+class TestWhisperModelRegistry:
+    """Whisper模型注册表测试"""
+
+    def test_concurrent_get_loads_once(self, monkeypatch):
+        """测试多个会话同时获取模型时只加载一次，且得到同一个实例"""
+        loads = []
+
+        class FakeModel:
+            def eval(self):
+                return self
+
+        def fake_from_pretrained(name):
+            loads.append(name)
+            return FakeModel()
+
+        monkeypatch.setattr(model_registry.WhisperProcessor, "from_pretrained", staticmethod(lambda name: object()))
+        monkeypatch.setattr(model_registry.WhisperForConditionalGeneration, "from_pretrained",
+                            staticmethod(fake_from_pretrained))
+        monkeypatch.setattr(model_registry.torch.cuda, "is_available", lambda: False)
+
+        registry = WhisperModelRegistry()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get("whisper-test"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert loads == ["whisper-test"]
+        assert len({id(result[1]) for result in results}) == 1
+        assert registry.loaded_models() == ["whisper-test"]
+
+    def test_onnx_falls_back_to_int8(self, monkeypatch):
+        """测试未安装ONNX Runtime时onnx后端退回int8动态量化"""
+        quantized = []
+
+        class FakeModel:
+            def eval(self):
+                return self
+
+        monkeypatch.setattr(model_registry, "ORTModelForSpeechSeq2Seq", None)
+        monkeypatch.setattr(model_registry.WhisperProcessor, "from_pretrained", staticmethod(lambda name: object()))
+        monkeypatch.setattr(model_registry.WhisperForConditionalGeneration, "from_pretrained",
+                            staticmethod(lambda name: FakeModel()))
+        monkeypatch.setattr(model_registry, "quantize_int8", lambda model: quantized.append(model) or model)
+
+        registry = WhisperModelRegistry()
+        _, model = registry.get("whisper-test", backend="onnx")
+
+        assert quantized == [model]
+        assert registry.backend_of("whisper-test", "onnx") == "int8"
+
+    def test_torch_threads_per_worker(self, monkeypatch):
+        """测试CPU核数按推理线程数平均分配"""
+        monkeypatch.setattr(model_registry.os, "cpu_count", lambda: 8)
+        assert torch_threads_per_worker(2) == 4
+        assert torch_threads_per_worker(16) == 1
+        assert torch_threads_per_worker(2, configured=3) == 3
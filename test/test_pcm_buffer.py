@@ -0,0 +1,73 @@
+import pytest
+import sys
+import os
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from asr_system_backend.app.realtime_asr.pcm_buffer import PCMRingBuffer
+
+
+class TestPCMRingBuffer:
+    """PCM环形缓冲区测试"""
+
+    def test_view_returns_latest_samples_across_wraparound(self):
+        """测试写入回绕后视图仍是连续的最近样本，且不复制数据"""
+        buffer = PCMRingBuffer(8)
+        buffer.write(np.arange(5))
+        buffer.write(np.arange(5, 11))
+
+        assert len(buffer) == 8
+        np.testing.assert_array_equal(buffer.view(), np.arange(3, 11))
+        np.testing.assert_array_equal(buffer.view(3), [8, 9, 10])
+        assert np.shares_memory(buffer.view(), buffer._storage)
+        assert buffer.dropped == 3
+
+    def test_consume_keeps_overlap(self):
+        """测试处理后保留重叠部分，之后写入的样本接在其后"""
+        buffer = PCMRingBuffer(10)
+        buffer.write(np.arange(6))
+        window = buffer.view()
+        buffer.write([100, 101])  # 转写期间到达的音频
+        buffer.consume(len(window), keep=2)
+
+        np.testing.assert_array_equal(buffer.view(), [4, 5, 100, 101])
+
+    def test_oversized_write_keeps_tail(self):
+        """测试一次写入超过容量时只保留最后的样本"""
+        buffer = PCMRingBuffer(4)
+        buffer.write(np.arange(10, dtype=np.float64))
+
+        np.testing.assert_array_equal(buffer.view(), [6, 7, 8, 9])
+        assert buffer.view().dtype == np.float32
+        assert buffer.dropped == 6
+
+    def test_view_is_read_only_and_clear_resets(self):
+        """测试视图只读，清空后长度为0"""
+        buffer = PCMRingBuffer(4)
+        buffer.write([1, 2])
+        with pytest.raises(ValueError):
+            buffer.view()[0] = 5
+        buffer.clear()
+        assert len(buffer) == 0 and len(buffer.view()) == 0
+
+    def test_peek_and_consume_cover_every_sample_once(self):
+        """测试缓冲区超过一个窗口时，按窗口取最早样本再丢弃，每个样本只处理一次（重叠部分除外）"""
+        buffer = PCMRingBuffer(60)
+        window_size, overlap = 30, 5
+        processed = []
+        written = 0
+        for chunk in (17, 17, 17, 17, 17):
+            buffer.write(np.arange(written, written + chunk))
+            written += chunk
+            while len(buffer) >= window_size:
+                window = buffer.peek(window_size)
+                assert np.shares_memory(window, buffer._storage)
+                processed.append(window.copy())
+                buffer.consume(len(window), keep=overlap)
+
+        assert [int(window[0]) for window in processed] == [0, 25, 50]
+        for window in processed:
+            np.testing.assert_array_equal(window, np.arange(window[0], window[0] + window_size))
+        np.testing.assert_array_equal(buffer.peek(), np.arange(75, 85))
@@ -0,0 +1,545 @@
+import pytest
+import sys
+import os
+import zlib
+import uuid
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+import numpy as np
+
+# 添加项目根目录到Python路径（models.py 通过 app.database 导入，需同时加入后端目录）
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'asr_system_backend'))
+
+from asr_system_backend.app import rag_service as rag_module
+from asr_system_backend.app.rag_service import RAGService
+
+
+class FakeEncoder:
+    """按字符哈希到固定维度的确定性编码器，包含相同字符的文本相似度更高"""
+
+    def __init__(self, dimension=32):
+        self.dimension = dimension
+        self.encoded = []
+
+    def encode(self, texts, normalize_embeddings=True):
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text:
+                vectors[row, zlib.crc32(char.encode('utf-8')) % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def make_hotwords(*words):
+    return [SimpleNamespace(id=f"id-{word}", word=word, weight=5) for word in words]
+
+
+class FakeQuery:
+    """只支持 query(...).filter(...).all() 的数据库会话替身"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def query(self, model):
+        return self
+
+    def filter(self, *conditions):
+        return self
+
+    def all(self):
+        return list(self.rows)
+
+
+@pytest.fixture
+def service(tmp_path):
+    rag = RAGService()
+    rag.index_dir = str(tmp_path)
+    rag.model = FakeEncoder()
+    rag.dimension = rag.model.dimension
+    rag.initialized = True
+    return rag
+
+
+class TestPerUserIndexes:
+    """按用户隔离的热词索引测试"""
+
+    def test_results_come_from_own_index(self, service):
+        """测试查询只返回当前用户自己的热词"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习", "深度学习"))
+        service.set_user_hotwords("bob", make_hotwords("区块链", "智能合约"))
+
+        alice = [p['word'] for p in service.predict_hotwords("区块链", "alice", top_k=5, threshold=0.0)]
+        bob = [p['word'] for p in service.predict_hotwords("区块链", "bob", top_k=5, threshold=0.0)]
+        assert set(alice) <= {"机器学习", "深度学习"}
+        assert bob[0] == "区块链"
+
+    def test_rebuild_does_not_touch_other_users(self, service):
+        """测试重建一个用户的索引不会重建其他用户的索引"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习"))
+        service.set_user_hotwords("bob", make_hotwords("区块链"))
+        bob_index = service.get_user_index("bob")
+        service.model.encoded.clear()
+
+        service.set_user_hotwords("alice", make_hotwords("机器学习", "强化学习"))
+        assert service.get_user_index("bob") is bob_index
+        assert service.model.encoded == ["机器学习", "强化学习"]
+        assert service.get_user_index("alice").ntotal == 2
+
+    def test_save_and_load_user_index(self, service):
+        """测试用户索引保存后可以直接加载"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习", "深度学习"))
+        assert service.save_user_index("alice")
+        service._drop_user("alice")
+
+        assert service.load_user_index("alice")
+        assert service.get_user_index("alice").ntotal == 2
+        assert service.predict_hotwords("深度学习", "alice", threshold=0.9)[0]['word'] == "深度学习"
+
+    def test_empty_hotwords_remove_index(self, service):
+        """测试用户没有热词时移除其索引"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习"))
+        service.set_user_hotwords("alice", [])
+        assert service.get_user_index("alice") is None
+        assert service.predict_hotwords("机器学习", "alice") == []
+
+
+class TestIncrementalUpdates:
+    """热词向量增量更新测试"""
+
+    def test_add_encodes_only_new_words(self, service):
+        """测试新增热词只编码新词"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习", "深度学习"))
+        service.model.encoded.clear()
+
+        service.add_hotwords("alice", make_hotwords("强化学习"))
+        assert service.model.encoded == ["强化学习"]
+        assert service.get_user_index("alice").ntotal == 3
+        assert service.predict_hotwords("强化学习", "alice", threshold=0.9)[0]['word'] == "强化学习"
+
+    def test_remove_keeps_ids_consistent(self, service):
+        """测试删除热词后其余热词的ID与元数据仍然对应"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习", "区块链", "智能合约"))
+        assert service.remove_hotwords("alice", ["id-机器学习", "id-不存在"]) == 1
+
+        assert service.get_user_index("alice").ntotal == 2
+        assert sorted(service.hotword_metadata["alice"]['words']) == ["区块链", "智能合约"]
+        assert service.predict_hotwords("区块链", "alice", threshold=0.9)[0]['word'] == "区块链"
+        assert service.predict_hotwords("机器学习", "alice", threshold=0.9) == []
+
+    def test_update_weight_without_reencoding(self, service):
+        """测试只修改权重时不重新编码，修改词本身时替换向量"""
+        hotword = SimpleNamespace(id=str(uuid.uuid4()), word="机器学习", weight=5)
+        service.set_user_hotwords("alice", [hotword])
+        service.model.encoded.clear()
+
+        hotword.weight = 9
+        assert service.update_hotword("alice", hotword) is False
+        assert service.model.encoded == []
+        assert service.hotword_metadata["alice"]['weights'] == [9]
+
+        hotword.word = "区块链"
+        assert service.update_hotword("alice", hotword) is True
+        assert service.model.encoded == ["区块链"]
+        assert service.get_user_index("alice").ntotal == 1
+        assert service.predict_hotwords("区块链", "alice", threshold=0.9)[0]['weight'] == 9
+
+    def test_incremental_index_survives_reload(self, service):
+        """测试增量更新后保存的索引可以重新加载"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习", "深度学习"))
+        service.add_hotwords("alice", make_hotwords("强化学习"))
+        service.remove_hotwords("alice", ["id-机器学习"])
+        assert service.save_user_index("alice")
+        service._drop_user("alice")
+
+        assert service.load_user_index("alice")
+        assert service.remove_hotwords("alice", ["id-深度学习"]) == 1
+        assert service.hotword_metadata["alice"]['words'] == ["强化学习"]
+
+
+class TestPersistenceFormat:
+    """内存映射索引与二进制元数据测试"""
+
+    def test_loaded_index_is_mmapped_until_modified(self, service):
+        """测试加载后的索引映射文件，修改时才复制到内存"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习", "深度学习"))
+        service.save_user_index("alice")
+        service._drop_user("alice")
+
+        assert service.load_user_index("alice")
+        assert service.get_user_index_stats("alice")["mmapped"]
+        service.add_hotwords("alice", make_hotwords("强化学习"))
+        assert not service.get_user_index_stats("alice")["mmapped"]
+        assert service.predict_hotwords("强化学习", "alice", threshold=0.9)[0]['word'] == "强化学习"
+
+    def test_metadata_round_trip(self, tmp_path):
+        """测试元数据按列保存后原样读回"""
+        from asr_system_backend.app import index_store
+        path = str(tmp_path / "user.meta")
+        metadata = {'words': ["语音识别", "ASR", ""], 'weights': [5, 10, 1], 'ids': ["a", "b", "c"]}
+        index_store.write_metadata(path, metadata, [11, 22, 33], {44}, 32)
+
+        loaded = index_store.read_metadata(path)
+        assert loaded['words'] == metadata['words']
+        assert loaded['weights'] == metadata['weights']
+        assert loaded['ids'] == metadata['ids']
+        assert loaded['labels'].tolist() == [11, 22, 33]
+        assert loaded['deleted_labels'].tolist() == [44]
+        assert loaded['dimension'] == 32
+
+    def test_invalid_metadata_forces_rebuild(self, service):
+        """测试元数据文件损坏时加载失败，由调用方重建"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习"))
+        service.save_user_index("alice")
+        _, metadata_file = service._index_paths("alice")
+        with open(metadata_file, 'wb') as f:
+            f.write(b"{}")
+
+        service._drop_user("alice")
+        assert not service.load_user_index("alice")
+
+    def test_save_does_not_disturb_mapped_readers(self, service):
+        """测试覆盖保存时，已映射旧文件的实例仍可正常查询"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习", "深度学习"))
+        service.save_user_index("alice")
+        reader = RAGService()
+        reader.index_dir, reader.model, reader.dimension, reader.initialized = (
+            service.index_dir, FakeEncoder(), service.dimension, True)
+        assert reader.load_user_index("alice")
+
+        service.set_user_hotwords("alice", make_hotwords(*[f"词{i}" for i in range(50)]))
+        service.save_user_index("alice")
+
+        assert reader.predict_hotwords("深度学习", "alice", threshold=0.9)[0]['word'] == "深度学习"
+
+
+class SlowModel(FakeEncoder):
+    """模拟加载较慢的SentenceTransformer，记录创建次数"""
+
+    created = 0
+
+    def __init__(self, name):
+        super().__init__()
+        type(self).created += 1
+        time.sleep(0.2)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+
+class TestWarmupAndLazyLoading:
+    """启动预热和按用户延迟加载测试"""
+
+    def test_background_warmup_loads_model_once(self, monkeypatch, tmp_path):
+        """测试后台预热期间的并发初始化只加载一次模型，预热时执行一次编码"""
+        monkeypatch.setattr(rag_module, "SentenceTransformer", SlowModel)
+        SlowModel.created = 0
+        rag = RAGService()
+        rag.index_dir = str(tmp_path)
+        assert rag.get_readiness()["status"] == "not_started"
+
+        thread = rag.start_warmup(background=True)
+        time.sleep(0.05)
+        assert rag.get_readiness()["status"] == "loading"
+        rag.initialize()  # 请求线程等待预热完成
+        thread.join()
+
+        readiness = rag.get_readiness()
+        assert readiness["ready"] and readiness["status"] == "ready"
+        assert SlowModel.created == 1
+        assert rag.model.encoded == ["预热"]
+        rag.shutdown()
+
+    def test_failed_warmup_is_reported(self, monkeypatch, tmp_path):
+        """测试模型加载失败时就绪状态为failed"""
+        def broken(name):
+            raise OSError("模型不存在")
+        monkeypatch.setattr(rag_module, "SentenceTransformer", broken)
+        rag = RAGService()
+        rag.start_warmup(background=False)
+
+        readiness = rag.get_readiness()
+        assert readiness["status"] == "failed" and "模型不存在" in readiness["error"]
+        rag.shutdown()
+
+    def test_touch_user_loads_once_in_background(self, service, monkeypatch):
+        """测试同一用户的并发访问只触发一次后台加载"""
+        calls = []
+
+        def fake_load(user_id):
+            calls.append(user_id)
+            time.sleep(0.1)
+            service.set_user_hotwords(user_id, make_hotwords("机器学习"))
+            with service._lock:
+                service._loading.pop(user_id, None)
+            return True
+
+        monkeypatch.setattr(service, "_load_user", fake_load)
+        futures = [service.touch_user("alice") for _ in range(5)]
+        assert service.get_readiness()["loading_users"] == 1
+        assert all(future.result(timeout=5) for future in futures)
+        assert calls == ["alice"]
+        assert service.touch_user("alice").done()
+
+    def test_ensure_user_index_does_not_block_event_loop(self, service):
+        """测试在事件循环中等待加载时其他协程仍可运行"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习"))
+        service.save_user_index("alice")
+        service._drop_user("alice")
+        ticks = []
+
+        async def ticker():
+            for _ in range(3):
+                ticks.append(1)
+                await asyncio.sleep(0)
+
+        async def main():
+            loaded, _ = await asyncio.gather(service.ensure_user_index("alice"), ticker())
+            return loaded
+
+        # 没有Hotword模型时从数据库构建会失败，但文件中的索引已加载
+        asyncio.run(main())
+        assert ticks == [1, 1, 1]
+        assert service.get_user_index("alice") is not None
+
+
+class RandomEncoder(FakeEncoder):
+    """以文本哈希为种子生成随机单位向量，不同文本的向量近似正交"""
+
+    def encode(self, texts, normalize_embeddings=True):
+        self.encoded.extend(texts)
+        vectors = np.stack([
+            np.random.default_rng(zlib.crc32(text.encode('utf-8'))).standard_normal(self.dimension)
+            for text in texts
+        ]).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def ann_service(service, monkeypatch):
+    from asr_system_backend.app.config import get_settings
+    settings = get_settings()
+    monkeypatch.setattr(settings, "RAG_ANN_MIN_VECTORS", 50)
+    service.model = RandomEncoder()
+    return service, settings
+
+
+class TestAnnIndexModes:
+    """近似索引类型与重建策略测试"""
+
+    @pytest.mark.parametrize("index_type", ["hnsw", "ivf_flat", "ivf_pq"])
+    def test_exact_word_is_top_result(self, ann_service, monkeypatch, index_type):
+        """测试各索引类型都能找回查询词本身"""
+        service, settings = ann_service
+        monkeypatch.setattr(settings, "RAG_INDEX_TYPE", index_type)
+        words = [f"term-{i}" for i in range(400)]
+        service.set_user_hotwords("alice", make_hotwords(*words))
+
+        assert service.get_user_index_stats("alice")["index_type"] == index_type
+        top = service.predict_hotwords("term-123", "alice", top_k=3, threshold=0.0)
+        assert top[0]['word'] == "term-123"
+        assert service.measure_recall("alice", sample_size=20, top_k=5) > 0.5
+        assert service.search_stats.get_stats()["searches"] >= 1
+
+    def test_small_vocabulary_stays_flat_until_threshold(self, ann_service, monkeypatch):
+        """测试热词数达到阈值后自动切换为近似索引"""
+        service, settings = ann_service
+        monkeypatch.setattr(settings, "RAG_INDEX_TYPE", "hnsw")
+        service.set_user_hotwords("alice", make_hotwords(*[f"w{i}" for i in range(10)]))
+        assert service.get_user_index_stats("alice")["index_type"] == "flat"
+
+        service.add_hotwords("alice", make_hotwords(*[f"w{i}" for i in range(10, 60)]))
+        assert service.get_user_index_stats("alice")["index_type"] == "hnsw"
+
+    def test_hnsw_deletes_are_masked_then_compacted(self, ann_service, monkeypatch):
+        """测试HNSW删除的向量不会出现在结果中，标记过多时重建"""
+        service, settings = ann_service
+        monkeypatch.setattr(settings, "RAG_INDEX_TYPE", "hnsw")
+        words = [f"w{i}" for i in range(100)]
+        service.set_user_hotwords("alice", make_hotwords(*words))
+
+        service.remove_hotwords("alice", ["id-w7"])
+        stats = service.get_user_index_stats("alice")
+        assert stats["deleted_vectors"] == 1 and stats["live_vectors"] == 99
+        assert "w7" not in [p['word'] for p in service.predict_hotwords("w7", "alice", top_k=5, threshold=0.0)]
+
+        # 重新加入已删除的ID时整体重建
+        service.add_hotwords("alice", make_hotwords("w7"))
+        assert service.get_user_index_stats("alice")["deleted_vectors"] == 0
+        assert service.predict_hotwords("w7", "alice", top_k=1, threshold=0.0)[0]['word'] == "w7"
+
+        service.remove_hotwords("alice", [f"id-w{i}" for i in range(30)])
+        stats = service.get_user_index_stats("alice")
+        assert stats["deleted_vectors"] == 0 and stats["vectors"] == 70
+
+    def test_masked_deletes_survive_reload(self, ann_service, monkeypatch):
+        """测试标记删除的向量在保存和加载后仍被过滤"""
+        service, settings = ann_service
+        monkeypatch.setattr(settings, "RAG_INDEX_TYPE", "hnsw")
+        service.set_user_hotwords("alice", make_hotwords(*[f"w{i}" for i in range(100)]))
+        service.remove_hotwords("alice", ["id-w3"])
+        service.save_user_index("alice")
+
+        service._drop_user("alice")
+        assert service.load_user_index("alice")
+        assert service.get_user_index_stats("alice")["deleted_vectors"] == 1
+        assert "w3" not in [p['word'] for p in service.predict_hotwords("w3", "alice", top_k=5, threshold=0.0)]
+
+
+class TestHotwordDetection:
+    """转写增强中的热词检测测试"""
+
+    def test_detects_all_hotwords_and_fixes_casing(self, service):
+        """测试检测文本中出现的全部热词（不限于向量检索的结果）并修正大小写"""
+        service.set_user_hotwords("alice", [
+            SimpleNamespace(id="1", word="PyTorch", weight=10),
+            SimpleNamespace(id="2", word="语音识别", weight=5),
+            SimpleNamespace(id="3", word="区块链", weight=5),
+        ])
+
+        result = service.enhance_transcription_with_hotwords("用pytorch做语音识别，pytorch很好用", "alice")
+
+        assert result['enhanced_text'] == "用PyTorch做语音识别，PyTorch很好用"
+        detected = {hw['word']: hw for hw in result['hotwords_detected']}
+        assert set(detected) == {"PyTorch", "语音识别"}
+        assert detected["PyTorch"]['occurrences'] == 2
+        assert result['confidence_boost'] == pytest.approx(1.0 + 0.1 + 0.05)
+
+    def test_matcher_follows_hotword_changes(self, service):
+        """测试热词增删后匹配器随之更新"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习"))
+        assert service.enhance_transcription_with_hotwords("深度学习", "alice")['hotwords_detected'] == []
+
+        service.add_hotwords("alice", make_hotwords("深度学习"))
+        assert [hw['word'] for hw in service.enhance_transcription_with_hotwords("深度学习", "alice")['hotwords_detected']] == ["深度学习"]
+
+        service.remove_hotwords("alice", ["id-深度学习"])
+        assert service.enhance_transcription_with_hotwords("深度学习", "alice")['hotwords_detected'] == []
+
+
+class TestAsyncEnhancement:
+    """事件循环中的热词增强测试"""
+
+    def test_enhancement_does_not_block_event_loop(self, service):
+        """测试查询编码较慢时事件循环中的其他协程仍可运行"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习"))
+        encode = service.model.encode
+
+        def slow_encode(texts, normalize_embeddings=True):
+            time.sleep(0.2)
+            return encode(texts, normalize_embeddings)
+
+        service.model.encode = slow_encode
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def main():
+            result, _ = await asyncio.gather(
+                service.enhance_transcription_async("我在学机器学习", "alice"), ticker())
+            return result
+
+        result = asyncio.run(main())
+        assert result['hotwords_detected'][0]['word'] == "机器学习"
+        assert ticks[-1] - ticks[0] < 0.15
+
+
+class TestSuggestions:
+    """热词建议测试"""
+
+    def test_prefix_matches_skip_semantic_search(self, service):
+        """测试前缀匹配足够时不再进行向量检索"""
+        service.set_user_hotwords("alice", make_hotwords("语音识别", "语音合成", "机器学习"))
+        encoded_before = len(service.model.encoded)
+
+        assert service.get_hotword_suggestions("语音", "alice", max_suggestions=2) == ["语音合成", "语音识别"]
+        assert len(service.model.encoded) == encoded_before
+
+    def test_semantic_search_fills_remaining_slots(self, service):
+        """测试前缀匹配不足时用语义相似的热词补充，且随热词变化更新"""
+        service.set_user_hotwords("alice", make_hotwords("语音识别", "机器学习"))
+        suggestions = service.get_hotword_suggestions("语音", "alice", max_suggestions=3)
+        assert suggestions[0] == "语音识别"
+
+        service.add_hotwords("alice", make_hotwords("语音合成"))
+        assert service.get_hotword_suggestions("语音", "alice", max_suggestions=2) == ["语音合成", "语音识别"]
+
+
+class TestBackgroundPersistence:
+    """索引后台写入测试"""
+
+    def test_sync_defers_write_until_flush(self, service, monkeypatch):
+        """测试热词同步不在请求线程中写文件，关闭服务时写入"""
+        monkeypatch.setattr(service.persister, "interval", 60)
+        service.set_user_hotwords("alice", make_hotwords("机器学习"))
+        assert service.sync_user_hotwords(None, "alice", added=make_hotwords("深度学习"))
+        index_file, metadata_file = service._index_paths("alice")
+        assert not os.path.exists(metadata_file)
+
+        service.shutdown()
+        assert os.path.exists(index_file) and os.path.exists(metadata_file)
+        service._drop_user("alice")
+        assert service.load_user_index("alice")
+        assert set(service.hotword_metadata["alice"]['words']) == {"机器学习", "深度学习"}
+
+
+class TestUserLocks:
+    """按用户加锁与锁外重建测试"""
+
+    def test_other_users_are_not_blocked(self, service):
+        """测试一个用户的锁被占用时其他用户仍可查询"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习"))
+        service.set_user_hotwords("bob", make_hotwords("区块链"))
+        result = []
+
+        with service._user_lock("alice"):
+            thread = threading.Thread(
+                target=lambda: result.append(service.predict_hotwords("区块链", "bob", threshold=0.9)))
+            thread.start()
+            thread.join(timeout=5)
+        assert result and result[0][0]['word'] == "区块链"
+
+    def test_rebuild_encodes_outside_lock(self, service):
+        """测试重建编码期间同一用户仍可查询和更新，更新的热词在替换时一并纳入"""
+        service.set_user_hotwords("alice", make_hotwords("机器学习", "深度学习"))
+        encoding = threading.Event()
+        release = threading.Event()
+        encode = service.model.encode
+
+        def slow_encode(texts, normalize_embeddings=True):
+            if len(texts) > 1 and not release.is_set():
+                encoding.set()
+                release.wait(timeout=5)
+            return encode(texts, normalize_embeddings)
+
+        service.model.encode = slow_encode
+        thread = threading.Thread(target=service._rebuild_user_index, args=("alice", "测试"))
+        thread.start()
+        assert encoding.wait(timeout=5)
+
+        assert service.predict_hotwords("机器学习", "alice", threshold=0.9)[0]['word'] == "机器学习"
+        service.add_hotwords("alice", make_hotwords("强化学习"))
+        release.set()
+        thread.join(timeout=5)
+
+        assert sorted(service.hotword_metadata["alice"]['words']) == ["强化学习", "机器学习", "深度学习"]
+        assert service.get_user_index("alice").ntotal == 3
+        assert service.predict_hotwords("强化学习", "alice", threshold=0.9)[0]['word'] == "强化学习"
+
+    def test_recreated_hotword_triggers_rebuild(self, service, monkeypatch):
+        """测试删除后重新创建的同名热词（ID不同）会替换索引中的旧ID"""
+        monkeypatch.setattr(rag_module, "models", SimpleNamespace(Hotword=SimpleNamespace(user_id=None)))
+        service.set_user_hotwords("alice", [SimpleNamespace(id="old-id", word="机器学习", weight=5)])
+        recreated = SimpleNamespace(id="new-id", word="机器学习", weight=5)
+
+        assert service.build_user_hotword_index(FakeQuery([recreated]), "alice")
+        assert service.hotword_metadata["alice"]['ids'] == ["new-id"]
+        assert service._hotword_label("new-id") in service._label_rows["alice"]
+        assert service.remove_hotwords("alice", ["new-id"]) == 1
+
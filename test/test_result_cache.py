@@ -0,0 +1,135 @@
+import pytest
+import sys
+import os
+import time
+import asyncio
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from asr_system_backend.app.result_cache import TranscriptionResultCache
+
+
+def make_result(text):
+    return {"text": text, "segments": [{"segment_id": 0, "text": text}]}
+
+
+class TestTranscriptionResultCache:
+    """转写结果缓存测试"""
+
+    def test_key_depends_on_decode_params(self):
+        """测试缓存键包含解码参数"""
+        key = TranscriptionResultCache.make_key("abc", "offline", True, "")
+        assert key == TranscriptionResultCache.make_key("abc", "offline", True, "")
+        assert key != TranscriptionResultCache.make_key("abc", "offline", False, "")
+        assert key != TranscriptionResultCache.make_key("abc", "offline", True, '{"热词": 10}')
+        assert key != TranscriptionResultCache.make_key("abd", "offline", True, "")
+
+    def test_hit_and_miss_counters(self):
+        """测试命中和未命中计数"""
+        cache = TranscriptionResultCache()
+        assert cache.get("k1") is None
+        cache.put("k1", make_result("你好"))
+        assert cache.get("k1")["text"] == "你好"
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_lru_eviction_by_entries(self):
+        """测试按条目数进行LRU淘汰"""
+        cache = TranscriptionResultCache(max_entries=2)
+        cache.put("a", make_result("a"))
+        cache.put("b", make_result("b"))
+        cache.get("a")
+        cache.put("c", make_result("c"))
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_byte_cap(self):
+        """测试总字节数上限"""
+        cache = TranscriptionResultCache(max_bytes=200)
+        for i in range(10):
+            cache.put(f"k{i}", make_result("文本" * 5))
+        stats = cache.get_stats()
+        assert stats["bytes"] <= 200
+        assert stats["entries"] < 10
+
+    def test_ttl_expiry(self):
+        """测试过期条目不会命中"""
+        cache = TranscriptionResultCache(ttl=0.05)
+        cache.put("k", make_result("x"))
+        time.sleep(0.1)
+        assert cache.get("k") is None
+        assert cache.get_stats()["entries"] == 0
+
+    def test_disk_tier_survives_memory_clear(self, tmp_path):
+        """测试磁盘层在内存层清空后仍能命中"""
+        cache = TranscriptionResultCache(disk_dir=str(tmp_path))
+        cache.put("k", make_result("磁盘"))
+        cache.clear()
+
+        assert cache.get("k")["text"] == "磁盘"
+        assert cache.get_stats()["disk_hits"] == 1
+
+    def test_disk_tier_evicts_least_recently_used(self, tmp_path):
+        """测试磁盘层超过字节上限时删除最久未用的文件"""
+        cache = TranscriptionResultCache(disk_dir=str(tmp_path), disk_max_bytes=10 ** 6)
+        cache.put("a", make_result("a"))
+        cache.put("b", make_result("b"))
+        cache.disk_max_bytes = cache.get_stats()["disk_bytes"] + 10
+        cache.clear()
+        assert cache.get("a") is not None  # 命中后a变为最近使用
+        cache.put("c", make_result("c"))
+
+        stats = cache.get_stats()
+        assert stats["disk_evictions"] == 1
+        assert stats["disk_bytes"] <= cache.disk_max_bytes
+        assert not os.path.exists(cache._disk_path("b"))
+        assert os.path.exists(cache._disk_path("a"))
+        assert os.path.exists(cache._disk_path("c"))
+
+    def test_disk_cap_applied_on_startup(self, tmp_path):
+        """测试重启后按已有文件重建索引并执行容量限制"""
+        cache = TranscriptionResultCache(disk_dir=str(tmp_path))
+        for index, key in enumerate(["a", "b", "c"]):
+            cache.put(key, make_result(key))
+            os.utime(cache._disk_path(key), (1000 + index, 1000 + index))
+        size = sum(os.path.getsize(cache._disk_path(key)) for key in ["b", "c"])
+
+        reopened = TranscriptionResultCache(disk_dir=str(tmp_path), disk_max_bytes=size)
+        assert reopened.get_stats()["disk_entries"] == 2
+        assert not os.path.exists(cache._disk_path("a"))
+        assert reopened.get("c")["text"] == "c"
+
+    def test_async_access_uses_disk_tier(self, tmp_path):
+        """测试协程接口读写磁盘层"""
+        cache = TranscriptionResultCache(disk_dir=str(tmp_path))
+
+        async def scenario():
+            await cache.aput("k", make_result("异步"))
+            cache.clear()
+            first = await cache.aget("k")
+            second = await cache.aget("k")
+            missing = await cache.aget("none")
+            return first, second, missing
+
+        first, second, missing = asyncio.run(scenario())
+        assert first["text"] == second["text"] == "异步"
+        assert missing is None
+        stats = cache.get_stats()
+        assert stats["disk_hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_hash_file(self, tmp_path):
+        """测试文件内容哈希与内容相关"""
+        a = tmp_path / "a.wav"
+        b = tmp_path / "b.wav"
+        a.write_bytes(b"\x00" * 100)
+        b.write_bytes(b"\x00" * 100)
+        assert TranscriptionResultCache.hash_file(str(a), chunk_size=7) == TranscriptionResultCache.hash_file(str(b))
+        b.write_bytes(b"\x01" * 100)
+        assert TranscriptionResultCache.hash_file(str(a)) != TranscriptionResultCache.hash_file(str(b))
@@ -0,0 +1,284 @@
+import pytest
+import sys
+import os
+import time
+import asyncio
+import tempfile
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径（models.py 通过 app.database 导入，需同时加入后端目录）
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'asr_system_backend'))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from asr_system_backend.app import models, services
+from asr_system_backend.app.database import get_db
+from asr_system_backend.app.routers import transcription as transcription_router
+from asr_system_backend.app.services import TranscriptionJobQueue
+
+
+class FakeEngine:
+    """模拟ASR引擎：返回文件内容作为转写文本，可以人为阻塞"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.release = None
+
+    async def transcribe(self, file_path, content_digest=None):
+        if self.release is not None:
+            await self.release.wait()
+        await asyncio.sleep(self.delay)
+        with open(file_path, encoding="utf-8") as f:
+            return {"text": f.read()}
+
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+    """内存数据库、临时上传目录和模拟ASR引擎"""
+    # 与线上一样使用文件数据库，请求线程与worker各自持有连接
+    engine = create_engine(f"sqlite:///{tmp_path / 'tasks.db'}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(services, "SessionLocal", session_factory)
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    monkeypatch.setattr(services.settings, "UPLOAD_DIR", str(upload_dir))
+    monkeypatch.setattr(transcription_router.settings, "UPLOAD_DIR", str(upload_dir))
+    fake_engine = FakeEngine()
+    monkeypatch.setattr(services, "get_asr_engine", lambda: fake_engine)
+    return session_factory, fake_engine, upload_dir
+
+
+def make_client(monkeypatch, env, queue):
+    """只挂载转写路由的测试应用，启动和关闭时启停队列"""
+    session_factory = env[0]
+    app = FastAPI()
+    app.include_router(transcription_router.router)
+    app.router.on_startup.append(queue.start)
+    app.router.on_shutdown.append(queue.stop)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    monkeypatch.setattr(transcription_router, "get_transcription_queue", lambda: queue)
+    return TestClient(app)
+
+
+def wait_for_status(client, task_id, statuses, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = client.get(f"/api/asr/tasks/{task_id}/result").json()
+        if body["status"] in statuses:
+            return body
+        time.sleep(0.02)
+    raise AssertionError(f"任务 {task_id} 未在 {timeout} 秒内进入 {statuses}")
+
+
+class TestTranscriptionJobQueue:
+    """转写任务队列及任务接口测试"""
+
+    def test_submit_and_fetch_result(self, monkeypatch, env):
+        """测试提交任务后可以查询状态和结果，工作目录在完成后删除"""
+        queue = TranscriptionJobQueue(workers=1, max_pending=4, timeout=5)
+        with make_client(monkeypatch, env, queue) as client:
+            response = client.post("/api/asr/tasks", files={"file": ("a.wav", "你好世界".encode("utf-8"))})
+            assert response.status_code == 200
+            task_id = response.json()["task_id"]
+
+            body = wait_for_status(client, task_id, ("completed", "failed"))
+            assert body == {"task_id": task_id, "status": "completed", "result": "你好世界", "error_message": None}
+            status = client.get(f"/api/asr/tasks/{task_id}").json()
+            assert status["status"] == "completed"
+            assert client.get("/api/asr/tasks/missing").status_code == 404
+            assert client.get("/api/asr/tasks/missing/result").status_code == 404
+
+        assert os.listdir(env[2]) == []
+
+    def test_queue_full_returns_503(self, monkeypatch, env):
+        """测试队列已满时返回503且不遗留工作目录"""
+        env[1].release = asyncio.Event()  # worker取出第一个任务后一直等待
+        queue = TranscriptionJobQueue(workers=1, max_pending=1, timeout=5)
+        with make_client(monkeypatch, env, queue) as client:
+            statuses = []
+            for _ in range(4):
+                response = client.post("/api/asr/tasks", files={"file": ("a.wav", b"x")})
+                statuses.append(response.status_code)
+            assert 503 in statuses
+            assert statuses[:2] == [200, 200]
+            # 被拒绝的请求不应留下工作目录：一个在执行，一个在排队
+            assert len(os.listdir(env[2])) == 2
+
+    def test_job_timeout_marks_failed(self, monkeypatch, env):
+        """测试超时的任务标记为失败"""
+        env[1].delay = 1.0
+        queue = TranscriptionJobQueue(workers=1, max_pending=4, timeout=0.05)
+        with make_client(monkeypatch, env, queue) as client:
+            task_id = client.post("/api/asr/tasks", files={"file": ("a.wav", b"x")}).json()["task_id"]
+            body = wait_for_status(client, task_id, ("completed", "failed"))
+            assert body["status"] == "failed"
+            assert "超时" in body["error_message"]
+            assert body["result"] is None
+
+    def test_stop_fails_queued_tasks_and_cleans_workspaces(self, monkeypatch, env):
+        """测试停止队列时排队中的任务标记为失败并删除工作目录"""
+        session_factory, fake_engine, upload_dir = env
+        fake_engine.release = asyncio.Event()
+        queue = TranscriptionJobQueue(workers=1, max_pending=4, timeout=5)
+        with make_client(monkeypatch, env, queue) as client:
+            task_ids = [
+                client.post("/api/asr/tasks", files={"file": ("a.wav", b"x")}).json()["task_id"]
+                for _ in range(3)
+            ]
+
+        db = session_factory()
+        try:
+            tasks = db.query(models.TranscriptionTask).filter(models.TranscriptionTask.id.in_(task_ids)).all()
+            assert {task.status for task in tasks} == {"failed"}
+        finally:
+            db.close()
+        assert os.listdir(upload_dir) == []
+
+    def test_start_recovers_tasks_left_by_previous_process(self, env):
+        """测试启动时只把已中止的未完成任务标记为失败，并只删除这些任务的工作目录"""
+        session_factory, _, upload_dir = env
+        queue = TranscriptionJobQueue(workers=1, max_pending=4, timeout=5)
+        long_ago = datetime.now() - timedelta(seconds=queue.stale_after + 60)
+        db = session_factory()
+        try:
+            stale = models.TranscriptionTask(filename="a.wav", status="pending", created_at=long_ago)
+            done = models.TranscriptionTask(filename="b.wav", status="completed", result_text="好",
+                                            created_at=long_ago)
+            # 其他进程刚提交、仍在排队或执行的任务
+            live = models.TranscriptionTask(filename="c.wav", status="processing")
+            db.add_all([stale, done, live])
+            db.commit()
+            stale_id, done_id, live_id = stale.id, done.id, live.id
+        finally:
+            db.close()
+        for task_id in (stale_id, live_id):
+            os.makedirs(services.task_workspace(task_id))
+        old_upload = tempfile.mkdtemp(prefix=services.TASK_UPLOAD_PREFIX, dir=str(upload_dir))
+        os.utime(old_upload, (long_ago.timestamp(), long_ago.timestamp()))
+        new_upload = tempfile.mkdtemp(prefix=services.TASK_UPLOAD_PREFIX, dir=str(upload_dir))
+
+        async def run():
+            await queue.start()
+            await queue.stop()
+
+        asyncio.run(run())
+
+        db = session_factory()
+        try:
+            assert db.get(models.TranscriptionTask, stale_id).status == "failed"
+            assert db.get(models.TranscriptionTask, done_id).status == "completed"
+            assert db.get(models.TranscriptionTask, live_id).status == "processing"
+        finally:
+            db.close()
+        assert not os.path.exists(services.task_workspace(stale_id))
+        assert os.path.exists(services.task_workspace(live_id))
+        assert not os.path.exists(old_upload)
+        assert os.path.exists(new_upload)
+
+    def test_submitted_task_uses_workspace_named_after_task(self, monkeypatch, env):
+        """测试提交后上传目录改名为任务的工作目录"""
+        env[1].release = asyncio.Event()
+        queue = TranscriptionJobQueue(workers=1, max_pending=4, timeout=5)
+        with make_client(monkeypatch, env, queue) as client:
+            task_id = client.post("/api/asr/tasks", files={"file": ("a.wav", b"x")}).json()["task_id"]
+            assert os.listdir(env[2]) == [f"{services.TASK_WORKSPACE_PREFIX}{task_id}"]
+
+
+class RecordingEngine:
+    """记录转写时文件所在的工作目录，可以人为失败"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    async def transcribe(self, file_path, content_digest=None):
+        with open(file_path, "rb") as f:
+            data = f.read()
+        self.calls.append((os.path.dirname(file_path), content_digest, data))
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise RuntimeError("识别失败")
+        return {"text": data.decode("utf-8")}
+
+
+@pytest.fixture
+def upload_env(monkeypatch, env, tmp_path):
+    """临时目录和记录工作目录的ASR引擎"""
+    temp_dir = tmp_path / "temp"
+    temp_dir.mkdir()
+    monkeypatch.setattr(transcription_router.settings, "TEMP_DIR", str(temp_dir))
+    engine = RecordingEngine()
+    monkeypatch.setattr(transcription_router, "get_asr_engine", lambda: engine)
+    return engine, temp_dir
+
+
+class TestUploadHandling:
+    """上传文件落盘、大小限制和工作目录清理测试"""
+
+    def test_oversized_upload_returns_413(self, monkeypatch, env, upload_env):
+        """测试超过MAX_UPLOAD_SIZE时返回413，且不遗留文件"""
+        engine, temp_dir = upload_env
+        monkeypatch.setattr(transcription_router.settings, "MAX_UPLOAD_SIZE", 100)
+        monkeypatch.setattr(transcription_router.settings, "ASR_STREAM_CHUNK_SIZE", 16)
+        queue = TranscriptionJobQueue(workers=1, max_pending=4, timeout=5)
+        with make_client(monkeypatch, env, queue) as client:
+            assert client.post("/api/asr/transcribe/file", files={"file": ("a.wav", b"x" * 101)}).status_code == 413
+            assert client.post("/api/asr/tasks", files={"file": ("a.wav", b"x" * 101)}).status_code == 413
+            assert client.post("/api/asr/transcribe/file", files={"file": ("a.wav", b"x" * 100)}).status_code == 200
+
+        assert len(engine.calls) == 1
+        assert os.listdir(temp_dir) == []
+        assert os.listdir(env[2]) == []
+
+    def test_each_request_uses_own_workspace(self, monkeypatch, env, upload_env):
+        """测试并发请求各自使用独立的临时目录，完成后删除"""
+        engine, temp_dir = upload_env
+        queue = TranscriptionJobQueue(workers=1, max_pending=4, timeout=5)
+        with make_client(monkeypatch, env, queue) as client:
+            results = [None] * 4
+
+            def post(i):
+                content = f"内容{i}".encode("utf-8")
+                results[i] = client.post("/api/asr/transcribe/file", files={"file": ("a.wav", content)}).json()
+
+            threads = [threading.Thread(target=post, args=(i,)) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert [result["result"] for result in results] == [f"内容{i}" for i in range(4)]
+        workspaces = {workspace for workspace, _, _ in engine.calls}
+        assert len(workspaces) == 4
+        assert all(os.path.dirname(workspace) == str(temp_dir) for workspace in workspaces)
+        assert all(digest == hashlib.sha256(data).hexdigest() for _, digest, data in engine.calls)
+        assert os.listdir(temp_dir) == []
+
+    def test_workspace_removed_after_failure(self, monkeypatch, env, upload_env):
+        """测试转写失败时返回500且删除临时目录"""
+        engine, temp_dir = upload_env
+        engine.fail = True
+        queue = TranscriptionJobQueue(workers=1, max_pending=4, timeout=5)
+        with make_client(monkeypatch, env, queue) as client:
+            response = client.post("/api/asr/transcribe/file", files={"file": ("a.wav", b"x")})
+            assert response.status_code == 500
+            assert "识别失败" in response.json()["detail"]
+
+        assert len(engine.calls) == 1
+        assert os.listdir(temp_dir) == []
+
@@ -0,0 +1,150 @@
+import pytest
+import sys
+import os
+import wave
+from types import SimpleNamespace
+import numpy as np
+
+# 添加项目根目录到Python路径（models.py 通过 app.database 导入，需同时加入后端目录）
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'asr_system_backend'))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from asr_system_backend.app import vad_gate
+from asr_system_backend.app.database import get_db
+from asr_system_backend.app.routers import realtime as realtime_router
+from asr_system_backend.app.vad_gate import VADGate, refine_segment
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds, amplitude=8000):
+    """440Hz正弦音，模拟有声段"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.int16).tobytes()
+
+
+def silence(seconds, amplitude=20):
+    """低幅度噪声，模拟会议中的静音"""
+    rng = np.random.default_rng(0)
+    return rng.integers(-amplitude, amplitude, int(seconds * SAMPLE_RATE)).astype(np.int16).tobytes()
+
+
+def seconds_of(pcm):
+    return len(pcm) / 2 / SAMPLE_RATE
+
+
+def make_gate(**kwargs):
+    params = dict(sample_rate=SAMPLE_RATE, energy_db=-45, frame_ms=30, min_speech_ms=90,
+                  end_silence_ms=300, pad_ms=150, max_segment_seconds=6)
+    params.update(kwargs)
+    return VADGate(**params)
+
+
+class TestVADGate:
+    """能量语音门控测试"""
+
+    def test_silence_is_dropped(self):
+        """测试纯静音不产生任何片段"""
+        gate = make_gate()
+        assert gate.feed(silence(3)) == []
+        assert gate.flush() == []
+        stats = gate.get_stats()
+        assert stats["segments"] == 0
+        assert stats["seconds_dropped"] == pytest.approx(3, abs=0.03)
+
+    def test_segments_cut_at_speech_boundaries(self):
+        """测试两段语音在中间的静音处切开，且只保留少量前后静音"""
+        gate = make_gate()
+        audio = silence(1) + tone(1.2) + silence(1) + tone(0.8) + silence(1)
+        # 按不对齐帧长的小块写入，模拟网络分包
+        segments = []
+        for start in range(0, len(audio), 3001 * 2):
+            segments += gate.feed(audio[start:start + 3001 * 2])
+        segments += gate.flush()
+
+        assert len(segments) == 2
+        assert seconds_of(segments[0]) == pytest.approx(1.2 + 0.3, abs=0.1)
+        assert seconds_of(segments[1]) == pytest.approx(0.8 + 0.3, abs=0.1)
+        stats = gate.get_stats()
+        assert stats["seconds_emitted"] + stats["seconds_dropped"] == pytest.approx(5, abs=0.05)
+
+    def test_short_click_does_not_start_segment(self):
+        """测试短于min_speech_ms的噪声不会触发识别"""
+        gate = make_gate()
+        segments = gate.feed(silence(0.5) + tone(0.03) + silence(1))
+        assert segments == [] and not gate.in_speech
+
+    def test_long_speech_is_split_at_max_length(self):
+        """测试持续语音超过最长片段时强制切开，且不丢失音频"""
+        gate = make_gate(max_segment_seconds=2)
+        segments = gate.feed(tone(5)) + gate.flush()
+        assert [round(seconds_of(segment), 2) for segment in segments[:2]] == [2.01, 2.01]
+        assert sum(seconds_of(segment) for segment in segments) == pytest.approx(5, abs=0.03)
+
+
+class TestRefineSegment:
+    """FSMN VAD复核测试"""
+
+    def test_model_unavailable_returns_segment(self, monkeypatch):
+        """测试模型不可用时原样返回"""
+        monkeypatch.setattr(vad_gate, "run_vad_model", lambda audio: None)
+        pcm = tone(1)
+        assert refine_segment(pcm, SAMPLE_RATE) == [pcm]
+
+    def test_model_keeps_only_speech(self, monkeypatch):
+        """测试只保留模型判定为语音的部分，判定为噪声时丢弃"""
+        pcm = silence(0.5) + tone(1) + silence(0.5)
+        monkeypatch.setattr(vad_gate, "run_vad_model", lambda audio: [[500, 1500]])
+        pieces = refine_segment(pcm, SAMPLE_RATE)
+        assert len(pieces) == 1 and pieces[0] == pcm[16000:48000]
+
+        monkeypatch.setattr(vad_gate, "run_vad_model", lambda audio: [])
+        assert refine_segment(pcm, SAMPLE_RATE) == []
+
+
+class RecordingASR:
+    """记录收到的音频时长，不连接FunASR"""
+
+    initialized = True
+
+    def __init__(self):
+        self.durations = []
+
+    async def transcribe(self, audio_file_path, use_cache=True):
+        with wave.open(audio_file_path, 'rb') as wav_file:
+            self.durations.append(wav_file.getnframes() / wav_file.getframerate())
+        return {"text": ""}
+
+
+class TestRealtimeRouteGate:
+    """实时转写路由中的语音门控测试"""
+
+    def test_pending_speech_transcribed_on_disconnect(self, monkeypatch):
+        """测试断开连接时门控中未结束的语音片段仍会转写"""
+        engine = RecordingASR()
+
+        async def fake_user(token, db):
+            return SimpleNamespace(id="u1")
+
+        monkeypatch.setattr(realtime_router, "get_current_user_ws", fake_user)
+        monkeypatch.setattr(realtime_router, "get_asr_engine", lambda: engine)
+        monkeypatch.setattr(realtime_router, "get_rag_service", lambda: SimpleNamespace(touch_user=lambda user_id: None))
+        monkeypatch.setattr(realtime_router, "create_vad_gate", lambda sample_rate: make_gate())
+        monkeypatch.setattr(realtime_router, "refine_segment", lambda pcm, sample_rate: [pcm])
+        app = FastAPI()
+        app.include_router(realtime_router.router)
+        app.dependency_overrides[get_db] = lambda: None
+
+        with TestClient(app) as client:
+            with client.websocket_connect("/ws/asr/transcribe/realtime?token=t") as websocket:
+                assert websocket.receive_json()["type"] == "connection_established"
+                assert websocket.receive_json()["type"] == "ready"
+                # 语音没有结束就断开，片段只能由flush取出
+                websocket.send_bytes(silence(0.3) + tone(1.0))
+
+        assert len(engine.durations) == 1
+        assert 1.0 <= engine.durations[0] <= 1.2
+
@@ -0,0 +1,78 @@
+import pytest
+import sys
+import os
+import warnings
+import torch
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from transformers import WhisperConfig, WhisperForConditionalGeneration
+from asr_system_backend.app.realtime_asr.model_registry import load_whisper, quantize_int8
+
+
+@pytest.fixture(scope="module")
+def tiny_whisper():
+    """随机初始化的小型Whisper模型，结构与whisper-small相同，避免下载权重"""
+    torch.manual_seed(0)
+    config = WhisperConfig(
+        vocab_size=200, d_model=64, encoder_layers=2, decoder_layers=2,
+        encoder_attention_heads=4, decoder_attention_heads=4,
+        encoder_ffn_dim=128, decoder_ffn_dim=128, num_mel_bins=80,
+        max_source_positions=1500, max_target_positions=64,
+        pad_token_id=0, bos_token_id=1, eos_token_id=2, decoder_start_token_id=1
+    )
+    return WhisperForConditionalGeneration(config).eval()
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    torch.manual_seed(1)
+    input_features = torch.randn(2, 80, 3000)
+    decoder_input_ids = torch.randint(3, 200, (2, 8))
+    decoder_input_ids[:, 0] = 1
+    return input_features, decoder_input_ids
+
+
+def logits_of(model, inputs):
+    input_features, decoder_input_ids = inputs
+    with torch.inference_mode():
+        return model(input_features=input_features, decoder_input_ids=decoder_input_ids).logits.float()
+
+
+def assert_parity(reference, candidate):
+    """输出分布方向一致，且逐位置的最优token基本相同"""
+    similarity = torch.nn.functional.cosine_similarity(reference.flatten(), candidate.flatten(), dim=0)
+    agreement = (reference.argmax(-1) == candidate.argmax(-1)).float().mean()
+    assert similarity > 0.99
+    assert agreement >= 0.9
+
+
+class TestWhisperBackends:
+    """Whisper推理后端与PyTorch fp32结果一致性测试"""
+
+    def test_int8_matches_pytorch(self, tiny_whisper, inputs):
+        """测试int8动态量化模型的输出与fp32一致"""
+        reference = logits_of(tiny_whisper, inputs)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            quantized = quantize_int8(tiny_whisper)
+
+        assert quantized is not tiny_whisper
+        assert isinstance(quantized.model.encoder.layers[0].fc1, torch.ao.nn.quantized.dynamic.Linear)
+        assert quantized.device.type == "cpu"
+        assert_parity(reference, logits_of(quantized, inputs))
+
+    def test_onnx_matches_pytorch(self, tiny_whisper, inputs, tmp_path):
+        """测试ONNX Runtime导出模型的输出与fp32一致"""
+        ort = pytest.importorskip("optimum.onnxruntime")
+        tiny_whisper.save_pretrained(tmp_path / "torch")
+        model = ort.ORTModelForSpeechSeq2Seq.from_pretrained(
+            tmp_path / "torch", export=True, provider="CPUExecutionProvider"
+        )
+        assert_parity(logits_of(tiny_whisper, inputs), logits_of(model, inputs))
+
+    def test_unknown_backend_rejected(self):
+        """测试不支持的后端名称直接报错"""
+        with pytest.raises(ValueError):
+            load_whisper("openai/whisper-small", backend="tensorrt")